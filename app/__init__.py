@@ -8,6 +8,11 @@ def create_app():
     from .routes import register_routes
     register_routes(app)
 
+    # metrics first, their after_request hook then runs last and times the compression too
+    from .services import metrics, response_compression
+    metrics.init_app(app)
+    response_compression.init_app(app)
+
     return app
 
 __all__ = ['create_app']
\ No newline at end of file
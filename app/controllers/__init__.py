@@ -1,5 +1,9 @@
 from app.controllers.q_learning_controller import QLearningController
 from app.controllers.value_iteration_controller import ValueIterationController
+from app.controllers.policy_iteration_controller import PolicyIterationController
+from app.controllers.run_controller import RunController
+from app.controllers.job_controller import JobController
+from app.controllers.sweep_controller import SweepController
 
 
-__all__ = ['QLearningController', 'ValueIterationController']
\ No newline at end of file
+__all__ = ['QLearningController', 'ValueIterationController', 'PolicyIterationController', 'RunController', 'JobController', 'SweepController']
\ No newline at end of file
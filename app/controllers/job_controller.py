@@ -0,0 +1,61 @@
+from app.controllers.q_learning_controller import QLearningController
+from app.controllers.value_iteration_controller import ValueIterationController
+from app.services.job_manager import COMPLETED
+
+
+class JobController:
+    MAX_WAIT = 30
+
+    def __init__(self, job_manager):
+        self.job_manager = job_manager
+        self.controllers = {
+            'value-iteration': ValueIterationController(),
+            'q-learning': QLearningController()
+        }
+
+    def submit(self, kind, data):
+        """
+        Validate a run-agent request and queue it as a job
+        :raises ValueError: if the request is invalid
+        :raises OverflowError: if the job queue is full
+        """
+        grid_conf = self.controllers[kind].build_grid_conf(data)
+        total_steps = int(grid_conf['k']) if kind == 'value-iteration' else int(grid_conf['episodes'])
+        # a stored run would only live in the worker process
+        data = {key: value for key, value in data.items() if key != 'Store'}
+        return self.job_manager.submit(kind, data, total_steps).to_dict()
+
+    def get_status(self, job_id, wait=0):
+        """
+        Get the status and progress of a job, waiting up to wait seconds for it to finish
+        :raises KeyError: if the job does not exist or has expired
+        """
+        wait = min(max(float(wait), 0.0), self.MAX_WAIT)
+        job = self.job_manager.wait(job_id, wait) if wait > 0 else self.job_manager.get(job_id)
+        if job is None:
+            raise KeyError(f"Job not found: {job_id}")
+        return job.to_dict()
+
+    def get_result(self, job_id):
+        """
+        Get the serialized result of a completed job
+        :return tuple of (result bytes or None, status dict), the bytes are None if the job has not completed
+        :raises KeyError: if the job does not exist or has expired
+        """
+        job = self.job_manager.get(job_id)
+        if job is None:
+            raise KeyError(f"Job not found: {job_id}")
+        return (job.result if job.status == COMPLETED else None), job.to_dict()
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job
+        :raises KeyError: if the job does not exist or has expired
+        """
+        job = self.job_manager.cancel(job_id)
+        if job is None:
+            raise KeyError(f"Job not found: {job_id}")
+        return job.to_dict()
+
+    def get_stats(self):
+        return self.job_manager.get_stats()
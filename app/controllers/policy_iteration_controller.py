@@ -0,0 +1,32 @@
+from app.core import PolicyIterationAgent
+from app.controllers.value_iteration_controller import ValueIterationController
+
+
+class PolicyIterationController(ValueIterationController):
+    """
+    Same request and response schema as value iteration, K is the maximum number
+    of policy iterations. Evaluation ("auto", "exact" or "modified") and EvaluationSteps
+    select the policy evaluation
+    """
+    KIND = 'policy-iteration'
+    MESSAGE = 'Policy Iteration completed'
+
+    def get_options(self, data, columnar=False):
+        options = super().get_options(data, columnar)
+        options['Evaluation'] = data.get('Evaluation', 'auto')
+        options['EvaluationSteps'] = data.get('EvaluationSteps', 20)
+        return options
+
+    def build_agent(self, data, grid):
+        return PolicyIterationAgent(grid, evaluation=data.get('Evaluation', 'auto'),
+                                    evaluation_steps=data.get('EvaluationSteps', 20), tolerance=data.get('Tolerance'),
+                                    policy_stable_steps=data.get('PolicyStableSteps'),
+                                    checkpoint_interval=data.get('CheckpointInterval'))
+
+    def get_summary(self, data, agent, encoder):
+        """
+        Response fields other than the iterations, the convergence report is always included
+        """
+        result = super().get_summary(data, agent, encoder)
+        result['convergence'] = agent.get_convergence()
+        return result
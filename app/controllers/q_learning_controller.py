@@ -1,49 +1,330 @@
-from app.core import Grid, QLearningAgent
+from app.core import Grid, QLearningAgent, BatchQLearningAgent, DeltaEncoder, TrajectoryFilter, Query, AgentType
+from app.services import make_cache_key, RunLimits, metrics
 
 class QLearningController:
-    def run_agent(self, data):
+    # options that only change how the episodes are kept or sent, not the solved agent
+    OUTPUT_OPTIONS = ('Columnar', 'Encoding', 'KeyframeInterval', 'DeltaTolerance', 'CheckpointInterval',
+                      'Trajectories', 'TrajectoryCount')
+
+    def __init__(self, cache=None, run_store=None, limits=None, history_storage=None):
+        self.cache = cache
+        self.run_store = run_store
+        self.limits = limits or RunLimits()
+        self.history_storage = history_storage
+        if run_store is not None:
+            run_store.register('q-learning', self.restore_run)
+
+    def build_grid_conf(self, data):
+        # Validate input data
+        required_fields = ['x', 'y', 'Terminal', 'Boulder', 'RobotStartState', 'Discount', 'Noise', 'TransitionCost', 'Alpha', 'Episodes']
+        for field in required_fields:
+            if field not in data:
+                raise ValueError(f"Missing required field: {field}")
+
+        # Create grid configuration
+        return {
+            'x': data['x'],
+            'y': data['y'],
+            'terminal': [[int(state[0]), int(state[1]), float(state[2])] for state in data['Terminal']],
+            'boulder': [[int(state[0]), int(state[1])] for state in data['Boulder']],
+            'robotStartState': data['RobotStartState'],
+            'k' : 0,
+            'discount': data['Discount'],
+            'noise': data['Noise'],
+            'transitionCost': data['TransitionCost'],
+            'alpha': data['Alpha'],
+            'episodes': data['Episodes']
+        }
+
+    def get_cache_key(self, data, columnar=False):
+        """
+        Content addressed key of a request, None when the request has no Seed 
+        since the run is not reproducible then
+        """
+        if data.get('Seed') is None:
+            return None
+        return make_cache_key('q-learning', self.build_grid_conf(data), self.get_options(data, columnar))
+
+    def get_run_key(self, data):
+        """
+        Content addressed key of the solved agent of a request, None without a Seed.
+        A stored run of the key answers the queries of any request with the same key
+        """
+        if data.get('Seed') is None:
+            return None
+        options = {name: value for name, value in self.get_options(data).items() if name not in self.OUTPUT_OPTIONS}
+        return make_cache_key('q-learning', self.build_grid_conf(data), options)
+
+    def get_options(self, data, columnar=False):
+        """
+        Request options that change the result, other than the grid configuration
+        """
+        return {
+            'Columnar': columnar,
+            'Seed': data['Seed'],
+            'Agents': data.get('Agents'),
+            'PlanningSteps': data.get('PlanningSteps', 0),
+            'PrioritizedPlanning': data.get('PrioritizedPlanning', False),
+            'MaxEpisodeSteps': self.limits.get_budget_fields(data)['MaxEpisodeSteps'],
+            'Encoding': data.get('Encoding', 'full'),
+            'KeyframeInterval': data.get('KeyframeInterval', 50),
+            'DeltaTolerance': data.get('DeltaTolerance', 0.0),
+            'CheckpointInterval': data.get('CheckpointInterval'),
+            'Trajectories': data.get('Trajectories', 'all'),
+            'TrajectoryCount': data.get('TrajectoryCount')
+        }
+
+    def run_agent_cached(self, data, serialize, columnar=False):
+        """
+        Run the agent through the result cache, only seeded requests are cached
+        and truncated results never are
+        :param serialize: serializes a result dict to the response bytes
+        :param columnar: return the episodes as packed columns instead of iterations
+        :return serialized result
+        """
         try:
-            # Validate input data
-            required_fields = ['x', 'y', 'Terminal', 'Boulder', 'RobotStartState', 'Discount', 'Noise', 'TransitionCost', 'Alpha', 'Episodes']
-            for field in required_fields:
-                if field not in data:
-                    raise ValueError(f"Missing required field: {field}")
-
-            # Create grid configuration
-            grid_conf = {
-                'x': data['x'],
-                'y': data['y'],
-                'terminal': [[int(state[0]), int(state[1]), float(state[2])] for state in data['Terminal']],
-                'boulder': [[int(state[0]), int(state[1])] for state in data['Boulder']],
-                'robotStartState': data['RobotStartState'],
-                'k' : 0,
-                'discount': data['Discount'],
-                'noise': data['Noise'],
-                'transitionCost': data['TransitionCost'],
-                'alpha': data['Alpha'],
-                'episodes': data['Episodes']
-            }
-
-            # Initialize grid and agent
+            key = None if self.cache is None else self.get_cache_key(data, columnar)
+        except Exception:
+            # invalid requests are reported by run_agent
+            key = None
+        serialize = metrics.time_serialize('q-learning', serialize)
+        if key is None or data.get('Store'):
+            return serialize(self.run_agent(data, columnar=columnar))
+        return self.cache.get_or_compute(key, lambda: self.run_agent(data, columnar=columnar), serialize,
+                                         lambda result: ('iterations' in result or 'columns' in result) and not result.get('truncated'))
+
+    def get_encoder(self, data):
+        """
+        DeltaEncoder for a request that asks for delta encoding, None otherwise
+        """
+        encoding = data.get('Encoding', 'full')
+        if encoding not in ('full', 'delta'):
+            raise ValueError(f"Invalid encoding: {encoding}")
+        if encoding == 'delta':
+            return DeltaEncoder(data.get('KeyframeInterval', 50), data.get('DeltaTolerance', 0.0))
+        return None
+
+    def get_trajectory_filter(self, data):
+        """
+        TrajectoryFilter for a request that selects the sent state sequences with
+        Trajectories ("all", "last", "every" or "summary") and TrajectoryCount, None otherwise
+        """
+        if data.get('Trajectories') is None:
+            return None
+        if data.get('Agents') is not None:
+            raise ValueError("Trajectories are not available with Agents")
+        return TrajectoryFilter(data['Trajectories'], data.get('TrajectoryCount'))
+
+    def create_agent(self, data):
+        grid_conf = self.build_grid_conf(data)
+
         # Initialize grid and agent
-            try:
+        try:
+            with metrics.phase('grid'):
                 grid = Grid(grid_conf)
-            except Exception as e:
-                raise ValueError(f"Error initializing Grid: {str(e)}")
+        except Exception as e:
+            raise ValueError(f"Error initializing Grid: {str(e)}")
 
-            try:
-                agent = QLearningAgent(grid)
-            except Exception as e:
-                raise ValueError(f"Error initializing QLearningAgent: {str(e)}")
+        try:
+            if data.get('Agents') is not None:
+                if data.get('PlanningSteps'):
+                    raise ValueError("Planning is not available with Agents")
+                if data.get('CheckpointInterval') is not None:
+                    raise ValueError("Checkpoints are not available with Agents")
+                return BatchQLearningAgent(grid, data['Agents'], seed=data.get('Seed'))
+            return QLearningAgent(grid, seed=data.get('Seed'), planning_steps=data.get('PlanningSteps', 0),
+                                  prioritized_planning=data.get('PrioritizedPlanning', False),
+                                  checkpoint_interval=data.get('CheckpointInterval'))
+        except Exception as e:
+            raise ValueError(f"Error initializing QLearningAgent: {str(e)}")
+
+    def get_summary(self, encoder, agent=None, trajectories=None):
+        """
+        Response fields other than the iterations, a batch agent adds its episode length summary
+        and a planning agent its number of planning updates, a checkpointed agent its history
+        memory report. With a budget the result is flagged as truncated if the budget ran out 
+        before the last episode. A trajectory filter adds its settings, and the trajectory
+        summary in the "summary" mode
+        """
+        result = {'message': 'Q-Learning completed'}
+        if isinstance(agent, BatchQLearningAgent):
+            result.update(agent.get_summary())
+        elif agent is not None:
+            if agent.planning_steps:
+                result['planning_updates'] = agent.planning_updates
+            if agent.checkpoint_interval is not None:
+                result['history'] = agent.get_history_memory()
+        if agent is not None:
+            result.update(agent.get_budget_summary())
+        if encoder is not None:
+            result['encoding'] = encoder.to_dict()
+        if trajectories is not None:
+            result['trajectories'] = trajectories.to_dict()
+            if trajectories.mode == 'summary' and agent is not None:
+                result['trajectories'].update(agent.get_trajectory_summary())
+        return result
+
+    def get_columns(self, agent, trajectories=None):
+        """
+        Response fields of the columnar format: the state and action lists, sent
+        once, and the packed per episode arrays
+        """
+        columns = agent.get_columns() if trajectories is None else agent.get_columns(trajectories=trajectories)
+        return {'states': agent.get_state_keys(), 'actions': list(agent.ACTIONS), 'columns': columns}
 
-            # Run Q-learning algorithm
+    def solve(self, data, progress_callback=None):
+        """
+        Create the agent of a request and run it
+        :return: the solved agent
+        """
+        agent = self.create_agent(data)
+        agent.progress_callback = progress_callback
+        agent.budget = self.limits.get_budget(data)
+        agent.timing = metrics.phase
+        agent.history_storage = self.history_storage
+
+        # Run Q-learning algorithm
+        with metrics.phase('solve'):
             agent.run_agent()
-            json_iterations = agent.get_iterations()
+        metrics.observe_run('q-learning', agent)
+        return agent
 
-            return {
-                'message': 'Q-Learning completed',
-                'iterations': json_iterations
-            }
+    def run_agent(self, data, progress_callback=None, columnar=False):
+        try:
+            encoder = self.get_encoder(data)
+            if columnar and encoder is not None:
+                raise ValueError("Delta encoding is not available in the columnar format")
+            trajectories = self.get_trajectory_filter(data)
+            agent = self.solve(data, progress_callback)
+            if data.get('Store') and self.run_store is not None:
+                return self.store_run(data, agent)
+            with metrics.phase('iterations'):
+                if columnar:
+                    payload = self.get_columns(agent, trajectories)
+                elif encoder is not None:
+                    payload = {'iterations': agent.get_delta_iterations(encoder, trajectories=trajectories)}
+                elif trajectories is not None:
+                    payload = {'iterations': agent.get_iterations(trajectories=trajectories)}
+                else:
+                    payload = {'iterations': agent.get_iterations()}
+
+            result = self.get_summary(encoder, agent, trajectories)
+            result.update(payload)
+            return result
 
         except Exception as e:
-            return {'error': str(e)}
\ No newline at end of file
+            return {'error': str(e)}
+
+    def store_run(self, data, agent):
+        """
+        Keep a solved agent in the run store instead of returning its iterations,
+        a seeded run that was not truncated is stored with its key for later queries
+        :return: response with the run id, state list and step count of the stored run
+        """
+        summary = self.get_summary(None, agent)
+        key = None if agent.truncated() else self.get_run_key(data)
+        run = self.run_store.put('q-learning', agent, summary, key, self.get_recipe(data, key))
+        result = dict(summary)
+        result.update(run.get_metadata())
+        return result
+
+    def get_recipe(self, data, key):
+        """
+        Request that runs a stored run again in another worker, see restore_run
+        :param key: run key of the run, None if it is not reproducible (no Seed or truncated)
+        :return: dict of the request without its queries, None if the run is not reproducible
+        """
+        if key is None:
+            return None
+        return {'action': 'solve', 'data': {name: value for name, value in data.items() if name not in ('Queries', 'Store')}}
+
+    def restore_run(self, recipe):
+        """
+        Run the recipe of a run stored by another worker, registered with the run store
+        :return: the solved agent, None if it ran out of its budget this time
+        """
+        agent = self.solve(recipe['data'])
+        return None if agent.truncated() else agent
+
+    def get_queries(self, data):
+        """
+        Parse the Queries of a request, a list of {x, y, Step, Type}, Step is the episode
+        :raises ValueError: if Queries is missing or a query is invalid
+        """
+        queries = data.get('Queries')
+        if not isinstance(queries, list) or not queries:
+            raise ValueError("Queries must be a non empty list")
+        return [Query.from_dict(query, AgentType.RL) for query in queries]
+
+    def find_run(self, data):
+        """
+        Stored run that answers the queries of a request: the run of RunId, or the
+        latest stored run with the request's key
+        :return: StoredRun, None if there is none
+        :raises KeyError: if RunId does not exist or has expired
+        """
+        if data.get('RunId') is None:
+            key = None if self.run_store is None else self.get_run_key(data)
+            return None if key is None else self.run_store.find(key)
+        run = None if self.run_store is None else self.run_store.get(data['RunId'])
+        if run is None:
+            raise KeyError(f"Run not found: {data['RunId']}")
+        if run.kind != 'q-learning':
+            raise ValueError(f"Run {data['RunId']} is a {run.kind} run")
+        return run
+
+    def answer_queries(self, data):
+        """
+        Answer a batch of queries with a single run. The agent runs once and is kept in
+        the run store, later batches with its RunId, or of the same grid configuration,
+        options and Seed, are answered from the stored run without running again
+        :return: response with the run id, whether a stored run was reused, the episode
+                 count of the run and the answers in the order of the queries
+        :raises KeyError: if RunId does not exist or has expired
+        """
+        queries = self.get_queries(data)
+        run = self.find_run(data)
+        reused = run is not None
+        if run is not None:
+            agent = run.agent
+        else:
+            agent = self.solve(data)
+            if self.run_store is not None:
+                key = None if agent.truncated() else self.get_run_key(data)
+                run = self.run_store.put('q-learning', agent, self.get_summary(None, agent), key, self.get_recipe(data, key))
+        with metrics.phase('answer'):
+            agent.answer_query_batch(queries)
+        result = {'message': 'Queries answered', 'run_id': None if run is None else run.run_id, 'reused': reused,
+                  'steps': agent.get_step_count()}
+        result.update(agent.get_budget_summary())
+        result['answers'] = [query.to_dict() for query in queries]
+        return result
+
+    def stream_agent(self, data):
+        """
+        Streaming variant of run_agent. Invalid requests raise before anything
+        is streamed, the episodes only run while the records are consumed
+        :return: generator of {step, iteration} records for every episode, followed 
+                 by a done record with the fields of the run_agent response, or an error record
+        """
+        agent = self.create_agent(data)
+        agent.budget = self.limits.get_budget(data)
+        encoder = self.get_encoder(data)
+        trajectories = self.get_trajectory_filter(data)
+
+        def records():
+            steps = 0
+            try:
+                iterations = agent.stream_iterations(encoder) if trajectories is None else agent.stream_iterations(encoder, trajectories)
+                for episode, iteration in iterations:
+                    steps = episode + 1
+                    yield {'step': episode, 'iteration': iteration}
+            except Exception as e:
+                yield {'error': str(e)}
+                return
+            metrics.observe_run('q-learning', agent)
+            result = self.get_summary(encoder, agent, trajectories)
+            result.update({'done': True, 'steps': steps})
+            yield result
+
+        return records()
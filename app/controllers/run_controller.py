@@ -0,0 +1,71 @@
+from app.core import DeltaEncoder
+
+
+class RunController:
+    def __init__(self, run_store):
+        self.run_store = run_store
+
+    def get_run(self, run_id):
+        """
+        Get the metadata and response fields of a stored run
+        :raises KeyError: if the run does not exist or has expired
+        """
+        run = self.run_store.get(run_id)
+        if run is None:
+            raise KeyError(f"Run not found: {run_id}")
+        result = dict(run.summary)
+        result.update(run.get_metadata())
+        return result
+
+    def get_iterations(self, run_id, args, columnar=False):
+        """
+        Get a window of the iterations of a stored run
+        :param args: query arguments, either step for a single step or start, stop 
+                     and stride with python slice semantics. encoding=delta with 
+                     keyframe_interval and delta_tolerance delta encodes the window
+        :param columnar: return the window as packed columns instead of iterations
+        :raises KeyError: if the run does not exist or has expired
+        """
+        run = self.run_store.get(run_id)
+        if run is None:
+            raise KeyError(f"Run not found: {run_id}")
+
+        try:
+            if args.get('step') is not None:
+                step = int(args['step'])
+                if not 0 <= step < run.agent.get_step_count():
+                    raise ValueError(f"Step {step} out of range")
+                start, stop, stride = step, step + 1, 1
+            else:
+                start = int(args.get('start', 0))
+                stop = None if args.get('stop') is None else int(args['stop'])
+                stride = int(args.get('stride', 1))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid step window: {str(e)}")
+
+        encoding = args.get('encoding', 'full')
+        if encoding not in ('full', 'delta'):
+            raise ValueError(f"Invalid encoding: {encoding}")
+        result = {'run_id': run_id, 'steps': run.agent.get_step_count()}
+        if columnar:
+            if encoding == 'delta':
+                raise ValueError("Delta encoding is not available in the columnar format")
+            result['states'] = run.agent.get_state_keys()
+            result['actions'] = list(run.agent.ACTIONS)
+            result['columns'] = run.agent.get_columns(start, stop, stride)
+        elif encoding == 'delta':
+            encoder = DeltaEncoder(args.get('keyframe_interval', 50), args.get('delta_tolerance', 0.0))
+            result['iterations'] = run.agent.get_delta_iterations(encoder, start, stop, stride)
+            result['encoding'] = encoder.to_dict()
+        else:
+            result['iterations'] = run.agent.get_iterations(start, stop, stride)
+        return result
+
+    def delete_run(self, run_id):
+        """
+        Delete a stored run
+        :raises KeyError: if the run does not exist
+        """
+        if not self.run_store.delete(run_id):
+            raise KeyError(f"Run not found: {run_id}")
+        return {'message': 'Run deleted', 'run_id': run_id}
@@ -0,0 +1,207 @@
+import itertools
+import json
+import math
+import time
+from collections import OrderedDict
+from app.core import Grid, ValueIterationAgent, QLearningAgent
+from app.services import run_limits
+from app.controllers.q_learning_controller import QLearningController
+from app.controllers.value_iteration_controller import ValueIterationController
+
+# Parameters a sweep may vary, everything else is shared by every configuration
+SWEEP_PARAMETERS = {
+    'value-iteration': ('Discount', 'Noise', 'TransitionCost', 'K', 'Tolerance', 'PolicyStableSteps', 'Schedule', 'TimeLimit'),
+    'q-learning': ('Discount', 'Noise', 'TransitionCost', 'Alpha', 'Episodes', 'Seed', 'PlanningSteps', 'PrioritizedPlanning',
+                   'MaxEpisodeSteps', 'MaxSteps', 'TimeLimit')
+}
+# Grid configuration fields that change the grid's structure, the others are solver parameters
+STRUCTURE_FIELDS = ('x', 'y', 'terminal', 'boulder', 'robotStartState', 'noise', 'transitionCost')
+MAX_CACHED_GRIDS = 8
+
+# grids built by this worker process, keyed by their structure
+_grids = OrderedDict()
+
+
+def get_structure_key(grid_conf):
+    return json.dumps([grid_conf[field] for field in STRUCTURE_FIELDS])
+
+
+def get_grid(grid_conf):
+    """
+    Get a grid for a grid configuration, the grid's structure and compiled transition
+    model are built once per worker process and shared by every configuration that
+    only differs in its solver parameters
+    """
+    key = get_structure_key(grid_conf)
+    grid = _grids.get(key)
+    if grid is None:
+        grid = Grid(grid_conf)
+        grid.get_transition_model()
+        _grids[key] = grid
+        if len(_grids) > MAX_CACHED_GRIDS:
+            _grids.popitem(last=False)
+    else:
+        _grids.move_to_end(key)
+    return grid.with_parameters(k=grid_conf['k'], episodes=grid_conf['episodes'], alpha=grid_conf['alpha'],
+                                discount=grid_conf['discount'])
+
+
+def run_value_iteration(request, grid_conf, history, limits):
+    agent = ValueIterationAgent(get_grid(grid_conf), tolerance=request.get('Tolerance'),
+                                policy_stable_steps=request.get('PolicyStableSteps'),
+                                schedule=request.get('Schedule', 'synchronous'))
+    agent.budget = limits.get_budget(request, ValueIterationController.BUDGET_FIELDS)
+    agent.run_agent()
+    step = agent.get_step_count() - 1
+    final = agent.format_step(agent.value_history[step], agent.action_history[step])
+    result = {
+        'steps': step + 1,
+        'convergence': agent.get_convergence(),
+        'truncated': agent.truncated(),
+        'values': {state: value['value'] for state, value in final.items()},
+        'policy': {state: value['best_action'] for state, value in final.items()}
+    }
+    if history:
+        result['iterations'] = agent.get_iterations()
+    return result
+
+
+def run_q_learning(request, grid_conf, history, limits):
+    agent = QLearningAgent(get_grid(grid_conf), seed=request.get('Seed'), planning_steps=request.get('PlanningSteps', 0),
+                           prioritized_planning=request.get('PrioritizedPlanning', False))
+    agent.budget = limits.get_budget(request)
+    agent.run_agent(keep_history=history)
+    q_values = agent.q_values.current.tolist()
+    values = {}
+    policy = {}
+    for i, state in enumerate(agent.grid.state_list):
+        # first action with the max q value, so the summary does not depend on the random generator
+        actions = agent.grid.get_action_indices(i)
+        best_action = max(actions, key=lambda action: q_values[i][action])
+        values[str(state)] = q_values[i][best_action]
+        policy[str(state)] = agent.ACTIONS[best_action]
+    lengths = agent.trajectories.lengths.tolist()[1:]
+    result = {
+        'episodes': len(lengths),
+        'mean_episode_length': sum(lengths) / len(lengths) if lengths else 0.0,
+        'truncated': agent.truncated(),
+        'values': values,
+        'policy': policy
+    }
+    if history:
+        result['iterations'] = agent.get_iterations()
+    return result
+
+
+def run_sweep_task(task):
+    """
+    Entry point of a sweep task in a worker process
+    :param task: dict with the kind, the configurations as (position, parameters, request, grid_conf)
+                 tuples, the history flag, the server's RunLimits and the time.time() deadline of the sweep
+    :return: list of (position, result) tuples
+    """
+    run = run_value_iteration if task['kind'] == 'value-iteration' else run_q_learning
+    results = []
+    for position, parameters, request, grid_conf in task['configurations']:
+        limits = task['limits'].until(task['deadline'])
+        try:
+            if limits.time_limit == 0:
+                # the sweep ran out of time before this configuration started
+                result = {'truncated': True, 'skipped': True}
+            else:
+                result = run(request, grid_conf, task['history'], limits)
+        except Exception as e:
+            result = {'error': str(e)}
+        result['parameters'] = parameters
+        results.append((position, result))
+    return results
+
+
+class SweepController:
+    MAX_CONFIGURATIONS = 256
+
+    def __init__(self, pool, max_configurations=None, limits=None):
+        self.pool = pool
+        self.max_configurations = max_configurations or self.MAX_CONFIGURATIONS
+        self.limits = limits or run_limits
+        self.controllers = {
+            'value-iteration': ValueIterationController(),
+            'q-learning': QLearningController()
+        }
+
+    def expand_configurations(self, kind, data):
+        """
+        Expand the parameter settings of a sweep request, either an explicit list of
+        "Configurations" or the cartesian product of the value lists of "Parameters"
+        :return: list of parameter dicts
+        :raises ValueError: if the settings are missing or invalid
+        """
+        if 'Configurations' in data:
+            configurations = data['Configurations']
+            if not isinstance(configurations, list) or not all(isinstance(c, dict) for c in configurations):
+                raise ValueError("Configurations must be a list of parameter objects")
+        elif 'Parameters' in data:
+            parameters = data['Parameters']
+            if not isinstance(parameters, dict) or not all(isinstance(v, list) and v for v in parameters.values()):
+                raise ValueError("Parameters must map parameter names to non empty lists of values")
+            names = list(parameters)
+            count = math.prod(len(parameters[name]) for name in names)
+            if count > self.max_configurations:
+                raise ValueError(f"Sweep has {count} configurations, at most {self.max_configurations} are allowed")
+            configurations = [dict(zip(names, values)) for values in itertools.product(*parameters.values())]
+        else:
+            raise ValueError("Missing required field: Configurations or Parameters")
+
+        if not configurations:
+            raise ValueError("Sweep has no configurations")
+        if len(configurations) > self.max_configurations:
+            raise ValueError(f"Sweep has {len(configurations)} configurations, at most {self.max_configurations} are allowed")
+        for configuration in configurations:
+            for name in configuration:
+                if name not in SWEEP_PARAMETERS[kind]:
+                    raise ValueError(f"Invalid sweep parameter: {name}, expected one of {', '.join(SWEEP_PARAMETERS[kind])}")
+        return configurations
+
+    def create_tasks(self, kind, data, deadline=None):
+        """
+        Validate every configuration and split them into one task per worker. Configurations
+        that share a grid structure are kept together so each task builds the grid once
+        :param deadline: time.time() every configuration has to end by, None for no deadline
+        :return: list of tasks for run_sweep_task
+        """
+        history = bool(data.get('History', False))
+        base = {key: value for key, value in data.items() if key not in ('Configurations', 'Parameters', 'History')}
+        groups = OrderedDict()
+        for position, parameters in enumerate(self.expand_configurations(kind, data)):
+            request = dict(base, **parameters)
+            grid_conf = self.controllers[kind].build_grid_conf(request)
+            groups.setdefault(get_structure_key(grid_conf), []).append((position, parameters, request, grid_conf))
+
+        configurations = [configuration for group in groups.values() for configuration in group]
+        chunk_size = math.ceil(len(configurations) / self.pool.max_workers)
+        return [
+            {'kind': kind, 'history': history, 'limits': self.limits, 'deadline': deadline,
+             'configurations': configurations[i:i + chunk_size]}
+            for i in range(0, len(configurations), chunk_size)
+        ]
+
+    def run_sweep(self, kind, data):
+        """
+        Run every configuration of a sweep request across the pool's workers. The whole
+        sweep shares the time cap of the limits, configurations that run out of it return
+        their truncated result and the ones that did not start a skipped one
+        :return: response with one result per configuration, in request order
+        :raises ValueError: if the request is invalid
+        """
+        deadline = None if self.limits.time_limit is None else time.time() + self.limits.time_limit
+        tasks = self.create_tasks(kind, data, deadline)
+        results = [None] * sum(len(task['configurations']) for task in tasks)
+        for task_results in self.pool.map(run_sweep_task, tasks):
+            for position, result in task_results:
+                results[position] = result
+        return {
+            'message': 'Sweep completed',
+            'kind': kind,
+            'configurations': len(results),
+            'results': results
+        }
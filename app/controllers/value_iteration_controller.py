@@ -1,8 +1,25 @@
-from app.core import ValueIterationAgent, Grid
+from app.core import ValueIterationAgent, Grid, GridEdit, DeltaEncoder, Query, AgentType
+from app.services import make_cache_key, RunLimits, metrics
+import time
 import traceback
 
 class ValueIterationController:
-    def run_agent(self, data):
+    KIND = 'value-iteration'
+    MESSAGE = 'Value Iteration completed'
+    # K already bounds the sweeps, only the time limit applies
+    BUDGET_FIELDS = ('TimeLimit',)
+    # options that only change how the iterations are kept or sent, not the solved agent
+    OUTPUT_OPTIONS = ('Columnar', 'Encoding', 'KeyframeInterval', 'DeltaTolerance', 'CheckpointInterval')
+
+    def __init__(self, cache=None, run_store=None, limits=None, history_storage=None):
+        self.cache = cache
+        self.run_store = run_store
+        self.limits = limits or RunLimits()
+        self.history_storage = history_storage
+        if run_store is not None:
+            run_store.register(self.KIND, self.restore_run)
+
+    def build_grid_conf(self, data):
         required_fields = ['x', 'y', 'Terminal', 'Boulder', 'RobotStartState', 'Discount', 'Noise', 'TransitionCost']
         for field in required_fields:
             if field not in data:
@@ -21,17 +38,338 @@ class ValueIterationController:
             'episodes': 0,  # Not used in value iteration
             'alpha': 0.0    # Not used in value iteration
         }
-        try:
-            grid = Grid(grid_conf)
-            agent = ValueIterationAgent(grid)
+        return grid_conf
+
+    def get_cache_key(self, data, columnar=False):
+        """
+        Content addressed key of a request, Engine is left out since both 
+        engines return identical results
+        """
+        return make_cache_key(self.KIND, self.build_grid_conf(data), self.get_options(data, columnar))
+
+    def get_run_key(self, data):
+        """
+        Content addressed key of the solved agent of a request, a stored run of 
+        the key answers the queries of any request with the same key
+        """
+        options = {name: value for name, value in self.get_options(data).items() if name not in self.OUTPUT_OPTIONS}
+        return make_cache_key(self.KIND, self.build_grid_conf(data), options)
+
+    def get_options(self, data, columnar=False):
+        """
+        Request options that change the result, other than the grid configuration
+        """
+        return {
+            'Columnar': columnar,
+            'Tolerance': data.get('Tolerance'),
+            'PolicyStableSteps': data.get('PolicyStableSteps'),
+            'Schedule': data.get('Schedule', 'synchronous'),
+            'Encoding': data.get('Encoding', 'full'),
+            'KeyframeInterval': data.get('KeyframeInterval', 50),
+            'DeltaTolerance': data.get('DeltaTolerance', 0.0),
+            'CheckpointInterval': data.get('CheckpointInterval')
+        }
+
+    def run_agent_cached(self, data, serialize, columnar=False):
+        """
+        Run the agent through the result cache, truncated results are not cached
+        :param serialize: serializes a result dict to the response bytes
+        :param columnar: return the iterations as packed columns instead of iterations
+        :return serialized result
+        """
+        serialize = metrics.time_serialize(self.KIND, serialize)
+        if self.cache is None or data.get('Store'):
+            return serialize(self.run_agent(data, columnar=columnar))
+        return self.cache.get_or_compute(self.get_cache_key(data, columnar), lambda: self.run_agent(data, columnar=columnar),
+                                         serialize, lambda result: ('iterations' in result or 'columns' in result) and not result.get('truncated'))
+
+    def get_encoder(self, data):
+        """
+        DeltaEncoder for a request that asks for delta encoding, None otherwise
+        """
+        encoding = data.get('Encoding', 'full')
+        if encoding not in ('full', 'delta'):
+            raise ValueError(f"Invalid encoding: {encoding}")
+        if encoding == 'delta':
+            return DeltaEncoder(data.get('KeyframeInterval', 50), data.get('DeltaTolerance', 0.0))
+        return None
+
+    def create_agent(self, data, grid_conf):
+        return self.build_agent(data, Grid(grid_conf))
+
+    def build_agent(self, data, grid):
+        return ValueIterationAgent(grid, engine=data.get('Engine', 'numpy'), tolerance=data.get('Tolerance'),
+                                   policy_stable_steps=data.get('PolicyStableSteps'), schedule=data.get('Schedule', 'synchronous'),
+                                   checkpoint_interval=data.get('CheckpointInterval'))
+
+    def get_summary(self, data, agent, encoder):
+        """
+        Response fields other than the iterations
+        """
+        result = {'message': self.MESSAGE}
+        if data.get('Tolerance') is not None or data.get('PolicyStableSteps') is not None or data.get('Schedule') is not None:
+            result['convergence'] = agent.get_convergence()
+        result.update(agent.get_budget_summary())
+        if data.get('CheckpointInterval') is not None:
+            result['history'] = agent.get_history_memory()
+        if encoder is not None:
+            result['encoding'] = encoder.to_dict()
+        return result
+
+    def get_columns(self, agent):
+        """
+        Response fields of the columnar format: the state and action lists, sent
+        once, and the packed per step arrays
+        """
+        return {'states': agent.get_state_keys(), 'actions': list(agent.ACTIONS), 'columns': agent.get_columns()}
+
+    def solve(self, data, grid_conf, progress_callback=None):
+        """
+        Create the agent of a request and run it
+        :return
+            the solved agent
+        """
+        with metrics.phase('grid'):
+            agent = self.create_agent(data, grid_conf)
+        agent.progress_callback = progress_callback
+        agent.budget = self.limits.get_budget(data, self.BUDGET_FIELDS)
+        agent.timing = metrics.phase
+        agent.history_storage = self.history_storage
+        with metrics.phase('solve'):
             agent.run_agent()
-            json_iterations = agent.get_iterations()
+        metrics.observe_run(self.KIND, agent)
+        return agent
+
+    def run_agent(self, data, progress_callback=None, columnar=False):
+        grid_conf = self.build_grid_conf(data)
+        encoder = self.get_encoder(data)
+        if columnar and encoder is not None:
+            raise ValueError("Delta encoding is not available in the columnar format")
+        try:
+            agent = self.solve(data, grid_conf, progress_callback)
+            if data.get('Store') and self.run_store is not None:
+                return self.store_run(data, agent)
+            with metrics.phase('iterations'):
+                if columnar:
+                    payload = self.get_columns(agent)
+                elif encoder is not None:
+                    payload = {'iterations': agent.get_delta_iterations(encoder)}
+                else:
+                    payload = {'iterations': agent.get_iterations()}
             
         except Exception as e:
             tb = traceback.format_exc()
             return {'message': f"Error in function {tb.splitlines()[-3].strip()} at line {tb.splitlines()[-2].strip()}: {e}"}
         
-        return {
-            'message': 'Value Iteration completed',
-            'iterations': json_iterations
-        }
\ No newline at end of file
+        result = self.get_summary(data, agent, encoder)
+        result.update(payload)
+        return result
+
+    def store_run(self, data, agent):
+        """
+        Keep a solved agent in the run store instead of returning its iterations,
+        a run that was not truncated is stored with its key for later queries
+        :return
+            response with the run id, state list and step count of the stored run
+        """
+        summary = self.get_summary(data, agent, None)
+        key = None if agent.truncated() else self.get_run_key(data)
+        run = self.run_store.put(self.KIND, agent, summary, key, self.get_recipe('solve', data, agent))
+        result = dict(summary)
+        result.update(run.get_metadata())
+        return result
+
+    def get_queries(self, data):
+        """
+        Parse the Queries of a request, a list of {x, y, Step, Type}
+        :raises ValueError: if Queries is missing or a query is invalid
+        """
+        queries = data.get('Queries')
+        if not isinstance(queries, list) or not queries:
+            raise ValueError("Queries must be a non empty list")
+        return [Query.from_dict(query, AgentType.MDP) for query in queries]
+
+    def find_run(self, data):
+        """
+        Stored run that answers the queries of a request: the run of RunId, or the
+        latest stored run with the request's key
+        :return
+            StoredRun, None if there is none
+        :raises KeyError: if RunId does not exist or has expired
+        """
+        if data.get('RunId') is None:
+            return None if self.run_store is None else self.run_store.find(self.get_run_key(data))
+        run = None if self.run_store is None else self.run_store.get(data['RunId'])
+        if run is None:
+            raise KeyError(f"Run not found: {data['RunId']}")
+        if run.kind != self.KIND:
+            raise ValueError(f"Run {data['RunId']} is a {run.kind} run")
+        return run
+
+    def get_or_solve_run(self, data):
+        """
+        Stored run of a request, see find_run, or a new run solved and stored for it
+        :return
+            tuple of (StoredRun, None without a run store, the solved agent and whether 
+            a stored run was reused)
+        :raises KeyError: if RunId does not exist or has expired
+        """
+        run = self.find_run(data)
+        if run is not None:
+            return run, run.agent, True
+        agent = self.solve(data, self.build_grid_conf(data))
+        if self.run_store is not None:
+            key = None if agent.truncated() else self.get_run_key(data)
+            run = self.run_store.put(self.KIND, agent, self.get_summary(data, agent, None), key,
+                                     self.get_recipe('solve', data, agent))
+        return run, agent, False
+
+    def get_recipe(self, action, data, agent):
+        """
+        Request that solves a stored run again in another worker, see restore_run
+        :param action: 'solve' or 'resolve'
+        :return
+            dict of the action and the request without its queries, None if the run 
+            was truncated since a solve of it is not reproducible
+        """
+        if agent.truncated():
+            return None
+        return {'action': action, 'data': {name: value for name, value in data.items() if name not in ('Queries', 'Store')}}
+
+    def restore_run(self, recipe):
+        """
+        Solve the recipe of a run stored by another worker, registered with the run store
+        :return
+            the solved agent, None if it ran out of its budget this time or the base run
+            of an edit is gone
+        """
+        data = recipe['data']
+        if recipe['action'] == 'resolve':
+            try:
+                agent = self.solve_edit(data)[2]
+            except KeyError:
+                return None
+        else:
+            agent = self.solve(data, self.build_grid_conf(data))
+        return None if agent.truncated() else agent
+
+    def answer_queries(self, data):
+        """
+        Answer a batch of queries with a single solve. The agent is solved once and
+        kept in the run store, later batches of the same grid configuration and options,
+        or with its RunId, are answered from the stored run without solving again
+        :return
+            response with the run id, whether a stored run was reused, the step count
+            of the run and the answers in the order of the queries
+        :raises KeyError: if RunId does not exist or has expired
+        """
+        queries = self.get_queries(data)
+        run, agent, reused = self.get_or_solve_run(data)
+        with metrics.phase('answer'):
+            agent.answer_query_batch(queries)
+        result = {'message': 'Queries answered', 'run_id': None if run is None else run.run_id, 'reused': reused,
+                  'steps': agent.get_step_count()}
+        result.update(agent.get_budget_summary())
+        result['answers'] = [query.to_dict() for query in queries]
+        return result
+
+    def resolve(self, data, serialize, columnar=False):
+        """
+        Solve an edited grid warm started from a stored run. The base is the run of RunId,
+        or the run of the request's grid configuration, which is solved and stored first if
+        there is none. Its grid is patched with Edit instead of being built again and the
+        sweeps start from its last values, then only the states the edit reaches are backed
+        up until the values converge again. The
+        edited run is stored as well, its run id is the base of the next edit
+        :param serialize: serializes a result dict to the response bytes
+        :param columnar: return the iterations as packed columns instead of iterations
+        :return
+            serialized run_agent response of the edited grid, with an edit report of the base
+            run id, the edited run id, the number of changed states and the time the patch took
+        :raises KeyError: if RunId does not exist or has expired
+        """
+        encoder = self.get_encoder(data)
+        if columnar and encoder is not None:
+            raise ValueError("Delta encoding is not available in the columnar format")
+        options, base, agent, changed, patch_time = self.solve_edit(data)
+
+        result = self.get_summary(options, agent, None if data.get('Store') else encoder)
+        run = None if self.run_store is None else self.run_store.put(self.KIND, agent, dict(result), None,
+                                                                    self.get_recipe('resolve', data, agent))
+        result['edit'] = {
+            'base_run_id': None if base is None else base.run_id,
+            'run_id': None if run is None else run.run_id,
+            'changed_states': len(changed),
+            'patch_time': round(patch_time, 6)
+        }
+        if data.get('Store') and run is not None:
+            result.update(run.get_metadata())
+            return serialize(result)
+        with metrics.phase('iterations'):
+            if columnar:
+                result.update(self.get_columns(agent))
+            elif encoder is not None:
+                result['iterations'] = agent.get_delta_iterations(encoder)
+            else:
+                result['iterations'] = agent.get_iterations()
+        return metrics.time_serialize(self.KIND, serialize)(result)
+
+    def solve_edit(self, data):
+        """
+        Patch the grid of the base run of a resolve request and solve it warm started, see resolve
+        :return
+            tuple of (the options of the edited agent, the base StoredRun or None without a
+            run store, the solved agent, the indices of the changed states, the patch time)
+        :raises KeyError: if RunId does not exist or has expired
+        """
+        if data.get('Edit') is None:
+            raise ValueError("Missing required field: Edit")
+        edit = GridEdit.from_dict(data['Edit'])
+        options = dict(data)
+        options.setdefault('Schedule', 'synchronous')
+        base, base_agent, _ = self.get_or_solve_run(data)
+
+        with metrics.phase('grid'):
+            start = time.perf_counter()
+            grid, base_indices, changed = base_agent.grid.apply_edit(edit)
+            if data.get('K') is not None:
+                grid = grid.with_parameters(k=data['K'])
+            patch_time = time.perf_counter() - start
+            agent = self.build_agent(options, grid)
+        agent.warm_start_from(base_agent, base_indices, changed)
+        agent.budget = self.limits.get_budget(data, self.BUDGET_FIELDS)
+        agent.timing = metrics.phase
+        agent.history_storage = self.history_storage
+        with metrics.phase('solve'):
+            agent.run_agent()
+        metrics.observe_run(self.KIND, agent)
+        return options, base, agent, changed, patch_time
+
+    def stream_agent(self, data):
+        """
+        Streaming variant of run_agent. Invalid requests raise before anything
+        is streamed, the solve itself only runs while the records are consumed
+        :return
+            generator of {step, iteration} records for every step, followed by
+            a done record with the fields of the run_agent response, or an error record
+        """
+        grid_conf = self.build_grid_conf(data)
+        encoder = self.get_encoder(data)
+        agent = self.create_agent(data, grid_conf)
+        agent.budget = self.limits.get_budget(data, self.BUDGET_FIELDS)
+
+        def records():
+            steps = 0
+            try:
+                for step, iteration in agent.stream_iterations(encoder):
+                    steps = step + 1
+                    yield {'step': step, 'iteration': iteration}
+            except Exception as e:
+                yield {'error': str(e)}
+                return
+            metrics.observe_run(self.KIND, agent)
+            result = self.get_summary(data, agent, encoder)
+            result.update({'done': True, 'steps': steps})
+            yield result
+
+        return records()
@@ -1,10 +1,10 @@
 from app.core.enums import AgentType, QueryType
-from app.core.grid import Grid, GridState, GridCellProperties
-from app.core.agent import ValueIterationAgent, QueryAnsweringAgent, Query, ValueIterationState, QLearningAgent, QLearningState
+from app.core.grid import Grid, GridState, GridCellProperties, TransitionModel, GridEdit
+from app.core.agent import ValueIterationAgent, PolicyIterationAgent, QueryAnsweringAgent, Query, ValueIterationState, QLearningAgent, QLearningState, BatchQLearningAgent, DeltaEncoder, QValueStore, DynaModel, Budget, CheckpointHistory, TrajectoryStore, TrajectoryFilter
 
 __all__ = [
     'AgentType', 'QueryType',
-    'Grid', 'GridState', 'GridCellProperties',
-    'ValueIterationAgent', 'QueryAnsweringAgent', 'Query', 'ValueIterationState',
-    'QLearningAgent', 'QLearningState'
+    'Grid', 'GridState', 'GridCellProperties', 'TransitionModel', 'GridEdit',
+    'ValueIterationAgent', 'PolicyIterationAgent', 'QueryAnsweringAgent', 'Query', 'ValueIterationState',
+    'QLearningAgent', 'QLearningState', 'BatchQLearningAgent', 'DeltaEncoder', 'QValueStore', 'DynaModel', 'Budget', 'CheckpointHistory', 'TrajectoryStore', 'TrajectoryFilter'
 ]
\ No newline at end of file
@@ -1,8 +1,16 @@
 from app.core.agent.value_iteration_agent import ValueIterationAgent
+from app.core.agent.policy_iteration_agent import PolicyIterationAgent
 from app.core.agent.query_answering_agent import QueryAnsweringAgent
 from app.core.agent.query import Query
 from app.core.agent.value_iteration_state import ValueIterationState
 from app.core.agent.q_learning_agent import QLearningAgent
 from app.core.agent.q_learning_state import QLearningState
+from app.core.agent.batch_q_learning_agent import BatchQLearningAgent
+from app.core.agent.delta_encoder import DeltaEncoder
+from app.core.agent.q_value_store import QValueStore
+from app.core.agent.dyna_model import DynaModel
+from app.core.agent.budget import Budget
+from app.core.agent.checkpoint_history import CheckpointHistory
+from app.core.agent.trajectory_store import TrajectoryStore, TrajectoryFilter
 
-__all__ = ['ValueIterationAgent', 'QueryAnsweringAgent', 'Query', 'ValueIterationState', 'QLearningAgent', 'QLearningState']
\ No newline at end of file
+__all__ = ['ValueIterationAgent', 'PolicyIterationAgent', 'QueryAnsweringAgent', 'Query', 'ValueIterationState', 'QLearningAgent', 'QLearningState', 'BatchQLearningAgent', 'DeltaEncoder', 'QValueStore', 'DynaModel', 'Budget', 'CheckpointHistory', 'TrajectoryStore', 'TrajectoryFilter']
\ No newline at end of file
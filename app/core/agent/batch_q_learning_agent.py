@@ -0,0 +1,288 @@
+import numpy as np
+from app.core.grid import Grid, GridState
+from app.core.enums import AgentType, QueryType
+from app.core.agent.query_answering_agent import QueryAnsweringAgent
+from app.core.agent.query import Query
+from app.core.agent.delta_encoder import DeltaEncoder
+
+
+class BatchQLearningAgent(QueryAnsweringAgent):
+    """
+    BatchQLearningAgent Class
+    Runs a number of independent Q-learning agents on the same grid in lockstep.
+    The q values of all agents are one (agents, states, actions) array, every
+    environment step and epsilon greedy choice is a batched array operation over
+    the agents that have not finished the current episode. An episode ends when
+    every agent has terminated, then the mean and standard deviation of the q
+    values over the agents are recorded.
+
+    :param grid: Grid object
+    :param agents: number of independent agents
+    :param visualize_answers: Boolean flag to visualize answers
+    :param epsilon: Epsilon value used in Q-learning
+    :param seed: optional seed of the random generator shared by the agents
+
+    :member
+        q_values - live q values, shape (agents, states, actions)
+        mean_history, std_history - q value mean and std over the agents per episode,
+                                    shape (episodes + 1, states, actions)
+        episode_lengths - actions taken by every agent per episode, shape (episodes + 1, agents)
+        first_update - per state, the first episode in which any agent updated it (episodes + 1 if never)
+        episode - last completed episode
+    """
+    ACTIONS = Grid.ACTIONS
+    MOVE_ACTIONS = Grid.ACTIONS[:Grid.TERMINATE]
+
+    def __init__(self, grid: Grid, agents: int, visualize_answers=False, epsilon=0.4, seed=None):
+        self.agents = int(agents)
+        if self.agents < 1:
+            raise ValueError("Agents must be at least 1")
+        self.seed = seed
+        self.random = np.random.default_rng(seed)
+        self.epsilon = epsilon
+        self.q_values = None
+        self.mean_history = None
+        self.std_history = None
+        self.episode_lengths = None
+        self.first_update = None
+        self.episode = 0
+        super().__init__(grid, visualize_answers)
+
+    def compile_grid(self):
+        """
+        Get the grid as arrays indexed by state (and action)
+        :return: tuple of (next_states, valid_actions, rewards, terminal) where next_states
+                 has shape (states, actions) and is -1 where the episode ends, valid_actions
+                 is a (states, actions) mask of the actions available in each state
+        """
+        states = len(self.grid.state_list)
+        terminal = np.array(self.grid.terminal, dtype=bool)
+        next_states = np.full((states, len(self.ACTIONS)), -1, dtype=np.int64)
+        for i, neighbours in enumerate(self.grid.neighbours):
+            if neighbours is not None:
+                next_states[i, :self.grid.TERMINATE] = neighbours
+        valid_actions = np.zeros((states, len(self.ACTIONS)), dtype=bool)
+        valid_actions[~terminal, :self.grid.TERMINATE] = True
+        valid_actions[terminal, self.grid.TERMINATE] = True
+        return next_states, valid_actions, np.array(self.grid.rewards, dtype=float), terminal
+
+    def run_agent(self):
+        """
+        Runs every agent for the grid's number of episodes
+        """
+        for episode in self.iterate_episodes():
+            self.report_progress(episode)
+
+    def iterate_episodes(self):
+        """
+        Runs the agents episode by episode, recording the mean and std of every episode.
+        An exhausted budget ends the run after recording the interrupted episode
+        :return: generator of the completed episode numbers, starting with episode 0
+        """
+        episodes = self.grid.q_value_episodes
+        states = len(self.grid.state_list)
+        self.q_values = np.zeros((self.agents, states, len(self.ACTIONS)))
+        self.mean_history = self.allocate_history((episodes + 1, states, len(self.ACTIONS)))
+        self.std_history = self.allocate_history((episodes + 1, states, len(self.ACTIONS)))
+        self.episode_lengths = np.zeros((episodes + 1, self.agents), dtype=np.int64)
+        self.first_update = np.full(states, episodes + 1)
+        self.episode = 0
+        with self.time_phase('compile'):
+            arrays = self.compile_grid()
+        self.start_budget()
+        yield 0
+        for e in range(episodes):
+            if self.budget is not None and self.budget.exhausted():
+                return
+            self.run_episode(e + 1, arrays)
+            self.mean_history[e + 1] = self.q_values.mean(axis=0)
+            self.std_history[e + 1] = self.q_values.std(axis=0)
+            self.episode = e + 1
+            yield e + 1
+            if self.truncated():
+                return
+
+    def run_episode(self, episode, arrays):
+        """
+        Run one episode of every agent in lockstep, agents that terminated wait for the others.
+        Every step charges the budget one step per active agent, all agents stop when it
+        is exhausted or the episode reaches its step cap
+        :param episode: number of the episode
+        :param arrays: grid arrays from compile_grid
+        """
+        next_states, valid_actions, rewards, terminal = arrays
+        start = self.grid.index_of(self.grid.robot_start_state)
+        state = np.full(self.agents, start)
+        active = np.arange(self.agents)
+        lengths = self.episode_lengths[episode]
+        alpha = self.grid.alpha
+        discount = self.grid.discount
+        terminate = self.grid.TERMINATE
+        budget = self.budget
+        step = 0
+        while len(active):
+            if budget is not None and (budget.cap_episode(step) or not budget.charge(len(active))):
+                break
+            step += 1
+            s = state[active]
+            count = len(active)
+            q_values = self.q_values[active, s]
+            valid = valid_actions[s]
+
+            # greedy action with random tie breaking, or a random valid action with probability epsilon
+            masked = np.where(valid, q_values, -np.inf)
+            ties = masked == masked.max(axis=1, keepdims=True)
+            greedy = np.argmax(ties * self.random.random(ties.shape), axis=1)
+            random_actions = np.where(terminal[s], terminate, self.random.integers(0, terminate, count))
+            actions = np.where(self.random.random(count) < self.epsilon, random_actions, greedy)
+
+            is_terminal = terminal[s]
+            new_states = next_states[s, actions]
+            reward = rewards[s]
+            # max q value of the reached state, unused for agents that terminate
+            reached = np.where(is_terminal, s, new_states)
+            max_q_values = np.where(valid_actions[reached], self.q_values[active, reached], -np.inf).max(axis=1)
+            sample = reward + discount * max_q_values
+            updated = np.where(is_terminal, reward, (1 - alpha) * q_values[np.arange(count), actions] + alpha * sample)
+            self.q_values[active, s, actions] = updated
+            self.first_update[s] = np.minimum(self.first_update[s], episode)
+
+            lengths[active] += 1
+            state[active] = new_states
+            active = active[~is_terminal]
+
+    def get_step_count(self) -> int:
+        """
+        Number of recorded episodes, including episode 0
+        """
+        return 0 if self.mean_history is None else self.episode + 1
+
+    def get_history_memory(self):
+        """
+        Memory report of the recorded q value mean and std
+        :return: dict with the mode ("full") and the bytes of the history
+        """
+        histories = [history for history in (self.mean_history, self.std_history) if history is not None]
+        return {'mode': 'full', 'bytes': sum(history.nbytes for history in histories),
+                'spilled': any(isinstance(history, np.memmap) for history in histories)}
+
+    def get_q_values_dict(self, values, episode, states=None):
+        """
+        Build the per state action -> value dicts of a recorded episode, in the same
+        schema as QLearningAgent. Terminal states only list Terminate once they have been updated
+        :param values: (states, actions) array of the episode
+        :param episode: recorded episode number
+        :param states: optional iterable of state indices, defaults to every state
+        :return: dict of "x,y" -> {action: value}
+        """
+        rows = values.tolist()
+        terminate = self.grid.TERMINATE
+        if states is None:
+            states = range(len(rows))
+        q_values = {}
+        for i in states:
+            state = self.grid.state_list[i]
+            row = rows[i]
+            action_values = dict(zip(self.MOVE_ACTIONS, row))
+            if self.grid.terminal[i] and self.first_update[i] <= episode:
+                action_values['Terminate'] = row[terminate]
+            q_values[f"{state.x},{state.y}"] = action_values
+        return q_values
+
+    def format_episode(self, episode, states=None):
+        """
+        Format one recorded episode
+        :return: dict with the q value mean and std over the agents and the episode length of every agent
+        """
+        return {
+            "q_values": self.get_q_values_dict(self.mean_history[episode], episode, states),
+            "q_value_std": self.get_q_values_dict(self.std_history[episode], episode, states),
+            "episode_lengths": self.episode_lengths[episode].tolist() if episode > 0 else []
+        }
+
+    def get_iterations(self, start=0, stop=None, stride=1):
+        """
+        Get the recorded episodes of a window, every episode by default
+        :param start, stop, stride: window of episodes, with python slice semantics
+        :return: dict of episode -> {q_values, q_value_std, episode_lengths}
+        """
+        return {episode: self.format_episode(episode) for episode in self.get_step_window(start, stop, stride)}
+
+    def get_columns(self, start=0, stop=None, stride=1):
+        """
+        Get the recorded episodes of a window as packed arrays, for the columnar format
+        :param start, stop, stride: window of episodes, with python slice semantics
+        :return: dict with "steps" (uint32, episodes), "q_values" and "q_value_std" (float32,
+                 episodes x states x actions), "first_update" (uint32 per state) and
+                 "episode_lengths" (uint32, episodes x agents)
+        """
+        steps = self.get_step_window(start, stop, stride)
+        window = slice(steps.start, steps.stop, steps.step)
+        return {
+            'steps': np.array(steps, dtype=np.uint32),
+            'q_values': self.mean_history[window].astype(np.float32),
+            'q_value_std': self.std_history[window].astype(np.float32),
+            'first_update': self.first_update.astype(np.uint32),
+            'episode_lengths': self.episode_lengths[window].astype(np.uint32)
+        }
+
+    def get_delta_iterations(self, encoder: DeltaEncoder, start=0, stop=None, stride=1):
+        """
+        Same per episode schema as get_iterations, but only keyframe episodes list
+        every state, other episodes list the states whose mean or std changed since
+        they were last emitted
+        :param encoder: DeltaEncoder with the keyframe interval and tolerance to use
+        :param start, stop, stride: window of episodes, the first episode of a window is always a keyframe
+        """
+        json_iterations = {}
+        for episode in self.get_step_window(start, stop, stride):
+            values = np.stack((self.mean_history[episode], self.std_history[episode]), axis=2)
+            changed = encoder.changed(episode, values, self.first_update <= episode)
+            json_iterations[episode] = self.format_episode(episode, changed.tolist())
+        return json_iterations
+
+    def stream_iterations(self, encoder: DeltaEncoder = None):
+        """
+        Run the agents and yield every episode as soon as all agents finished it
+        :param encoder: optional DeltaEncoder, episodes are then delta encoded
+        :return: generator of (episode, same per episode output as get_iterations)
+        """
+        for episode in self.iterate_episodes():
+            if encoder is None:
+                yield episode, self.format_episode(episode)
+            else:
+                yield episode, self.get_delta_iterations(encoder, episode, episode + 1)[episode]
+
+    def get_summary(self):
+        """
+        Summary of the episode lengths over all episodes
+        :return: dict with the mean and std of the episode length per episode, over the agents
+        """
+        lengths = self.episode_lengths[1:self.episode + 1]
+        return {
+            'agents': self.agents,
+            'mean_episode_length': lengths.mean(axis=1).tolist(),
+            'std_episode_length': lengths.std(axis=1).tolist()
+        }
+
+    def find_query_value(self, query: Query):
+        """
+        Evaluates a given query against the mean q values recorded at the query's step
+        :param query: Query object
+        :return: max mean q value of the state or its best action
+        """
+        state = self.grid.index_of(GridState(query.x, query.y))
+        episode = min(query.step, self.episode)
+        row = self.mean_history[episode][state]
+        action = max(self.grid.get_action_indices(state), key=lambda a: row[a])
+
+        if query.query_type == QueryType.BEST_POLICY:
+            return self.ACTIONS[action]
+        return float(row[action])
+
+    def get_agent_type(self) -> AgentType:
+        """
+        Returns the AgentType of the object
+        :return: AgentType.RL
+        """
+        return AgentType.RL
@@ -0,0 +1,97 @@
+import time
+from typing import Optional
+
+
+class Budget:
+    """
+    Budget Class
+    Bounds the work of a single run. The agents charge it from their inner loops,
+    once it is exhausted they stop and keep the steps completed so far.
+
+    :param max_episode_steps: Q-learning only, an episode that takes this many
+                              environment steps ends there without reaching a terminal state
+    :param max_steps: maximum number of environment steps of the whole run
+    :param time_limit: seconds the run may take, counted from start
+
+    :member
+        steps - environment steps charged so far
+        capped_episodes - number of episodes ended by max_episode_steps
+        reason - "max_steps" or "time_limit" once the budget is exhausted, None before
+    """
+    MAX_STEPS = 'max_steps'
+    TIME_LIMIT = 'time_limit'
+
+    def __init__(self, max_episode_steps: Optional[int] = None, max_steps: Optional[int] = None,
+                 time_limit: Optional[float] = None):
+        self.max_episode_steps = None if max_episode_steps is None else int(max_episode_steps)
+        self.max_steps = None if max_steps is None else int(max_steps)
+        self.time_limit = None if time_limit is None else float(time_limit)
+        if self.max_episode_steps is not None and self.max_episode_steps < 1:
+            raise ValueError("Max episode steps must be at least 1")
+        if self.max_steps is not None and self.max_steps < 1:
+            raise ValueError("Max steps must be at least 1")
+        if self.time_limit is not None and self.time_limit <= 0:
+            raise ValueError("Time limit must be positive")
+        self.start()
+
+    def start(self):
+        """
+        Reset the counters and start the clock, called when a run starts
+        """
+        self.started = time.monotonic()
+        self.deadline = None if self.time_limit is None else self.started + self.time_limit
+        self.steps = 0
+        self.capped_episodes = 0
+        self.reason = None
+
+    @property
+    def truncated(self) -> bool:
+        return self.reason is not None
+
+    def exhausted(self) -> bool:
+        """
+        Check the step count and the clock, without charging anything
+        :return: True once the run has to stop
+        """
+        if self.reason is None:
+            if self.max_steps is not None and self.steps >= self.max_steps:
+                self.reason = self.MAX_STEPS
+            elif self.deadline is not None and time.monotonic() >= self.deadline:
+                self.reason = self.TIME_LIMIT
+        return self.reason is not None
+
+    def charge(self, steps: int = 1) -> bool:
+        """
+        Charge the next environment steps, a batch of agents charges one step per active agent
+        :return: False, without charging, if the budget is exhausted
+        """
+        if self.exhausted():
+            return False
+        self.steps += steps
+        return True
+
+    def cap_episode(self, episode_steps: int) -> bool:
+        """
+        Check if an episode reached max_episode_steps, a capped episode is counted
+        :param episode_steps: environment steps the episode has taken
+        :return: True if the episode has to end
+        """
+        if self.max_episode_steps is not None and episode_steps >= self.max_episode_steps:
+            self.capped_episodes += 1
+            return True
+        return False
+
+    def to_dict(self):
+        """
+        Budget report of the run, for the response
+        """
+        return {
+            'truncated': self.truncated,
+            'reason': self.reason,
+            'steps': self.steps,
+            'capped_episodes': self.capped_episodes,
+            'elapsed': round(time.monotonic() - self.started, 3),
+            'max_episode_steps': self.max_episode_steps,
+            'max_steps': self.max_steps,
+            'time_limit': self.time_limit
+        }
@@ -0,0 +1,131 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Tuple
+import numpy as np
+
+
+class CheckpointHistory:
+    """
+    CheckpointHistory Class
+    History of a deterministic run that only keeps every interval-th step and the
+    last step. Any other step is recomputed forward from the closest earlier
+    checkpoint or cached step with the run's step function, the cache_size most
+    recently requested steps are kept in an LRU. Reading a window of steps in order
+    recomputes one step per step. A step is a tuple of arrays and other values,
+    the advance function maps a step to the next one.
+
+    :member
+        interval - steps between checkpoints
+        advance - callable mapping the tuple of a step to the tuple of the next step
+        cache_size - number of recomputed steps kept
+        checkpoints - step number -> tuple of the step
+        cache - OrderedDict of step number -> tuple of the step, least recently used first
+        count - number of recorded steps
+        recomputed - number of steps recomputed so far
+    """
+    def __init__(self, interval: int, advance: Callable[[Tuple], Tuple], cache_size: int = 32):
+        if int(interval) < 1:
+            raise ValueError("Checkpoint interval must be at least 1")
+        self.interval = int(interval)
+        self.advance = advance
+        self.cache_size = int(cache_size)
+        self.checkpoints = {}
+        self.cache = OrderedDict()
+        self.count = 0
+        self.recomputed = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def record(self, step: int, entry: Tuple):
+        """
+        Record the next step of the run, steps are recorded in order starting with 0.
+        The previous step is dropped unless it is a checkpoint, so the last step is always kept
+        :param step: step number, the number of recorded steps
+        :param entry: tuple of the step, it must not be modified afterwards
+        """
+        if step != self.count:
+            raise ValueError(f"Step {step} recorded after step {self.count - 1}")
+        if self.count and (self.count - 1) % self.interval:
+            del self.checkpoints[self.count - 1]
+        self.checkpoints[step] = entry
+        self.count = step + 1
+
+    def get(self, step: int) -> Tuple:
+        """
+        Get a recorded step, recomputing it if it is neither a checkpoint nor cached
+        :param step: step number, negative numbers count from the end
+        :return: tuple of the step, it must not be modified
+        """
+        if step < 0:
+            step += self.count
+        if not 0 <= step < self.count:
+            raise IndexError(f"Step {step} has not been recorded")
+        entry = self.checkpoints.get(step)
+        if entry is not None:
+            return entry
+        with self.lock:
+            entry = self.cache.get(step)
+            if entry is not None:
+                self.cache.move_to_end(step)
+                return entry
+            start = max((cached for cached in self.cache if step - step % self.interval < cached < step),
+                        default=step - step % self.interval)
+            entry = self.cache[start] if start in self.cache else self.checkpoints[start]
+            for _ in range(start, step):
+                entry = self.advance(entry)
+            self.recomputed += step - start
+            self.cache[step] = entry
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            return entry
+
+    def column(self, index: int) -> 'CheckpointColumn':
+        """
+        Get an array like view of one member of every step's tuple
+        """
+        return CheckpointColumn(self, index)
+
+    def get_bytes(self) -> int:
+        """
+        Bytes of the arrays kept by the checkpoints and the cache
+        """
+        entries = list(self.checkpoints.values()) + list(self.cache.values())
+        return sum(value.nbytes for entry in entries for value in entry if isinstance(value, np.ndarray))
+
+    def to_dict(self):
+        """
+        Memory report of the history, for the response
+        """
+        return {
+            'mode': 'checkpoint',
+            'bytes': self.get_bytes(),
+            'checkpoint_interval': self.interval,
+            'checkpoints': len(self.checkpoints),
+            'cached_steps': len(self.cache),
+            'recomputed_steps': self.recomputed
+        }
+
+
+class CheckpointColumn:
+    """
+    CheckpointColumn Class
+    Read only view of one member of the steps of a CheckpointHistory that is indexed
+    like a history array: by step, or by a slice of steps which returns a new array
+    """
+    def __init__(self, history: CheckpointHistory, index: int):
+        self.history = history
+        self.index = index
+
+    def __len__(self):
+        return len(self.history)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            rows = [self.history.get(step)[self.index] for step in range(len(self))[key]]
+            if rows:
+                return np.stack(rows)
+            first = self.history.get(0)[self.index]
+            return np.zeros((0,) + first.shape, dtype=first.dtype)
+        return self.history.get(int(key))[self.index]
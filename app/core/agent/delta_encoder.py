@@ -0,0 +1,65 @@
+import numpy as np
+
+
+class DeltaEncoder:
+    """
+    DeltaEncoder Class
+    Encodes a step history as a full keyframe every keyframe_interval steps
+    and, in between, deltas that only list the cells that changed.
+
+    A cell is compared against the last value that was emitted for it, not
+    the previous step, so small changes below the tolerance can not add up
+    to a drift on the client side.
+
+    :member
+        keyframe_interval - every step that is a multiple of it is a keyframe
+        tolerance - a value has to change by more than this to be emitted
+    """
+    def __init__(self, keyframe_interval=50, tolerance=0.0):
+        self.keyframe_interval = int(keyframe_interval)
+        self.tolerance = float(tolerance)
+        if self.keyframe_interval < 1:
+            raise ValueError("Keyframe interval must be at least 1")
+        if self.tolerance < 0:
+            raise ValueError("Delta tolerance cannot be negative")
+        self.emitted_values = None
+        self.emitted_labels = None
+
+    def is_keyframe(self, step) -> bool:
+        """
+        Check if a step is encoded as a full keyframe
+        :param step: step number
+        """
+        return self.emitted_values is None or step % self.keyframe_interval == 0
+
+    def changed(self, step, values, labels=None) -> np.ndarray:
+        """
+        Get the cells to emit for a step and remember them as emitted
+        :param step: step number, steps have to be passed in order
+        :param values: array with one row per cell, extra axes are compared elementwise
+        :param labels: optional array with one label per cell (e.g. best action), 
+                       any label change is emitted regardless of tolerance
+        :return array of indices of the cells to emit
+        """
+        values = np.asarray(values, dtype=float)
+        if self.is_keyframe(step):
+            self.emitted_values = values.copy()
+            self.emitted_labels = None if labels is None else np.array(labels)
+            return np.arange(len(values))
+
+        difference = np.abs(values - self.emitted_values)
+        if difference.ndim > 1:
+            difference = difference.reshape(len(values), -1).max(axis=1)
+        mask = difference > self.tolerance
+        if labels is not None:
+            mask |= labels != self.emitted_labels
+            self.emitted_labels[mask] = labels[mask]
+        self.emitted_values[mask] = values[mask]
+        return np.flatnonzero(mask)
+
+    def to_dict(self):
+        return {
+            'type': 'delta',
+            'keyframe_interval': self.keyframe_interval,
+            'tolerance': self.tolerance
+        }
@@ -0,0 +1,57 @@
+from typing import List, Optional, Tuple
+
+
+class DynaModel:
+    """
+    DynaModel Class
+    Learned model of the environment for Dyna-Q planning. The grid's moves are
+    deterministic, so the last observed outcome of a (state, action) pair is its model.
+
+    :member
+        outcomes - (state, action) -> (reward, next state index or None when the episode ends)
+        pairs - observed (state, action) pairs in order of first observation, for uniform sampling
+        predecessors - per state index, set of the observed (state, action) pairs that lead to it
+    """
+    def __init__(self, states: int):
+        self.outcomes = {}
+        self.pairs = []
+        self.predecessors = [set() for _ in range(states)]
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def observe(self, state: int, action: int, reward: float, next_state: Optional[int]):
+        """
+        Record a real transition
+        :param state: state index the action was taken in
+        :param action: action index
+        :param reward: reward of the transition
+        :param next_state: state index that was reached, None if the episode ended
+        """
+        if (state, action) not in self.outcomes:
+            self.pairs.append((state, action))
+        self.outcomes[(state, action)] = (reward, next_state)
+        if next_state is not None:
+            self.predecessors[next_state].add((state, action))
+
+    def get(self, state: int, action: int) -> Tuple[float, Optional[int]]:
+        """
+        Get the modelled outcome of an observed (state, action) pair
+        :return: tuple of (reward, next state index or None)
+        """
+        return self.outcomes[(state, action)]
+
+    def sample(self, random) -> Tuple[int, int, float, Optional[int]]:
+        """
+        Draw an observed transition uniformly
+        :param random: random generator with choice
+        :return: tuple of (state, action, reward, next state index or None)
+        """
+        state, action = random.choice(self.pairs)
+        return (state, action, *self.outcomes[(state, action)])
+
+    def get_predecessors(self, state: int) -> List[Tuple[int, int]]:
+        """
+        Get the observed (state, action) pairs that lead to a state
+        """
+        return list(self.predecessors[state])
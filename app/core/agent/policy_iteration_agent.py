@@ -0,0 +1,182 @@
+import numpy as np
+from app.core.grid import Grid
+from app.core.agent.value_iteration_agent import ValueIterationAgent
+from app.core.agent.value_iteration_state import ValueIterationState
+
+
+class PolicyIterationAgent(ValueIterationAgent):
+    """
+    PolicyIterationAgent Class
+    Alternates policy evaluation and greedy policy improvement. Every step is one
+    policy iteration, recorded in the same per step schema as value iteration: the
+    values of the evaluated policy and the greedy policy with respect to them.
+    The grid's k is the maximum number of policy iterations.
+    :param
+        evaluation: "exact" solves the linear system V = R_pi + discount * P_pi V of the
+                    current policy, "modified" applies evaluation_steps backups of it
+                    starting from the previous values (modified policy iteration), "auto"
+                    is exact up to EXACT_MAX_STATES states and modified above. The exact
+                    solve is dense, O(states^3) time and 8 * states^2 bytes per iteration,
+                    so it is refused above EXACT_MAX_STATES
+        evaluation_steps: number of backups per modified evaluation
+        tolerance, policy_stable_steps: additional stopping criteria, see ValueIterationAgent.
+                    Exact evaluation always stops once the policy is stable, modified
+                    evaluation once the policy is stable and the values changed by less
+                    than tolerance (MODIFIED_TOLERANCE by default)
+        checkpoint_interval: keep only every checkpoint_interval-th policy iteration, see ValueIterationAgent
+    """
+    EVALUATIONS = ('auto', 'exact', 'modified')
+    MODIFIED_TOLERANCE = 1e-9
+    # largest grid evaluated exactly, the dense system takes 8 MB and about 40 ms per iteration
+    EXACT_MAX_STATES = 1000
+
+    def __init__(self, grid: Grid, visualize_answers = False, evaluation = 'auto', evaluation_steps = 20,
+                 tolerance = None, policy_stable_steps = None, checkpoint_interval = None):
+        if evaluation not in self.EVALUATIONS:
+            raise ValueError(f"Invalid evaluation: {evaluation}, expected one of {self.EVALUATIONS}")
+        states = len(grid.state_list)
+        if evaluation == 'auto':
+            evaluation = 'exact' if states <= self.EXACT_MAX_STATES else 'modified'
+        elif evaluation == 'exact' and states > self.EXACT_MAX_STATES:
+            raise ValueError(f"Exact evaluation is limited to {self.EXACT_MAX_STATES} states, the grid has {states}, "
+                             "use modified evaluation")
+        self.evaluation = evaluation
+        self.evaluation_steps = int(evaluation_steps)
+        if self.evaluation_steps < 1:
+            raise ValueError("Evaluation steps must be at least 1")
+        super().__init__(grid, visualize_answers, engine='numpy', tolerance=tolerance,
+                         policy_stable_steps=policy_stable_steps, checkpoint_interval=checkpoint_interval)
+
+    def warm_start_from(self, agent, base_indices, affected = None):
+        """
+        Start from the last values and policy of another agent, see ValueIterationAgent.
+        Every policy iteration evaluates and improves every state, the affected states are not used
+        """
+        super().warm_start_from(agent, base_indices)
+
+    def evaluate_policy(self, policy, values, arrays):
+        """
+        Evaluate a policy on the compiled grid
+        :param
+            policy - move action index per state, ignored for terminal states
+            values - values of the previous policy, the start of a modified evaluation
+            arrays - tuple of (next_states, probabilities, rewards, terminal) from compile_grid
+        :return
+            values of the policy
+        """
+        next_states, probabilities, rewards, terminal = arrays
+        rows = np.arange(len(policy))
+        policy_next = next_states[rows, policy]
+        policy_probabilities = probabilities[rows, policy]
+        policy_rewards = rewards[rows, policy]
+        terminal_rewards = np.array(self.grid.rewards, dtype=float)[terminal]
+        discount = self.grid.discount
+
+        if self.evaluation == 'modified':
+            for _ in range(self.evaluation_steps):
+                new_values = np.zeros(len(policy))
+                for j in range(policy_next.shape[1]):
+                    new_values += policy_probabilities[:, j] * (policy_rewards[:, j] + discount * values[policy_next[:, j]])
+                new_values[terminal] = terminal_rewards
+                values = new_values
+            return values
+
+        # terminal rows of the system are V(s) = reward
+        expected_rewards = (policy_probabilities * policy_rewards).sum(axis=1)
+        expected_rewards[terminal] = terminal_rewards
+        transitions = np.zeros((len(policy), len(policy)))
+        for j in range(policy_next.shape[1]):
+            np.add.at(transitions, (rows, policy_next[:, j]), policy_probabilities[:, j])
+        transitions[terminal] = 0.0
+        try:
+            return np.linalg.solve(np.eye(len(policy)) - discount * transitions, expected_rewards)
+        except np.linalg.LinAlgError as e:
+            raise ValueError(f"Policy evaluation failed, the policy has no finite value ({e}), "
+                             "use modified evaluation or a discount below 1")
+
+    def iterate_policy(self, values, policy, arrays):
+        """
+        One policy iteration: evaluation of the policy and greedy improvement, the 
+        current action is kept when it ties with the best one
+        :param
+            values - values of the previous policy
+            policy - move action index per state
+            arrays - tuple of (next_states, probabilities, rewards, terminal) from compile_grid
+        :return
+            tuple of (values of the policy, action indices into ACTIONS, improved policy)
+        """
+        next_states, probabilities, rewards, terminal = arrays
+        with self.time_phase('evaluate'):
+            new_values = self.evaluate_policy(policy, values, arrays)
+        q_values = np.zeros(probabilities.shape[:2])
+        for j in range(next_states.shape[2]):
+            q_values += probabilities[:, :, j] * (rewards[:, :, j] + self.grid.discount * new_values[next_states[:, :, j]])
+        rows = np.arange(len(policy))
+        best_actions = np.argmax(q_values, axis=1)
+        keep = q_values[rows, policy] >= q_values[rows, best_actions]
+        new_policy = np.where(keep, policy, best_actions)
+        new_actions = new_policy.astype(np.int8)
+        new_actions[terminal] = self.grid.TERMINATE
+        return new_values, new_actions, new_policy
+
+    def get_convergence(self):
+        """
+        Convergence report of the last run, with the evaluation that was used
+        """
+        result = super().get_convergence()
+        result['evaluation'] = self.evaluation
+        return result
+
+    def get_step_function(self):
+        """
+        Function that recomputes a policy iteration of the history from the previous
+        one. The policy of a terminal state does not change any recorded value or
+        action, so the recorded actions stand in for the policy
+        """
+        arrays = self.compile_grid()
+        terminate = self.grid.TERMINATE
+
+        def step(entry):
+            values, actions = entry
+            policy = np.where(actions < terminate, actions, 0).astype(np.intp)
+            return self.iterate_policy(values, policy, arrays)[:2]
+        return step
+
+    def sweep_numpy(self):
+        """
+        Policy iterations as arrays. Step 0 is the initial policy (North everywhere)
+        with zero values, like value iteration's step 0, or the warm start
+        :return
+            generator of (step, values, action indices into ACTIONS), a new pair of
+            arrays is yielded for every step
+        """
+        arrays = self.compile_grid()
+        terminal = arrays[3]
+        terminate = self.grid.TERMINATE
+
+        self.reset_convergence()
+        values, actions = self.get_initial_arrays()
+        # a state that was terminal in the warm start has no move action yet
+        policy = np.where(actions < terminate, actions, 0).astype(np.intp)
+        if self.initial_values is None:
+            self.state_values = dict(zip(self.states, (ValueIterationState() for _ in self.states)))
+        else:
+            self.set_state_values(values, actions)
+        yield 0, values, actions
+        for k in range(self.grid.k):
+            new_values, new_actions, new_policy = self.iterate_policy(values, policy, arrays)
+            # the improvement backs up every state once, modified evaluation evaluation_steps times more
+            self.backups += len(policy) * (1 + (self.evaluation_steps if self.evaluation == 'modified' else 0))
+            residual = float(np.max(np.abs(new_values - values))) if len(values) else 0.0
+            policy_changed = bool(np.any(new_actions != actions))
+            stable = bool(np.all(new_policy[~terminal] == policy[~terminal]))
+            values, actions, policy = new_values, new_actions, new_policy
+            converged = self.has_converged(k + 1, residual, policy_changed)
+            if not converged and stable and (self.evaluation == 'exact' or residual < (self.tolerance or self.MODIFIED_TOLERANCE)):
+                self.converged_step = k + 1
+                converged = True
+            if converged or k + 1 == self.grid.k:
+                self.set_state_values(values, actions)
+            yield k + 1, values, actions
+            if converged:
+                break
@@ -1,50 +1,99 @@
+import heapq
 import random
+import numpy as np
 from app.core.grid import Grid, GridState
 from app.core.enums import AgentType, QueryType
 from app.core.agent.query_answering_agent import QueryAnsweringAgent
 from app.core.agent.query import Query
 from app.core.agent.q_learning_state import QLearningState
-import copy
+from app.core.agent.q_value_store import QValueStore
+from app.core.agent.delta_encoder import DeltaEncoder
+from app.core.agent.dyna_model import DynaModel
+from app.core.agent.checkpoint_history import CheckpointHistory
+from app.core.agent.trajectory_store import TrajectoryStore, TrajectoryFilter
+from app.core.agent.budget import Budget
 class QLearningAgent(QueryAnsweringAgent):
     """
     QLearningAgent Class
     :param grid: Grid object
     :param visualize_answers: Boolean flag to visualize answers
     :param epsilon: Epsilon value used in Q-learning 
+    :param seed: optional seed for a private random generator, the global random module is used without it
+    :param planning_steps: Dyna-Q planning updates after every real step, drawn from a DynaModel
+                           of the observed transitions. 0 is plain Q-learning
+    :param prioritized_planning: draw the planning updates in order of their TD error
+                                 (prioritized sweeping) instead of uniformly
+    :param checkpoint_interval: keep only the q values of every checkpoint_interval-th episode and 
+                                of the last episode, the other episodes are replayed from them when 
+                                they are read, see CheckpointHistory. Needs a seed and no planning
     """
-    def __init__(self, grid: Grid, visualize_answers=False, epsilon=0.4):
-        self.q_values = {}
+    ACTIONS = Grid.ACTIONS
+    MOVE_ACTIONS = Grid.ACTIONS[:Grid.TERMINATE]
+    # TD errors below it are not queued by prioritized planning
+    PRIORITY_THRESHOLD = 1e-6
+
+    def __init__(self, grid: Grid, visualize_answers=False, epsilon=0.4, seed=None, planning_steps=0,
+                 prioritized_planning=False, checkpoint_interval=None):
+        self.planning_steps = int(planning_steps)
+        if self.planning_steps < 0:
+            raise ValueError("Planning steps cannot be negative")
+        if checkpoint_interval is not None:
+            if seed is None:
+                raise ValueError("Checkpoints need a seed to replay the episodes")
+            if self.planning_steps:
+                raise ValueError("Checkpoints are not available with planning")
+            if int(checkpoint_interval) < 1:
+                raise ValueError("Checkpoint interval must be at least 1")
+        self.checkpoint_interval = None if checkpoint_interval is None else int(checkpoint_interval)
+        self.history = None
+        self.prioritized_planning = bool(prioritized_planning)
+        self.model = None
+        self.priorities = {}
+        self.queue = []
+        self.planning_updates = 0
+        self.q_values = None
+        self.seed = seed
+        self.random = random if seed is None else random.Random(seed)
+        self.terminal_states = []
         self.epsilon = epsilon
-        self.iterations = {}
-        self.state_sequences = {}
+        self.trajectories = TrajectoryStore()
         super().__init__(grid, visualize_answers)
 
     def __str__(self):
         """
         Override str method to print data dictionary of q values
         """
-        return "\n".join(f"[ {str(k)} | Actions: {str(v)} ]" for k, v in self.q_values.items())
+        return "\n".join(f"[ {str(k)} | Actions: {str(v)} ]" for k, v in self.get_q_states(self.q_values.episode).items())
         
-    def initialize_q_values(self):
+    def initialize_q_values(self, keep_history=True):
         """
         Initializes q values of the grid to zero
+        :param keep_history: record the q values of every episode
         """
-        self.q_values.clear()
-        for state in self.grid.get_states():
-            self.q_values[state] = QLearningState()
+        self.q_values = QValueStore(self.grid.state_list, self.ACTIONS, self.grid.q_value_episodes, keep_history,
+                                    self.allocate_history)
+        self.terminal_states = self.grid.terminal
+        self.model = DynaModel(len(self.grid.state_list))
+        self.priorities = {}
+        self.queue = []
+        self.planning_updates = 0
 
-    def get_max_q_value_and_action(self, state):
+    def get_max_q_value_and_action(self, state, q_values=None):
         """
-        Calculates the max q value and best policy(direction) of a given GridState (x,y) of a grid
-        :param state: GridState that has x,y values
-        :return: tuple(float, string) where float is the corresponding max q value of the state and string is one of the direction with the max q value ("N","S","W","E")
+        Calculates the max q value and best policy(direction) of a given state of a grid
+        :param state: state index
+        :param q_values: optional (states, actions) view of a recorded episode, defaults to the live q values
+        :return: tuple(float, int) where float is the corresponding max q value of the state and int is the index of an action with the max q value
         """
-        actions = self.grid.get_actions_from_state(state)
-        random.shuffle(actions)
+        if q_values is None:
+            q_values = self.q_values.current
+        row = q_values[state].tolist()
+        actions = self.grid.get_action_indices(state)
+        self.random.shuffle(actions)
         max_q_value = float('-inf')
         best_action = None
         for action in actions:
-            q_value = self.q_values[state].get_q_value(action)
+            q_value = row[action]
             if q_value > max_q_value:
                 max_q_value = q_value
                 best_action = action
@@ -53,74 +102,371 @@ class QLearningAgent(QueryAnsweringAgent):
     def receive_sample(self, state, action, new_state, reward):
         """
         Incorporate the new sample estimate into a running average 
-        :param state: GridState (x,y) of the new sample
-        :param action: new action of the sample
-        :param new_state: GridState(x',y') that was reached by the action
+        :param state: state index of the new sample
+        :param action: action index of the sample
+        :param new_state: state index that was reached by the action
         :param reward: reward associated with reaching new_state
         """
-        if self.grid.is_terminal_state(state):
-            self.q_values[state].update_q_value(action, reward)
+        if self.grid.terminal[state]:
+            self.q_values.update_q_value(state, action, reward)
         else:
             max_q_value = self.get_max_q_value_and_action(new_state)[0]
             sample = reward + self.grid.discount * max_q_value
-            new_q_value = (1 - self.grid.alpha) * self.q_values[state].get_q_value(action) + self.grid.alpha * sample
-            self.q_values[state].update_q_value(action, new_q_value)
+            new_q_value = (1 - self.grid.alpha) * float(self.q_values.get_q_value(state, action)) + self.grid.alpha * sample
+            self.q_values.update_q_value(state, action, new_q_value)
+
+    def get_td_error(self, state, action, new_state, reward):
+        """
+        Absolute TD error of a transition under the live q values, without touching the random generator
+        :return: float
+        """
+        if self.grid.terminal[state]:
+            target = reward
+        else:
+            row = self.q_values.current[new_state]
+            target = reward + self.grid.discount * max(float(row[a]) for a in self.grid.get_action_indices(new_state))
+        return abs(target - float(self.q_values.get_q_value(state, action)))
 
-    def find_query_answer(self, query: Query) -> str:
+    def queue_pair(self, state, action, priority):
+        """
+        Queue a (state, action) pair for prioritized planning, if its priority is above the threshold
+        """
+        if priority > self.PRIORITY_THRESHOLD and priority > self.priorities.get((state, action), 0.0):
+            self.priorities[(state, action)] = priority
+            heapq.heappush(self.queue, (-priority, state, action))
+
+    def queue_predecessors(self, state):
+        """
+        Queue the modelled (state, action) pairs that lead to a state whose q values changed
         """
-        Evaluates a given query 
+        for predecessor, action in self.model.get_predecessors(state):
+            reward, _ = self.model.get(predecessor, action)
+            self.queue_pair(predecessor, action, self.get_td_error(predecessor, action, state, reward))
+
+    def plan(self, state, action, new_state, reward):
+        """
+        Dyna-Q: record a real transition in the model and run the planning updates,
+        they stop early once the budget is exhausted and the episode ends at its next step
+        :param state, action, new_state, reward: the real transition, after its q value update
+        """
+        self.model.observe(state, action, reward, new_state)
+        if not self.prioritized_planning:
+            for i in range(self.planning_steps):
+                if self.budget_exhausted(i + 1):
+                    break
+                state, action, reward, new_state = self.model.sample(self.random)
+                self.receive_sample(state, action, new_state, reward)
+                self.planning_updates += 1
+            return
+
+        self.queue_pair(state, action, self.get_td_error(state, action, new_state, reward))
+        self.queue_predecessors(state)
+        updates = 0
+        while self.queue and updates < self.planning_steps:
+            if self.budget_exhausted(updates + 1):
+                break
+            priority, state, action = heapq.heappop(self.queue)
+            if self.priorities.get((state, action)) != -priority:
+                # superseded by a later push
+                continue
+            del self.priorities[(state, action)]
+            reward, new_state = self.model.get(state, action)
+            self.receive_sample(state, action, new_state, reward)
+            updates += 1
+            self.queue_predecessors(state)
+        self.planning_updates += updates
+
+    def find_query_value(self, query: Query):
+        """
+        Evaluates a given query against the q values recorded at the query's step.
+        Ties are broken by the first action with the max q value, so the answers of a
+        recorded run do not depend on, or advance, the random generator
         :param query: Query object
-        :return: string of answer of given query
+        :return: max q value of the state or its best action
         """
-        state = GridState(query.x, query.y)
-        q_value_query, action_query = self.get_max_q_value_and_action(state)
+        state = self.grid.index_of(GridState(query.x, query.y))
+        episode = min(query.step, self.q_values.episode)
+        row = self.q_values.episode_view(episode)[state].tolist()
+        action = max(self.grid.get_action_indices(state), key=lambda a: row[a])
 
-        if query.query_type in [QueryType.BEST_Q_VALUE, QueryType.STATE_VALUE]:
-            return f"{q_value_query:.2f}"
-        elif query.query_type == QueryType.BEST_POLICY:
-            return query.direction_dict[action_query]
-        return ""
+        if query.query_type == QueryType.BEST_POLICY:
+            return self.ACTIONS[action]
+        return row[action]
 
-    def run_agent(self):
+    def run_agent(self, keep_history=True):
         """
         Runs Q learning algorithm 
+        :param keep_history: record the q values of every episode, only the final q values are kept without it
+        """
+        if self.checkpoint_interval is not None:
+            self.run_checkpoint_agent()
+            return
+        self.history = None
+        self.initialize_q_values(keep_history)
+        self.trajectories = TrajectoryStore()
+        for episode, state_sequence, episode_return in self.iterate_episodes():
+            self.trajectories.append(state_sequence, episode_return)
+            self.report_progress(episode)
+
+    def run_checkpoint_agent(self):
+        """
+        Runs Q learning and records the checkpoints of the history: the q values and the
+        random generator state at the end of the episode. The trajectories are small
+        and kept for every episode
+        """
+        self.initialize_q_values(keep_history=False)
+        self.history = CheckpointHistory(self.checkpoint_interval, self.get_step_function())
+        self.q_values.checkpoints = self.history
+        self.trajectories = TrajectoryStore()
+        for episode, state_sequence, episode_return in self.iterate_episodes():
+            self.history.record(episode, (self.q_values.current.copy(), self.random.getstate()))
+            self.trajectories.append(state_sequence, episode_return)
+            self.report_progress(episode)
+
+    def get_step_function(self):
+        """
+        Function that replays the episode after a recorded one, for the CheckpointHistory.
+        The replay starts from the recorded q values and random generator state and
+        caps the episodes like the run did, so it takes the same steps as the run
+        :return: callable mapping the (q values, random state) of an episode to 
+                 those of the next episode
+        """
+        replay = QLearningAgent(self.grid, epsilon=self.epsilon, seed=self.seed)
+        replay.initialize_q_values(keep_history=False)
+        max_episode_steps = None if self.budget is None else self.budget.max_episode_steps
+
+        def step(entry):
+            q_values, random_state = entry
+            replay.q_values.current[:] = q_values
+            replay.random.setstate(random_state)
+            replay.budget = None if max_episode_steps is None else Budget(max_episode_steps=max_episode_steps)
+            replay.run_episode()
+            return replay.q_values.current.copy(), replay.random.getstate()
+        return step
+
+    def get_state_sequence(self, episode, keys=None):
+        """
+        Get the state sequence of a recorded episode as "x,y" keys
+        :param keys: optional list of the state keys, see get_state_keys
+        """
+        if keys is None:
+            keys = self.get_state_keys()
+        return [keys[state] for state in self.trajectories.get(episode).tolist()]
+
+    def format_sequences(self, episode, trajectories: TrajectoryFilter = None, keys=None):
+        """
+        Add the state sequence of an episode to its output, if the filter includes it
+        :param trajectories: optional TrajectoryFilter, every sequence is included without it
+        :return: dict with "sequences", empty if the episode is not included
+        """
+        if trajectories is not None and not trajectories.includes(episode, len(self.trajectories)):
+            return {}
+        return {"sequences": self.get_state_sequence(episode, keys)}
+
+    def get_trajectory_summary(self):
+        """
+        Summary of the trajectories, computed from the run length encoded arrays
+        :return: dict with the per episode "lengths" (visited states) and "returns" (sum of
+                 the collected rewards) and the "visits" of every visited state by "x,y" key
+        """
+        visits = self.trajectories.get_visits(len(self.grid.state_list))
+        keys = self.get_state_keys()
+        return {
+            'lengths': self.trajectories.lengths.tolist(),
+            'returns': self.trajectories.returns.tolist(),
+            'visits': {keys[state]: int(visits[state]) for state in np.flatnonzero(visits).tolist()}
+        }
+
+    def get_history_memory(self):
+        """
+        Memory report of the recorded q values
+        :return: dict with the mode ("full" or "checkpoint") and the bytes of the history,
+                 see CheckpointHistory.to_dict for the checkpoint fields
+        """
+        if self.history is not None:
+            report = self.history.to_dict()
+        else:
+            history = None if self.q_values is None else self.q_values.history
+            report = {'mode': 'full', 'bytes': 0 if history is None else history.nbytes,
+                      'spilled': isinstance(history, np.memmap)}
+        report['trajectory_bytes'] = self.trajectories.get_bytes()
+        return report
+
+    def iterate_episodes(self):
         """
-        self.initialize_q_values()
-        self.state_sequences[0] = []
-        self.iterations[0] =copy.deepcopy( self.q_values)
+        Runs Q learning episode by episode, the q values of the yielded episode
+        are the live q values until the generator is resumed. With a budget every
+        environment step is charged to it, an exhausted budget ends the run after
+        yielding the interrupted episode
+        :return: generator of (episode, state sequence, return), starting with episode 0
+        """
+        budget = self.budget
+        self.start_budget()
+        yield 0, [], 0.0
         for e in range(self.grid.q_value_episodes):
-            state = self.grid.robot_start_state
-            state_sequence = [str(state)]
-            while state is not None:
-                exploration = random.random()
-                if exploration < self.epsilon:
-                    action = random.choice(self.grid.get_actions_from_state(state))
-                else:
-                    action = self.get_max_q_value_and_action(state)[1]
-                reward = self.grid.get_reward(state)
-                new_state = self.grid.transistion(state, action)
-                self.receive_sample(state, action, new_state, reward)
-                state = new_state
-                if state is not None:
-                    state_sequence.append(str(state))
-            self.state_sequences[e+1] = state_sequence
-            self.iterations[e + 1] =copy.deepcopy( self.q_values)
-    def get_iterations(self):
+            if budget is not None and budget.exhausted():
+                return
+            self.q_values.start_episode()
+            yield (e + 1,) + self.run_episode()
+            if budget is not None and budget.truncated:
+                return
+
+    def run_episode(self):
+        """
+        Runs one episode from the start state on the live q values. With a budget
+        every environment step is charged to it, the episode ends early once it is
+        capped or the budget is exhausted
+        :return: tuple of the state sequence of the episode, as state indices, and 
+                 the sum of the rewards collected in it
+        """
+        budget = self.budget
+        state = self.grid.index_of(self.grid.robot_start_state)
+        state_sequence = [state]
+        episode_return = 0.0
+        while state is not None:
+            if budget is not None and (budget.cap_episode(len(state_sequence) - 1) or not budget.charge()):
+                break
+            exploration = self.random.random()
+            if exploration < self.epsilon:
+                action = self.random.choice(self.grid.get_action_indices(state))
+            else:
+                action = self.get_max_q_value_and_action(state)[1]
+            reward = self.grid.rewards[state]
+            episode_return += reward
+            new_state = self.grid.transistion_index(state, action)
+            self.receive_sample(state, action, new_state, reward)
+            if self.planning_steps:
+                self.plan(state, action, new_state, reward)
+            state = new_state
+            if state is not None:
+                state_sequence.append(state)
+        return state_sequence, episode_return
+
+    def get_q_values_dict(self, episode, states=None):
+        """
+        Build the per state action -> q value dicts of a recorded episode
+        Terminal states only list Terminate once they have been updated
+        :param episode: recorded episode number
+        :param states: optional iterable of state indices, defaults to every state
+        :return: dict of "x,y" -> {action: q value}
+        """
+        rows = self.q_values.episode_view(episode).tolist()
+        updated = self.q_values.updated_by(episode)
+        terminate = self.grid.TERMINATE
+        if states is None:
+            states = range(len(rows))
+        q_values = {}
+        for i in states:
+            state = self.q_values.states[i]
+            row = rows[i]
+            action_q_values = dict(zip(self.MOVE_ACTIONS, row))
+            if updated[i] and self.terminal_states[i]:
+                action_q_values['Terminate'] = row[terminate]
+            q_values[f"{state.x},{state.y}"] = action_q_values
+        return q_values
+
+    def get_q_states(self, episode):
+        """
+        Get the q values of a recorded episode as QLearningState objects
+        :param episode: recorded episode number
+        :return: dict of GridState -> QLearningState
+        """
+        return {
+            state: QLearningState(action_q_values)
+            for state, action_q_values in zip(self.q_values.states, self.get_q_values_dict(episode).values())
+        }
+
+    def get_step_count(self) -> int:
+        """
+        Number of recorded episodes, including episode 0
+        """
+        return 0 if self.q_values is None else len(self.q_values)
+
+    def get_iterations(self, start=0, stop=None, stride=1, trajectories: TrajectoryFilter = None):
+        """
+        Get the recorded episodes of a window, every episode by default
+        :param start, stop, stride: window of episodes, with python slice semantics
+        :param trajectories: optional TrajectoryFilter of the episodes that list their sequences
+        :return: dict of episode -> {q_values, sequences}
+        """
+        keys = self.get_state_keys()
+        json_iterations = {}
+        for episode in self.get_step_window(start, stop, stride):
+            json_iterations[episode] = {"q_values": self.get_q_values_dict(episode)}
+            json_iterations[episode].update(self.format_sequences(episode, trajectories, keys))
+        return json_iterations
+
+    def get_columns(self, start=0, stop=None, stride=1, trajectories: TrajectoryFilter = None):
+        """
+        Get the recorded episodes of a window as packed arrays, for the columnar format
+        :param start, stop, stride: window of episodes, with python slice semantics
+        :param trajectories: optional TrajectoryFilter of the episodes that list their sequences
+        :return: dict with "steps" (uint32, episodes), "q_values" (float32, episodes x states x actions),
+                 "first_update" (uint32 per state, a terminal state lists Terminate from that episode on),
+                 "sequence_steps" (uint32, the episodes of the window whose sequences are included),
+                 "sequences" (uint32 state indices of their state sequences, concatenated) and
+                 "sequence_offsets" (uint32, sequence_steps + 1, sequence i is sequences[offsets[i]:offsets[i + 1]])
+        """
+        steps = self.get_step_window(start, stop, stride)
+        q_values = self.q_values.window_view(steps) if len(steps) else \
+            np.zeros((0, len(self.grid.state_list), len(self.ACTIONS)))
+        episodes = len(self.trajectories)
+        sequence_steps = [episode for episode in steps if trajectories is None or trajectories.includes(episode, episodes)]
+        sequences = [self.trajectories.get(episode) for episode in sequence_steps]
+        offsets = np.zeros(len(sequences) + 1, dtype=np.uint32)
+        offsets[1:] = np.cumsum([len(sequence) for sequence in sequences])
+        return {
+            'steps': np.array(steps, dtype=np.uint32),
+            'q_values': q_values.astype(np.float32),
+            'first_update': self.q_values.first_update.astype(np.uint32),
+            'sequence_steps': np.array(sequence_steps, dtype=np.uint32),
+            'sequences': np.concatenate(sequences).astype(np.uint32) if sequences else np.zeros(0, dtype=np.uint32),
+            'sequence_offsets': offsets
+        }
+
+    def get_delta_iterations(self, encoder: DeltaEncoder, start=0, stop=None, stride=1, trajectories: TrajectoryFilter = None):
+        """
+        Same per episode schema as get_iterations, but only keyframe episodes list 
+        every state, other episodes list the states whose q values changed since 
+        they were last emitted
+        :param encoder: DeltaEncoder with the keyframe interval and tolerance to use
+        :param start, stop, stride: window of episodes, the first episode of a window is always a keyframe
+        :param trajectories: optional TrajectoryFilter of the episodes that list their sequences
+        """
+        keys = self.get_state_keys()
         json_iterations = {}
-        for episode, q_values in self.iterations.items():
-            
-            json_iterations[episode] = {
-                "q_values": {
-                    f"{state.x},{state.y}": action_q_values.to_dict()
-                    for state, action_q_values in q_values.items()
-                },
-                "sequences": self.state_sequences[episode]
-            }
+        for episode in self.get_step_window(start, stop, stride):
+            # a terminal state gains its Terminate entry on its first update, even if the value is 0
+            changed = encoder.changed(episode, self.q_values.episode_view(episode), self.q_values.updated_by(episode))
+            json_iterations[episode] = {"q_values": self.get_q_values_dict(episode, changed.tolist())}
+            json_iterations[episode].update(self.format_sequences(episode, trajectories, keys))
         return json_iterations
 
+    def stream_iterations(self, encoder: DeltaEncoder = None, trajectories: TrajectoryFilter = None):
+        """
+        Run Q learning and yield every episode as soon as it ends, only the live
+        q values and the compact trajectories are kept in memory
+        :param encoder: optional DeltaEncoder, episodes are then delta encoded
+        :param trajectories: optional TrajectoryFilter of the episodes that list their sequences,
+                             "last" counts back from the configured number of episodes
+        :return: generator of (episode, same per episode output as get_iterations)
+        """
+        self.initialize_q_values(keep_history=False)
+        self.trajectories = TrajectoryStore()
+        keys = self.get_state_keys()
+        for episode, state_sequence, episode_return in self.iterate_episodes():
+            self.trajectories.append(state_sequence, episode_return)
+            states = None
+            if encoder is not None:
+                states = encoder.changed(episode, self.q_values.current, self.q_values.updated_by(episode)).tolist()
+            iteration = {"q_values": self.get_q_values_dict(episode, states)}
+            if trajectories is None or trajectories.includes(episode, self.grid.q_value_episodes + 1):
+                iteration["sequences"] = [keys[state] for state in state_sequence]
+            yield episode, iteration
+
     def get_agent_type(self) -> AgentType:
         """
         Returns the AgentType of the object
         :return: AgentType.RL
         """
-        return AgentType.RL
\ No newline at end of file
+        return AgentType.RL
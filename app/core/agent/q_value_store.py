@@ -0,0 +1,112 @@
+from typing import Callable, List
+import numpy as np
+
+
+class QValueStore:
+    """
+    QValueStore Class
+    Holds the q values of every episode in one preallocated float array
+    indexed by (episode, state, action). The row of the episode that is 
+    being learned is the live q table, it starts as a copy of the previous
+    episode so no per episode snapshot has to be taken.
+    Without keep_history only the live row is allocated and only the current
+    episode can be viewed, for streaming runs whose memory must stay flat.
+    The history is allocated by allocate, which may return a memory mapped array.
+    With checkpoints only the live row is allocated too, the other episodes are
+    read from the CheckpointHistory, whose steps start with the q values.
+
+    :member
+        states - list of states, position is the state index
+        actions - list of actions, position is the action index
+        (q values are read and written by state and action index)
+        history - array of shape (episodes + 1, states, actions), (1, states, actions) without keep_history
+        first_update - per state, the first episode that updated it (episodes + 1 if never)
+        episode - episode whose row is the live q table
+        checkpoints - optional CheckpointHistory of the episodes, set by the agent
+    """
+    def __init__(self, states: List, actions: List[str], episodes: int, keep_history: bool = True,
+                 allocate: Callable = np.zeros):
+        self.states = list(states)
+        self.actions = list(actions)
+        self.keep_history = keep_history
+        self.history = allocate((episodes + 1 if keep_history else 1, len(self.states), len(self.actions)))
+        self.first_update = np.full(len(self.states), episodes + 1)
+        self.episode = 0
+        self.current = self.history[0]
+        self.checkpoints = None
+
+    def __len__(self):
+        """
+        Number of recorded episodes, including the initial episode 0
+        """
+        return self.episode + 1
+
+    def start_episode(self) -> int:
+        """
+        Make the next episode's row the live q table
+        :return: the new episode number
+        """
+        self.episode += 1
+        if self.keep_history:
+            self.history[self.episode] = self.current
+            self.current = self.history[self.episode]
+        return self.episode
+
+    def get_q_value(self, state: int, action: int) -> float:
+        """
+        Gets the live q value of a state and action
+        :param state: state index
+        :param action: action index
+        """
+        return self.current[state, action]
+
+    def update_q_value(self, state: int, action: int, q_value: float):
+        """
+        Updates the live q value of a state and action
+        :param state: state index
+        :param action: action index
+        :param q_value: new q value
+        """
+        self.current[state, action] = q_value
+        if self.first_update[state] > self.episode:
+            self.first_update[state] = self.episode
+
+    def episode_view(self, episode: int) -> np.ndarray:
+        """
+        Get the q values of an episode without copying
+        :param episode: recorded episode number
+        :return: read only array view of shape (states, actions)
+        """
+        if not 0 <= episode <= self.episode or \
+           (not self.keep_history and self.checkpoints is None and episode != self.episode):
+            raise ValueError(f"Episode {episode} has not been recorded")
+        if self.keep_history:
+            view = self.history[episode].view()
+        elif episode == self.episode:
+            view = self.history[0].view()
+        else:
+            view = self.checkpoints.get(episode)[0].view()
+        view.flags.writeable = False
+        return view
+
+    def window_view(self, episodes: range) -> np.ndarray:
+        """
+        Get the q values of a window of episodes without copying
+        :param episodes: range of recorded episode numbers, with a positive step
+        :return: read only array view of shape (episodes, states, actions)
+        """
+        if not self.keep_history:
+            return np.stack([self.episode_view(episode) for episode in episodes])
+        if len(episodes) and not 0 <= episodes[0] <= episodes[-1] <= self.episode:
+            raise ValueError(f"Episodes {episodes} have not been recorded")
+        view = self.history[episodes.start:episodes.start + len(episodes) * episodes.step:episodes.step].view()
+        view.flags.writeable = False
+        return view
+
+    def updated_by(self, episode: int) -> np.ndarray:
+        """
+        Get which states had been updated at least once by the end of an episode
+        :param episode: recorded episode number
+        :return: boolean array with one entry per state
+        """
+        return self.first_update <= episode
@@ -3,7 +3,7 @@ from app.core.enums import AgentType, QueryType
 class Query:
     def __init__(self, x: int, y: int, step: int, agent_type: AgentType, query_type: QueryType):
         if agent_type == AgentType.MDP and query_type == QueryType.BEST_Q_VALUE:
-            raise Exception("Invalid Query, MDP agent cannot answer bestQValue query")
+            raise ValueError("Invalid Query, MDP agent cannot answer bestQValue query")
 
         self.x = int(x)
         self.y = int(y)
@@ -11,10 +11,35 @@ class Query:
         self.agent_type = agent_type
         self.query_type = query_type
         self.answer = None
+        self.value = None
         self.direction_dict = {"S": "Go South", "N": "Go North", "W": "Go West", "E": "Go East", "Terminate": "Terminate State Collect Reward"}
 
+    @classmethod
+    def from_dict(cls, data: dict, agent_type: AgentType) -> 'Query':
+        """
+        Create a query from its request fields: x, y, Step and Type (a QueryType value)
+        :raises ValueError: if a field is missing or invalid
+        """
+        try:
+            return cls(data['x'], data['y'], data['Step'], agent_type, QueryType(data['Type']))
+        except KeyError as e:
+            raise ValueError(f"Invalid query {data}: missing field {e.args[0]}")
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid query {data}: {e}")
+
     def is_answered(self) -> bool:
         return self.answer is not None
     
-    def set_answer(self, answer: str):
-        self.answer = answer
\ No newline at end of file
+    def set_answer(self, answer: str, value=None):
+        self.answer = answer
+        self.value = value
+
+    def to_dict(self) -> dict:
+        return {
+            'x': self.x,
+            'y': self.y,
+            'step': self.step,
+            'type': self.query_type.value,
+            'value': self.value,
+            'answer': self.answer
+        }
@@ -1,7 +1,9 @@
+from contextlib import nullcontext
 from typing import List
-from app.core.grid import Grid
+import numpy as np
+from app.core.grid import Grid, GridState
 from app.core.agent.query import Query
-from app.core.enums import AgentType
+from app.core.enums import AgentType, QueryType
 
 
 class QueryAnsweringAgent:
@@ -13,12 +15,24 @@ class QueryAnsweringAgent:
         visualize_answers: specifies whether grid will be printed 
                            when queries are answered
         queries: map of step to queries to run for that step
+        progress_callback: optional callable that receives every completed step
+        budget: optional Budget that bounds the work of a run, see truncated
+        timing: optional callable that takes a phase name and returns a context
+                manager timing the phase, see time_phase
+        history_storage: optional object whose allocate(shape, dtype) returns the zero
+                filled history arrays, e.g. memory mapped files, see allocate_history
     """
+    # iterations of an inner loop between two budget checks, see budget_exhausted
+    BUDGET_CHECK_INTERVAL = 256
 
     def __init__(self, grid: Grid, visualize_answers: bool) -> None:
         self.grid = grid
         self.queries = {}
         self.visualize_answers = visualize_answers
+        self.progress_callback = None
+        self.budget = None
+        self.timing = None
+        self.history_storage = None
     
     def pretty_print(self, query = None) -> str:
         """
@@ -34,18 +48,141 @@ class QueryAnsweringAgent:
         """        
         pass
 
+    def get_step_count(self) -> int:
+        """
+        Get the number of recorded steps, including step 0. Override in child classes.
+        """
+        pass
+
+    def get_history_memory(self) -> dict:
+        """
+        Get the memory report of the recorded history: its mode and bytes. Override in child classes.
+        """
+        pass
+
+    def get_step_window(self, start: int = 0, stop: int = None, stride: int = 1) -> range:
+        """
+        Get the recorded steps of a window, with python slice semantics
+
+        :param start: first step of the window
+        :param stop: step after the last step of the window, default is every step
+        :param stride: take every stride-th step of the window
+        :return range of steps
+        """
+        if int(stride) < 1:
+            raise ValueError("Stride must be at least 1")
+        return range(self.get_step_count())[slice(start, stop, int(stride))]
+
+    def get_state_keys(self) -> List[str]:
+        """
+        Get the "x,y" keys of all states in state index order
+        """
+        return [str(state) for state in self.grid.state_list]
+
+    def report_progress(self, step: int) -> None:
+        """
+        Report a completed step to the progress callback, if one is set
+
+        :param step: step (or episode) that was just completed
+        """
+        if self.progress_callback is not None:
+            self.progress_callback(step)
+
+    def time_phase(self, name: str):
+        """
+        Context manager timing a phase of the run with the timing callable, if one is set
+
+        :param name: phase name
+        """
+        return nullcontext() if self.timing is None else self.timing(name)
+
+    def allocate_history(self, shape, dtype=float) -> np.ndarray:
+        """
+        Allocate a zero filled history array with the history storage, if one is set
+
+        :param shape: shape of the array, steps first
+        :param dtype: numpy dtype of the array
+        """
+        if self.history_storage is None:
+            return np.zeros(shape, dtype=dtype)
+        return self.history_storage.allocate(shape, dtype)
+
+    @staticmethod
+    def trim_history(history: np.ndarray, length: int) -> np.ndarray:
+        """
+        Drop the preallocated steps after the first length steps of a history array.
+        An array in memory is copied so the dropped steps are freed, a memory mapped
+        one is sliced, its dropped steps take no memory
+
+        :param history: history array, steps first
+        :param length: number of steps to keep
+        """
+        if isinstance(history, np.memmap):
+            return history[:length]
+        return history[:length].copy()
+
+    def start_budget(self) -> None:
+        """
+        Start the budget's clock and counters, if one is set, called when a run starts
+        """
+        if self.budget is not None:
+            self.budget.start()
+
+    def budget_exhausted(self, count: int) -> bool:
+        """
+        Check the budget from an inner loop, e.g. the backups of a sweep or the planning
+        updates of a step. The clock is only read every BUDGET_CHECK_INTERVAL iterations,
+        reading it on every iteration would cost about as much as the work it bounds
+        :param count: iterations of the loop so far
+        :return: True once the run has to stop
+        """
+        return self.budget is not None and count % self.BUDGET_CHECK_INTERVAL == 0 and self.budget.exhausted()
+
+    def truncated(self) -> bool:
+        """
+        Check if the last run stopped early because its budget was exhausted
+        """
+        return self.budget is not None and self.budget.truncated
+
+    def get_budget_summary(self) -> dict:
+        """
+        Response fields of the budget: the truncated flag, and the budget report if
+        the budget truncated the run or capped any episode. Empty without a budget
+        """
+        if self.budget is None:
+            return {}
+        summary = {'truncated': self.budget.truncated}
+        if self.budget.truncated or self.budget.capped_episodes:
+            summary['budget'] = self.budget.to_dict()
+        return summary
+
     def get_agent_type(self) -> AgentType:
         """
         Get Agent Type. Override in child classes.
         """        
         pass
     
-    def find_query_answer(self, query: Query) -> str:
+    def find_query_value(self, query: Query):
+        """
+        Find the value of the given query in the recorded history: a float for value 
+        queries, an action of Grid.ACTIONS for bestPolicy. Override in child classes.
         """
-        Find Answer for the given query. Override in child classes.
-        """        
         pass
 
+    def find_query_answer(self, query: Query) -> str:
+        """
+        Find Answer for the given query, formatted from find_query_value
+        """
+        return self.format_query_answer(query, self.find_query_value(query))
+
+    def format_query_answer(self, query: Query, value) -> str:
+        """
+        Format the value of a query, see find_query_value, as its answer
+        """
+        if query.query_type == QueryType.BEST_POLICY:
+            return query.direction_dict[value]
+        return f"{value:.2f}"
+
     def answer_queries(self, step) -> None:
         """
         Answer all queries for a given step. 
@@ -60,19 +197,50 @@ class QueryAnsweringAgent:
 
     def answer_query(self, query: Query) -> None:
         """
-        Answer a given query. 
-        Calls find_query_answer and pretty_print implemented in child classes
+        Answer a given query. The value is looked up once and the answer is formatted
+        from it. Calls find_query_value and pretty_print implemented in child classes
 
         :param query: Query to answer
         """        
         if query.is_answered():
             return
 
-        answer = self.find_query_answer(query)
+        value = self.find_query_value(query)
+        answer = self.format_query_answer(query, value)
         if self.visualize_answers:
             answer += "\n"+ self.pretty_print(query) 
             
-        query.set_answer(answer)
+        query.set_answer(answer, value)
+
+    def validate_query(self, query: Query) -> None:
+        """
+        Check that a query can be answered by this agent
+
+        :param query: Query to check
+        :raises ValueError: if the query is for another agent type, its step is 
+                            negative or its state is not a state of the grid
+        """
+        if query.agent_type != self.get_agent_type():
+            raise ValueError(f"Invalid query, {self.get_agent_type().value} agent cannot answer {query.agent_type.value} queries")
+        if query.step < 0:
+            raise ValueError(f"Invalid query step: {query.step}")
+        if GridState(query.x, query.y) not in self.grid.state_index:
+            raise ValueError(f"Invalid query state: {query.x},{query.y} does not exist in the grid or is a boulder")
+
+    def answer_query_batch(self, queries: List[Query]) -> List[Query]:
+        """
+        Answer queries against the recorded history of a finished run, in any order of
+        steps. Every answer is a lookup of the query's (step, state) in the history, a
+        step after the last recorded step is answered from the last one
+
+        :param queries: List of queries, all of them are validated before any is answered
+        :return the answered queries
+        """
+        for query in queries:
+            self.validate_query(query)
+        for query in queries:
+            self.answer_query(query)
+        return queries
 
     def get_queries_to_answer(self, step: int) -> List[Query]:
         """
@@ -0,0 +1,123 @@
+from array import array
+from typing import Iterable, Optional
+import numpy as np
+
+
+class TrajectoryStore:
+    """
+    TrajectoryStore Class
+    State sequences of the episodes of a Q-learning run, kept as state indices instead
+    of "x,y" strings. Consecutive visits of the same state (moves against a wall or a
+    boulder) are run length encoded: a run is a state index and the number of times it
+    was visited in a row. The runs of every episode are concatenated in growable arrays,
+    an episode is the range offsets[episode]:offsets[episode + 1] of them.
+
+    :member
+        states - state index of every run (int32)
+        repeats - visits in a row of every run (uint32)
+        offsets - first run of every episode and the end of the last one (int64, episodes + 1)
+        lengths - visited states of every episode, including the start state (uint32)
+        returns - sum of the rewards collected in every episode (float64)
+    """
+    def __init__(self):
+        self.states = array('i')
+        self.repeats = array('I')
+        self.offsets = array('q', [0])
+        self.lengths = array('I')
+        self.returns = array('d')
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def append(self, sequence: Iterable[int], episode_return: float = 0.0):
+        """
+        Record the state sequence of the next episode
+        :param sequence: state indices visited in order
+        :param episode_return: sum of the rewards collected in the episode
+        """
+        states, repeats = self.states, self.repeats
+        previous = None
+        length = 0
+        for state in sequence:
+            if state == previous:
+                repeats[-1] += 1
+            else:
+                states.append(state)
+                repeats.append(1)
+                previous = state
+            length += 1
+        self.offsets.append(len(states))
+        self.lengths.append(length)
+        self.returns.append(episode_return)
+
+    def get_runs(self, episode: int):
+        """
+        Get the run length encoded sequence of an episode
+        :return: tuple of (state indices, visits in a row) arrays
+        """
+        start, stop = self.offsets[episode], self.offsets[episode + 1]
+        return np.array(self.states[start:stop], dtype=np.int32), np.array(self.repeats[start:stop], dtype=np.uint32)
+
+    def get(self, episode: int) -> np.ndarray:
+        """
+        Get the state sequence of an episode
+        :return: int32 array of the visited state indices
+        """
+        states, repeats = self.get_runs(episode)
+        return np.repeat(states, repeats)
+
+    def get_visits(self, state_count: int) -> np.ndarray:
+        """
+        Visits of every state over all episodes, counted from the runs
+        :return: int64 array of the visit count per state index
+        """
+        states = np.array(self.states, dtype=np.int64)
+        return np.bincount(states, weights=np.array(self.repeats, dtype=np.float64),
+                           minlength=state_count).astype(np.int64)
+
+    def get_bytes(self) -> int:
+        """
+        Bytes of the recorded arrays
+        """
+        return sum(len(values) * values.itemsize for values in (self.states, self.repeats, self.offsets, self.lengths, self.returns))
+
+
+class TrajectoryFilter:
+    """
+    TrajectoryFilter Class
+    Selects the episodes whose state sequences are sent with a response
+
+    :param mode: "all" sends every sequence, "last" the last count episodes of the run,
+                 "every" every count-th episode, "summary" none but the per episode
+                 lengths and returns and the visit counts of the states
+    :param count: the N of "last" and "every"
+    """
+    MODES = ('all', 'last', 'every', 'summary')
+
+    def __init__(self, mode: str = 'all', count: Optional[int] = None):
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid trajectories: {mode}, expected one of {', '.join(self.MODES)}")
+        if mode in ('last', 'every') and (count is None or int(count) < 1):
+            raise ValueError(f"Trajectories {mode} needs a TrajectoryCount of at least 1")
+        self.mode = mode
+        self.count = None if count is None else int(count)
+
+    def includes(self, episode: int, episodes: int) -> bool:
+        """
+        Check if the sequence of an episode is sent
+        :param episode: episode number
+        :param episodes: number of recorded episodes of the run
+        """
+        if self.mode == 'all':
+            return True
+        if self.mode == 'last':
+            return episode >= episodes - self.count
+        if self.mode == 'every':
+            return episode % self.count == 0
+        return False
+
+    def to_dict(self):
+        """
+        Settings of the filter, for the response
+        """
+        return {'mode': self.mode, 'count': self.count}
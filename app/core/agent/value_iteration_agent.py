@@ -1,18 +1,88 @@
+import heapq
+import numpy as np
 from app.core.grid import Grid, GridState
 from app.core.enums import AgentType, QueryType
 from app.core.agent.query_answering_agent import QueryAnsweringAgent
 from app.core.agent.query import Query
 from app.core.agent.value_iteration_state import ValueIterationState
+from app.core.agent.delta_encoder import DeltaEncoder
+from app.core.agent.checkpoint_history import CheckpointHistory
 
 class ValueIterationAgent(QueryAnsweringAgent):
     """
     ValueIterationAgent Class
     :param 
         state_values: dictionary of states .
+        values: ValueIterationState of the current sweep per state index
+        engine: "numpy" runs every sweep as a batched array operation over the
+                compiled grid, "python" runs one Bellman backup per state and action
+        tolerance: stop once the Bellman residual max|V_k+1 - V_k| drops below it
+        policy_stable_steps: stop once the greedy policy is unchanged for this many sweeps
+        schedule: order of the Bellman backups. "synchronous" backs up every state from
+                  the previous sweep's values, "gauss-seidel" sweeps the states in place 
+                  so later states already read this sweep's values, "prioritized" backs 
+                  up the state with the largest pending Bellman error first, one step is 
+                  then one sweep's worth of backups. The in place schedules run on the 
+                  compiled grid and record their history like the numpy engine
+        backups: number of state backups of the last run
+        initial_values, initial_actions: arrays per state index the sweeps start from
+                  instead of zero values and North, see warm_start_from
+        affected_states: state indices whose Bellman error may be non zero at the start, 
+                  the synchronous numpy sweeps then only back up the states their changes
+                  reach (see sweep_incremental) and prioritized sweeping only seeds its 
+                  queue from them. None checks every state
+        checkpoint_interval: keep only every checkpoint_interval-th step and the last step
+                  of the history, the other steps are recomputed when they are read, see 
+                  CheckpointHistory. Needs a schedule whose step only depends on the previous 
+                  step's values (synchronous or gauss-seidel), and no affected_states with 
+                  the synchronous schedule
+        history: the CheckpointHistory of the last run with a checkpoint_interval
     """
-    def __init__(self, grid: Grid, visualize_answers = False):
+    ENGINES = ('numpy', 'python')
+    SCHEDULES = ('synchronous', 'gauss-seidel', 'prioritized')
+    # schedules whose steps can be recomputed from the previous step
+    CHECKPOINT_SCHEDULES = ('synchronous', 'gauss-seidel')
+    ACTIONS = Grid.ACTIONS
+    # pending Bellman errors below it are dropped by prioritized sweeping without a tolerance
+    PRIORITY_THRESHOLD = 1e-12
+    # incremental sweeps back up every state once more than this fraction of the states is reached
+    FULL_SWEEP_FRACTION = 0.25
+
+    def __init__(self, grid: Grid, visualize_answers = False, engine = 'numpy', tolerance = None, policy_stable_steps = None,
+                 schedule = 'synchronous', checkpoint_interval = None):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Invalid engine: {engine}, expected one of {self.ENGINES}")
+        if schedule not in self.SCHEDULES:
+            raise ValueError(f"Invalid schedule: {schedule}, expected one of {self.SCHEDULES}")
+        if schedule != 'synchronous' and engine != 'numpy':
+            raise ValueError(f"The {schedule} schedule runs on the numpy engine only")
+        if checkpoint_interval is not None:
+            if engine != 'numpy':
+                raise ValueError("Checkpoints are only available on the numpy engine")
+            if schedule not in self.CHECKPOINT_SCHEDULES:
+                raise ValueError(f"Checkpoints are not available with the {schedule} schedule, "
+                                 f"expected one of {self.CHECKPOINT_SCHEDULES}")
+            if int(checkpoint_interval) < 1:
+                raise ValueError("Checkpoint interval must be at least 1")
+        self.checkpoint_interval = None if checkpoint_interval is None else int(checkpoint_interval)
+        self.history = None
+        self.schedule = schedule
         self.state_values = {}
+        self.values = []
         self.iterations = {}
+        self.engine = engine
+        self.tolerance = None if tolerance is None else float(tolerance)
+        self.policy_stable_steps = None if policy_stable_steps is None else int(policy_stable_steps)
+        self.residuals = []
+        self.converged_step = None
+        self.stable_sweeps = 0
+        self.backups = 0
+        self.states = []
+        self.value_history = None
+        self.action_history = None
+        self.initial_values = None
+        self.initial_actions = None
+        self.affected_states = None
         super().__init__(grid, visualize_answers)
 
     def __str__(self):
@@ -26,27 +96,75 @@ class ValueIterationAgent(QueryAnsweringAgent):
         """
         initialize state values to be 0 with best action to be North 
         """
-        self.state_values.clear()
-        states = self.grid.get_states()
-        for state in states:
-            # default value is 0 and best action is North  
-            self.state_values[state] = ValueIterationState()
+        # default value is 0 and best action is North  
+        if self.initial_values is None:
+            self.values = [ValueIterationState() for _ in self.grid.state_list]
+        else:
+            self.values = [ValueIterationState(value, self.ACTIONS[action]) 
+                           for value, action in zip(self.initial_values.tolist(), self.initial_actions.tolist())]
+        self.state_values = dict(zip(self.grid.state_list, self.values))
+
+    def warm_start_from(self, agent, base_indices, affected = None):
+        """
+        Start the sweeps from the last recorded values and actions of another agent, 
+        which solved the grid this agent's grid was edited from. Added states start at 0
+        :param
+            agent - solved ValueIterationAgent
+            base_indices - index in the other agent's grid of every state of this grid, 
+                           None for an added state, see Grid.apply_edit
+            affected - indices of the states whose transitions or reward changed, the 
+                       Bellman error of the other states is unchanged. Only used if the
+                       other agent converged, the Bellman error of an unconverged run is
+                       not zero anywhere, every state is backed up then
+        """
+        values, actions = agent.get_final_arrays()
+        sources = np.array([-1 if index is None else index for index in base_indices], dtype=np.intp)
+        added = sources < 0
+        self.initial_values = np.where(added, 0.0, values[sources])
+        self.initial_actions = np.where(added, 0, actions[sources]).astype(np.int8)
+        converged = agent.converged_step is not None
+        self.affected_states = None if affected is None or not converged else list(affected)
+
+    def get_initial_arrays(self):
+        """
+        Values and actions of step 0, new arrays on every call
+        :return
+            tuple of (values, action indices into ACTIONS)
+        """
+        if self.initial_values is None:
+            return np.zeros(len(self.grid.state_list)), np.zeros(len(self.grid.state_list), dtype=np.int8)
+        return self.initial_values.copy(), self.initial_actions.copy()
+
+    def get_final_arrays(self):
+        """
+        Values and actions of the last recorded step
+        :return
+            tuple of (values, action indices into ACTIONS)
+        """
+        count = self.get_step_count()
+        if count == 0:
+            return self.get_initial_arrays()
+        if self.engine == 'numpy':
+            return self.value_history[count - 1], self.action_history[count - 1]
+        return self.to_arrays(self.iterations[count - 1])
 
-    def find_query_answer(self, query: Query) -> str:
+    def find_query_value(self, query: Query):
         """
-        Evaluates  a given query 
+        Evaluates a given query against the values recorded at the query's step
         :param query: Query -Query object
-        :return string of answer of given query
-        """
-        query_answer = ""
-        state =GridState(query.x, query.y)
-        action = self.state_values[state].best_action
-        value = self.state_values[state].value
-        if query.query_type == QueryType.STATE_VALUE:
-            query_answer= "{0:.2f}".format(value)
-        elif query.query_type == QueryType.BEST_POLICY:
-            query_answer = query.direction_dict[action]
-        return str(query_answer)
+        :return value of the state or its best action
+        """
+        index = self.grid.index_of(GridState(query.x, query.y))
+        step = min(query.step, self.get_step_count() - 1)
+        if self.engine == 'numpy':
+            value = float(self.value_history[step][index])
+            action = self.ACTIONS[self.action_history[step][index]]
+        else:
+            value = self.iterations[step][index].value
+            action = self.iterations[step][index].best_action
+        if query.query_type == QueryType.BEST_POLICY:
+            return action
+        return value
     
     def get_all_actions_and_q_values(self, state):
         """
@@ -56,49 +174,713 @@ class ValueIterationAgent(QueryAnsweringAgent):
         :return
             list of ValueIterationState
         """
+        return self.get_action_values(self.grid.index_of(state))
+
+    def get_action_values(self, index):
+        """
+        Index based get_all_actions_and_q_values, reads the current sweep from values
+        :param
+            index - state index
+        :return
+            list of ValueIterationState
+        """
         result = []
-        actions = self.grid.get_actions_from_state(state)
-        for action in actions:
+        for action in self.grid.get_action_indices(index):
             q_star = 0.0
-            transistions_and_rewards = self.grid.get_transistions_and_rewards(state, action)
-            if self.grid.is_terminal_state(state):
+            transistions_and_rewards = self.grid.get_transistions_and_rewards_index(index, action)
+            if self.grid.terminal[index]:
                 q_star = transistions_and_rewards[0][1] 
             else:
-                for probability, reward, new_state in transistions_and_rewards:
-                    q_star += probability * (reward + self.grid.discount * self.state_values[new_state].value)
-            result.append(ValueIterationState(q_star, action))
+                for probability, reward, new_index in transistions_and_rewards:
+                    q_star += probability * (reward + self.grid.discount * self.values[new_index].value)
+            result.append(ValueIterationState(q_star, self.ACTIONS[action]))
 
         return result
     
-    def get_iterations(self):
+    def get_step_count(self) -> int:
+        """
+        Number of recorded steps, including step 0
+        """
+        if self.engine == 'numpy':
+            return 0 if self.value_history is None else len(self.value_history)
+        return len(self.iterations)
+
+    def get_iterations(self, start = 0, stop = None, stride = 1):
+        """
+        Get the recorded steps of a window, every step by default
+        :param
+            start, stop, stride - window of steps, with python slice semantics
+        :return
+            dict of step -> "x,y" -> {value, best_action}
+        """
+        steps = self.get_step_window(start, stop, stride)
+        if self.engine == 'numpy':
+            return self.get_array_iterations(steps)
+
         json_iterations = {}
-        for step, state_values in self.iterations.items():
+        keys = self.get_state_keys()
+        for step in steps:
+            values = self.iterations[step]
             json_iterations[step] = {
-                f"{state.x},{state.y}": value.to_dict()
-                for state, value in state_values.items()
+                key: value.to_dict()
+                for key, value in zip(keys, values)
             }
         return json_iterations
-    
+
+    def get_array_iterations(self, steps = None):
+        """
+        Builds the same per step output as get_iterations from the value and
+        action histories recorded by the numpy engine
+        :param
+            steps - optional iterable of steps, defaults to every step
+        """
+        json_iterations = {}
+        if steps is None:
+            steps = range(len(self.value_history))
+        for step in steps:
+            json_iterations[step] = self.format_step(self.value_history[step], self.action_history[step])
+        return json_iterations
+
+    def format_step(self, values, actions, indices=None):
+        """
+        Format the values and best actions of one step in the get_iterations schema
+        :param
+            values - value per state index
+            actions - action index per state index
+            indices - optional list of state indices to include, defaults to every state
+        :return
+            dict of "x,y" -> {value, best_action}
+        """
+        if indices is None:
+            indices = range(len(values))
+        values = values.tolist()
+        actions = actions.tolist()
+        return {
+            f"{self.states[i].x},{self.states[i].y}": {'value': values[i], 'best_action': self.ACTIONS[actions[i]]}
+            for i in indices
+        }
+
+    def iterate_arrays(self, steps = None):
+        """
+        Iterate over the recorded steps as arrays, the state order is self.states
+        :param
+            steps - optional iterable of steps, defaults to every step
+        :return
+            generator of (step, values, action indices into ACTIONS)
+        """
+        if steps is None:
+            steps = range(self.get_step_count())
+        if self.engine == 'numpy':
+            for step in steps:
+                yield step, self.value_history[step], self.action_history[step]
+            return
+
+        self.states = self.grid.state_list
+        for step in steps:
+            yield (step, *self.to_arrays(self.iterations[step]))
+
+    def get_columns(self, start = 0, stop = None, stride = 1):
+        """
+        Get the recorded steps of a window as packed arrays, for the columnar format
+        :param
+            start, stop, stride - window of steps, with python slice semantics
+        :return
+            dict with "steps" (uint32, steps), "values" (float32, steps x states) and
+            "actions" (uint8 indices into ACTIONS, steps x states), the state order is get_state_keys
+        """
+        steps = self.get_step_window(start, stop, stride)
+        if self.engine == 'numpy' and self.history is None:
+            values = self.value_history[steps.start:steps.stop:steps.step]
+            actions = self.action_history[steps.start:steps.stop:steps.step]
+        else:
+            values = np.zeros((len(steps), len(self.grid.state_list)))
+            actions = np.zeros((len(steps), len(self.grid.state_list)), dtype=np.int8)
+            for row, (step, step_values, step_actions) in enumerate(self.iterate_arrays(steps)):
+                values[row] = step_values
+                actions[row] = step_actions
+        return {
+            'steps': np.array(steps, dtype=np.uint32),
+            'values': values.astype(np.float32),
+            'actions': actions.astype(np.uint8)
+        }
+
+    def get_delta_iterations(self, encoder: DeltaEncoder, start = 0, stop = None, stride = 1):
+        """
+        Same per step schema as get_iterations, but only keyframe steps list every
+        state, other steps list the states that changed since they were last emitted
+        :param
+            encoder - DeltaEncoder with the keyframe interval and tolerance to use
+            start, stop, stride - window of steps, the first step of a window is always a keyframe
+        """
+        json_iterations = {}
+        for step, values, actions in self.iterate_arrays(self.get_step_window(start, stop, stride)):
+            json_iterations[step] = self.format_step(values, actions, encoder.changed(step, values, actions).tolist())
+        return json_iterations
+
+    def stream_iterations(self, encoder: DeltaEncoder = None):
+        """
+        Run value iteration and yield every step as soon as its sweep is computed,
+        without recording the history
+        :param
+            encoder - optional DeltaEncoder, steps are then delta encoded
+        :return
+            generator of (step, same per step output as get_iterations)
+        """
+        for step, values, actions in self.limit_sweeps(self.sweep_arrays()):
+            indices = None if encoder is None else encoder.changed(step, values, actions).tolist()
+            yield step, self.format_step(values, actions, indices)
+
+    def get_convergence(self):
+        """
+        Convergence report of the last run
+        :return
+            dict with the step value iteration stopped at (None if it ran all K sweeps),
+            the Bellman residual of every sweep and the number of state backups
+        """
+        return {
+            'converged': self.converged_step is not None,
+            'step': self.converged_step,
+            'residuals': self.residuals,
+            'backups': self.backups
+        }
+
+    def has_converged(self, step, residual, policy_changed) -> bool:
+        """
+        Record the residual of a sweep and check the stopping criteria
+        :param
+            step - sweep number that was just computed
+            residual - max|V_k+1 - V_k| of the sweep
+            policy_changed - whether the greedy policy differs from the previous sweep
+        :return
+            True if value iteration should stop after this sweep
+        """
+        self.residuals.append(residual)
+        self.stable_sweeps = 0 if policy_changed else self.stable_sweeps + 1
+        if (self.tolerance is not None and residual < self.tolerance) or \
+           (self.policy_stable_steps is not None and self.stable_sweeps >= self.policy_stable_steps):
+            self.converged_step = step
+            return True
+        return False
+
+    def reset_convergence(self):
+        """
+        Clear the convergence tracking of a previous run
+        """
+        self.residuals = []
+        self.converged_step = None
+        self.stable_sweeps = 0
+        self.backups = 0
+
+    def compile_grid(self):
+        """
+        Get the dense arrays of the grid's compiled transition model, every non 
+        terminal (state, action) pair has exactly three outcomes
+        :return
+            tuple of (next_states, probabilities, rewards, terminal) where next_states,
+            probabilities and rewards have shape (states, actions, 3)
+        """
+        self.states = self.grid.state_list
+        with self.time_phase('compile'):
+            model = self.grid.get_transition_model()
+            next_states, probabilities, rewards = model.get_dense_moves(self.grid.TERMINATE)
+            terminal = np.array(self.grid.terminal, dtype=bool)
+        return next_states, probabilities, rewards, terminal
+
     def run_agent(self):
         """
         Runs value iteration algorithm
         """
+        if self.engine == 'numpy':
+            self.run_array_agent()
+            return
+
+        self.iterations = {}
+        for step, values in self.limit_sweeps(self.sweep_states()):
+            self.iterations[step] = values
+            self.report_progress(step)
+        if self.truncated():
+            self.state_values = dict(zip(self.grid.state_list, self.values))
+
+    def limit_sweeps(self, sweeps):
+        """
+        Apply the budget's time limit to a generator of sweeps. The clock is checked 
+        before every further sweep is computed, an exhausted budget makes the last 
+        yielded step the final one. The per state sweeps also check it during a sweep, 
+        see budget_exhausted, and end without yielding the unfinished one
+        :param
+            sweeps - generator of (step, ...) tuples from one of the sweep methods
+        :return
+            generator of the same tuples
+        """
+        self.start_budget()
+        for sweep in sweeps:
+            yield sweep
+            if self.budget is not None and sweep[0] < self.grid.k and self.converged_step is None \
+               and self.budget.exhausted():
+                sweeps.close()
+                return
+
+    def sweep_states(self):
+        """
+        Python engine sweeps, one Bellman backup per state and action
+        :return
+            generator of (step, ValueIterationState per state index), starting with step 0
+            and ending after K sweeps or on convergence
+        """
+        self.reset_convergence()
         self.initialize_state_values()
-        self.iterations[0] = self.state_values
+        yield 0, self.values
         #iterate k times
         for k in range(self.grid.k):
-            new_state_values = {}
-            
             #evaluate all given states/grid 
-            for state in self.state_values:
-                #select action that gives maximum q value
-                new_state_values[state] = max(self.get_all_actions_and_q_values(state), key = lambda x: x.value)
-            self.state_values = new_state_values
-            self.iterations[k + 1] = self.state_values
+            #select action that gives maximum q value
+            new_values = []
+            for i in range(len(self.values)):
+                if self.budget_exhausted(i + 1):
+                    # drop the unfinished sweep, the last yielded step is the final one
+                    return
+                new_values.append(max(self.get_action_values(i), key = lambda x: x.value))
+            self.backups += len(new_values)
+            residual = max((abs(new.value - old.value) for new, old in zip(new_values, self.values)), default=0.0)
+            policy_changed = any(new.best_action != old.best_action for new, old in zip(new_values, self.values))
+            self.values = new_values
+            converged = self.has_converged(k + 1, residual, policy_changed)
+            if converged or k + 1 == self.grid.k:
+                self.state_values = dict(zip(self.grid.state_list, self.values))
+            yield k + 1, self.values
+            if converged:
+                break
+
+    def sweep_arrays(self):
+        """
+        Sweeps of the selected engine as arrays, the state order is self.states
+        :return
+            generator of (step, values, action indices into ACTIONS), starting with step 0
+            and ending after K sweeps or on convergence
+        """
+        if self.engine == 'numpy':
+            yield from self.sweep_schedule()
+            return
+
+        self.states = self.grid.state_list
+        for step, state_values in self.sweep_states():
+            yield (step, *self.to_arrays(state_values))
+
+    def to_arrays(self, state_values):
+        """
+        Convert the python engine's ValueIterationState list of a step to arrays
+        :return
+            tuple of (values, action indices into ACTIONS)
+        """
+        values = np.array([state_value.value for state_value in state_values], dtype=float)
+        actions = np.array([self.ACTIONS.index(state_value.best_action) for state_value in state_values], dtype=np.int8)
+        return values, actions
+
+    def sweep_numpy(self):
+        """
+        Numpy engine sweeps, every sweep is a batched array operation.
+        Operations are applied in the same order as get_all_actions_and_q_values 
+        so results are identical to the python engine
+        :return
+            generator of (step, values, action indices into ACTIONS), a new pair of
+            arrays is yielded for every step
+        """
+        if self.affected_states is not None:
+            yield from self.sweep_incremental()
+            return
+        arrays = self.compile_grid()
+        terminal_rewards = np.array(self.grid.rewards, dtype=float)[arrays[3]]
+
+        self.reset_convergence()
+        values, actions = self.get_initial_arrays()
+        if self.initial_values is None:
+            self.state_values = dict(zip(self.states, (ValueIterationState() for _ in self.states)))
+        else:
+            self.set_state_values(values, actions)
+        yield 0, values, actions
+        for k in range(self.grid.k):
+            new_values, new_actions = self.sweep_once(values, arrays, terminal_rewards)
+            self.backups += len(values)
+            residual = float(np.max(np.abs(new_values - values))) if len(values) else 0.0
+            policy_changed = bool(np.any(new_actions != actions))
+            values, actions = new_values, new_actions
+            converged = self.has_converged(k + 1, residual, policy_changed)
+            if converged or k + 1 == self.grid.k:
+                self.set_state_values(values, actions)
+            yield k + 1, values, actions
+            if converged:
+                break
+
+    def sweep_once(self, values, arrays, terminal_rewards):
+        """
+        One synchronous sweep of the compiled grid
+        :param
+            values - values of the previous step
+            arrays - tuple of (next_states, probabilities, rewards, terminal) from compile_grid
+            terminal_rewards - rewards of the terminal states, in state index order
+        :return
+            tuple of (values, action indices into ACTIONS) of the next step
+        """
+        next_states, probabilities, rewards, terminal = arrays
+        q_values = np.zeros(probabilities.shape[:2])
+        for j in range(next_states.shape[2]):
+            q_values += probabilities[:, :, j] * (rewards[:, :, j] + self.grid.discount * values[next_states[:, :, j]])
+        best_actions = np.argmax(q_values, axis=1)
+        new_values = q_values[np.arange(len(values)), best_actions]
+        new_values[terminal] = terminal_rewards
+        best_actions[terminal] = self.grid.TERMINATE
+        return new_values, best_actions.astype(np.int8)
+
+    def sweep_incremental(self):
+        """
+        Synchronous sweeps of a warm start that only back up the states whose Bellman 
+        error can be non zero: the affected states in the first sweep, then the predecessors 
+        of the states whose value changed by more than the tolerance (PRIORITY_THRESHOLD 
+        without one) in the previous sweep. Every other state would get its current value
+        back, so it is skipped. Once most states are reached the sweeps back up every state,
+        whole array operations are faster than gathering most of the rows. Stops once no 
+        state is left to back up
+        :return
+            generator of (step, values, action indices into ACTIONS), a new pair of
+            arrays is yielded for every step
+        """
+        next_states, probabilities, rewards, terminal = self.compile_grid()
+        terminal_rewards = np.array(self.grid.rewards, dtype=float)
+        terminate = self.grid.TERMINATE
+        outcomes = next_states.shape[2]
+        indptr, sources = self.compile_predecessors(next_states, probabilities)
+        threshold = self.PRIORITY_THRESHOLD if self.tolerance is None else self.tolerance
+
+        self.reset_convergence()
+        values, actions = self.get_initial_arrays()
+        self.set_state_values(values, actions)
+        yield 0, values, actions
+        count = len(self.states)
+        active = np.unique(np.array(self.affected_states, dtype=np.intp))
+        for k in range(self.grid.k):
+            if len(active) > count * self.FULL_SWEEP_FRACTION:
+                active = np.arange(count)
+            rows = slice(None) if len(active) == count else active
+            q_values = np.zeros((len(active), probabilities.shape[1]))
+            for j in range(outcomes):
+                q_values += probabilities[rows, :, j] * (rewards[rows, :, j] + self.grid.discount * values[next_states[rows, :, j]])
+            self.backups += len(active)
+            best_actions = np.argmax(q_values, axis=1)
+            active_values = q_values[np.arange(len(active)), best_actions]
+            active_terminal = terminal[rows]
+            active_values[active_terminal] = terminal_rewards[rows][active_terminal]
+            best_actions[active_terminal] = terminate
+            changes = np.abs(active_values - values[rows])
+            residual = float(changes.max()) if len(active) else 0.0
+            policy_changed = bool(np.any(best_actions != actions[rows]))
+            values, actions = values.copy(), actions.copy()
+            values[rows] = active_values
+            actions[rows] = best_actions
+            changed = active[changes > threshold]
+            if len(changed) > count * self.FULL_SWEEP_FRACTION:
+                active = np.arange(count)
+            else:
+                active = self.get_predecessors_of(changed, indptr, sources)
+            converged = self.has_converged(k + 1, residual, policy_changed)
+            if not converged and not len(active):
+                self.converged_step = k + 1
+                converged = True
+            if converged or k + 1 == self.grid.k:
+                self.set_state_values(values, actions)
+            yield k + 1, values, actions
+            if converged:
+                break
+
+    def compile_predecessors(self, next_states, probabilities):
+        """
+        Predecessor index of the compiled grid arrays, in CSR layout
+        :return
+            tuple of (indptr, sources), the states that reach state i with a non zero 
+            probability are sources[indptr[i]:indptr[i + 1]], with repeats
+        """
+        count = len(next_states)
+        reachable = probabilities > 0
+        targets = next_states[reachable]
+        origins = np.broadcast_to(np.arange(count)[:, None, None], next_states.shape)[reachable]
+        indptr = np.zeros(count + 1, dtype=np.intp)
+        np.cumsum(np.bincount(targets, minlength=count), out=indptr[1:])
+        return indptr, origins[np.argsort(targets, kind='stable')]
+
+    @staticmethod
+    def get_predecessors_of(states, indptr, sources):
+        """
+        Get the predecessors of states from the CSR index of compile_predecessors
+        :return
+            sorted array of unique state indices
+        """
+        starts = indptr[states]
+        lengths = indptr[states + 1] - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.unique(sources[positions])
+
+    def set_state_values(self, values, actions):
+        """
+        Set state_values from the arrays of the last step
+        """
+        self.state_values = {
+            state: ValueIterationState(value, self.ACTIONS[action])
+            for state, value, action in zip(self.states, np.asarray(values).tolist(), np.asarray(actions).tolist())
+        }
+
+    def sweep_schedule(self):
+        """
+        Array sweeps of the selected schedule
+        :return
+            generator of (step, values, action indices into ACTIONS)
+        """
+        if self.schedule == 'gauss-seidel':
+            return self.sweep_gauss_seidel()
+        if self.schedule == 'prioritized':
+            return self.sweep_prioritized()
+        return self.sweep_numpy()
+
+    def compile_lists(self):
+        """
+        compile_grid as nested lists, for the schedules that back up one state at a time
+        """
+        return tuple(array.tolist() for array in self.compile_grid())
+
+    def backup(self, index, values, lists):
+        """
+        Bellman backup of one state, with the same operation order as sweep_numpy
+        :param
+            index - state index
+            values - list of the current value per state index
+            lists - nested lists from compile_lists
+        :return
+            tuple of (value, action index into ACTIONS)
+        """
+        next_states, probabilities, rewards, terminal = lists
+        if terminal[index]:
+            return self.grid.rewards[index], self.grid.TERMINATE
+        discount = self.grid.discount
+        best_value = None
+        best_action = 0
+        for action, (action_next, action_probabilities, action_rewards) in enumerate(
+                zip(next_states[index], probabilities[index], rewards[index])):
+            q_value = 0.0
+            for new_index, probability, reward in zip(action_next, action_probabilities, action_rewards):
+                q_value += probability * (reward + discount * values[new_index])
+            if best_value is None or q_value > best_value:
+                best_value = q_value
+                best_action = action
+        return best_value, best_action
+
+    def sweep_gauss_seidel(self):
+        """
+        Gauss-Seidel sweeps, states are backed up in state index order and every
+        backup reads the values already updated in the same sweep
+        :return
+            generator of (step, values, action indices into ACTIONS)
+        """
+        lists = self.compile_lists()
+        count = len(self.states)
+
+        self.reset_convergence()
+        values, actions = (array.tolist() for array in self.get_initial_arrays())
+        self.set_state_values(values, actions)
+        yield 0, np.array(values), np.array(actions, dtype=np.int8)
+        for k in range(self.grid.k):
+            sweep = self.sweep_in_place(values, actions, lists, interruptible=True)
+            if sweep is None:
+                return
+            residual, policy_changed = sweep
+            self.backups += count
+            converged = self.has_converged(k + 1, residual, policy_changed)
+            if converged or k + 1 == self.grid.k:
+                self.set_state_values(values, actions)
+            yield k + 1, np.array(values), np.array(actions, dtype=np.int8)
+            if converged:
+                break
+
+    def sweep_in_place(self, values, actions, lists, interruptible = False):
+        """
+        One Gauss-Seidel sweep, updates values and actions in place
+        :param
+            values, actions - lists of the previous step's value and action index per state index
+            lists - nested lists from compile_lists
+            interruptible - check the budget during the sweep, off when a recorded step is recomputed
+        :return
+            tuple of (residual, policy_changed) of the sweep, None if the budget ran out 
+            during it, values and actions are then partly updated
+        """
+        residual = 0.0
+        policy_changed = False
+        for i in range(len(values)):
+            if interruptible and self.budget_exhausted(i + 1):
+                return None
+            value, action = self.backup(i, values, lists)
+            residual = max(residual, abs(value - values[i]))
+            policy_changed = policy_changed or action != actions[i]
+            values[i] = value
+            actions[i] = action
+        return residual, policy_changed
+
+    def get_step_function(self):
+        """
+        Function that recomputes a step of the history from the previous step, for 
+        the CheckpointHistory. It repeats the sweep of the schedule, its result is 
+        identical to the recorded step
+        :return
+            callable mapping (values, actions) to (values, actions) of the next step
+        """
+        if self.schedule == 'gauss-seidel':
+            lists = self.compile_lists()
+
+            def step(entry):
+                values, actions = (array.tolist() for array in entry)
+                self.sweep_in_place(values, actions, lists)
+                return np.array(values), np.array(actions, dtype=np.int8)
+            return step
+        arrays = self.compile_grid()
+        terminal_rewards = np.array(self.grid.rewards, dtype=float)[arrays[3]]
+        return lambda entry: self.sweep_once(entry[0], arrays, terminal_rewards)
+
+    def get_history_memory(self):
+        """
+        Memory report of the recorded history
+        :return
+            dict with the mode ("full" or "checkpoint") and the bytes of the history, 
+            see CheckpointHistory.to_dict for the checkpoint fields
+        """
+        if self.history is not None:
+            return self.history.to_dict()
+        if self.engine == 'numpy':
+            histories = [history for history in (self.value_history, self.action_history) if history is not None]
+            return {'mode': 'full', 'bytes': sum(history.nbytes for history in histories),
+                    'spilled': any(isinstance(history, np.memmap) for history in histories)}
+        # one ValueIterationState per state and step
+        return {'mode': 'full', 'bytes': None, 'spilled': False}
+
+    def get_predecessors(self, lists):
+        """
+        Predecessor index of the compiled grid
+        :return
+            per state index, list of (predecessor state index, largest probability of 
+            reaching the state from it with one action)
+        """
+        next_states, probabilities, _, terminal = lists
+        predecessors = [{} for _ in next_states]
+        for i in range(len(next_states)):
+            if terminal[i]:
+                continue
+            for action_next, action_probabilities in zip(next_states[i], probabilities[i]):
+                for new_index, probability in zip(action_next, action_probabilities):
+                    if probability > 0 and probability > predecessors[new_index].get(i, 0.0):
+                        predecessors[new_index][i] = probability
+        return [list(predecessor.items()) for predecessor in predecessors]
+
+    def sweep_prioritized(self):
+        """
+        Prioritized sweeping. A max heap holds the pending Bellman error of every state,
+        the state with the largest error is backed up next and its change raises the
+        priority of its predecessors by discount * probability * change. Stops once no
+        error above the tolerance (PRIORITY_THRESHOLD without one) is pending
+        :return
+            generator of (step, values, action indices into ACTIONS), a step is one
+            backup per state, not necessarily of every state
+        """
+        lists = self.compile_lists()
+        predecessors = self.get_predecessors(lists)
+        count = len(self.states)
+        threshold = self.PRIORITY_THRESHOLD if self.tolerance is None else self.tolerance
+        discount = self.grid.discount
+
+        self.reset_convergence()
+        values, actions = (array.tolist() for array in self.get_initial_arrays())
+        priorities = [0.0] * count
+        heap = []
+        for i in (range(count) if self.affected_states is None else self.affected_states):
+            error = abs(self.backup(i, values, lists)[0] - values[i])
+            if error > threshold:
+                priorities[i] = error
+                heap.append((-error, i))
+        heapq.heapify(heap)
+        self.set_state_values(values, actions)
+        yield 0, np.array(values), np.array(actions, dtype=np.int8)
+        for k in range(self.grid.k):
+            residual = 0.0
+            policy_changed = False
+            backups = 0
+            while heap and backups < count:
+                priority, i = heapq.heappop(heap)
+                if -priority != priorities[i]:
+                    # superseded by a later push
+                    continue
+                if self.budget_exhausted(backups + 1):
+                    # drop the unfinished step, the last yielded step is the final one
+                    return
+                priorities[i] = 0.0
+                value, action = self.backup(i, values, lists)
+                change = abs(value - values[i])
+                residual = max(residual, change)
+                policy_changed = policy_changed or action != actions[i]
+                values[i] = value
+                actions[i] = action
+                backups += 1
+                for predecessor, probability in predecessors[i]:
+                    increase = discount * probability * change
+                    if increase > 0:
+                        priorities[predecessor] += increase
+                        if priorities[predecessor] > threshold:
+                            heapq.heappush(heap, (-priorities[predecessor], predecessor))
+            self.backups += backups
+            converged = self.has_converged(k + 1, residual, policy_changed)
+            if not converged and not heap:
+                self.converged_step = k + 1
+                converged = True
+            if converged or k + 1 == self.grid.k:
+                self.set_state_values(values, actions)
+            yield k + 1, np.array(values), np.array(actions, dtype=np.int8)
+            if converged:
+                break
+
+    def run_array_agent(self):
+        """
+        Runs value iteration with the numpy engine and records the value and 
+        action of every state for every step, or only its checkpoints
+        """
+        if self.checkpoint_interval is not None:
+            self.run_checkpoint_agent()
+            return
+        self.history = None
+        self.value_history = self.allocate_history((self.grid.k + 1, len(self.grid.state_list)))
+        self.action_history = self.allocate_history((self.grid.k + 1, len(self.grid.state_list)), np.int8)
+        for step, values, actions in self.limit_sweeps(self.sweep_schedule()):
+            self.value_history[step] = values
+            self.action_history[step] = actions
+            self.report_progress(step)
+        if self.truncated():
+            self.set_state_values(values, actions)
+        if step < self.grid.k:
+            # drop the preallocated sweeps that were never computed
+            self.value_history = self.trim_history(self.value_history, step + 1)
+            self.action_history = self.trim_history(self.action_history, step + 1)
+
+    def run_checkpoint_agent(self):
+        """
+        Runs value iteration with the numpy engine and records the checkpoints of
+        the history, value_history and action_history are views of them
+        """
+        if self.affected_states is not None and self.schedule == 'synchronous':
+            raise ValueError("Checkpoints are not available for a re-solve that only backs up the affected states")
+        self.history = CheckpointHistory(self.checkpoint_interval, self.get_step_function())
+        for step, values, actions in self.limit_sweeps(self.sweep_schedule()):
+            self.history.record(step, (values, actions))
+            self.report_progress(step)
+        if self.truncated():
+            self.set_state_values(values, actions)
+        self.value_history = self.history.column(0)
+        self.action_history = self.history.column(1)
 
     def get_agent_type(self) -> AgentType:
         """
         returns the AgentType of the object, 
         :returns MDP
         """
-        return AgentType.MDP
\ No newline at end of file
+        return AgentType.MDP
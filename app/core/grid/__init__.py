@@ -1,5 +1,7 @@
 from app.core.grid.grid import Grid
 from app.core.grid.grid_state import GridState
 from app.core.grid.grid_cell_properties import GridCellProperties
+from app.core.grid.transition_model import TransitionModel
+from app.core.grid.grid_edit import GridEdit
 
-__all__ = ['Grid', 'GridState', 'GridCellProperties']
\ No newline at end of file
+__all__ = ['Grid', 'GridState', 'GridCellProperties', 'TransitionModel', 'GridEdit']
\ No newline at end of file
@@ -1,6 +1,13 @@
-from typing import List, Tuple, Dict, Any
+import copy
+import logging
+from typing import List, Tuple, Dict, Any, Optional
 from app.core.grid.grid_state import GridState
 from app.core.grid.grid_cell_properties import GridCellProperties
+from app.core.grid.transition_model import TransitionModel
+from app.core.grid.grid_edit import GridEdit
+
+logger = logging.getLogger(__name__)
+
 class Grid:
     """
     Grid class
@@ -14,10 +21,24 @@ class Grid:
         alpha: for QLearning
         discount: For both agents
         noise = noise present in state transistions
+        transition_cost: reward of the non terminal states
         actions = {'N': (0, 1), 'S': (0, -1), 'W': (-1, 0), 'E': (1, 0)}
         conflicting_actions = {'N': 'S', 'S': 'N', 'E': 'W', 'W': 'E'}
         states: all grid states in grid maped with grid state params
+        state_list: all grid states, position in the list is the dense state index
+        state_index: GridState -> state index
+        rewards: reward per state index
+        terminal: terminal flag per state index
+        neighbours: per state index, the state index reached by each action in ACTIONS 
+                    order (N, S, W, E), None for terminal states
+        transition_model: compiled stochastic TransitionModel, built on first use
+
+    Agents run on state and action indices, GridState is only used at the boundary
+    for requests and responses. Action indices refer to ACTIONS.
     """
+    ACTIONS = ['N', 'S', 'W', 'E', 'Terminate']
+    TERMINATE = 4
+
     def __init__(self, grid_file: str):
         self.robot_start_state = None
         self.k = None
@@ -25,9 +46,16 @@ class Grid:
         self.alpha = None
         self.discount = None
         self.noise = None
+        self.transition_cost = 0.0
         self.actions = {'N': (0, 1), 'S': (0, -1), 'W': (-1, 0), 'E': (1, 0)}
         self.conflicting_actions = {'N': 'S', 'S': 'N', 'E': 'W', 'W': 'E'}
         self.states = {}
+        self.state_list = []
+        self.state_index = {}
+        self.rewards = []
+        self.terminal = []
+        self.neighbours = []
+        self.transition_model = None
         self.rows = None
         self.cols = None
         self.initialize_grid(grid_file)
@@ -67,14 +95,210 @@ class Grid:
             boulders.add(curr_grid_state)
                     
         # Populate non-terminal states
-        transition_cost = float(grid_conf.get('transitionCost', 0.0))
+        self.transition_cost = float(grid_conf.get('transitionCost', 0.0))
         for x in range(self.rows):
             for y in range(self.cols):
                 curr_grid_state = GridState(x,y)
                 if curr_grid_state not in boulders and curr_grid_state not in self.states:
-                    self.states[curr_grid_state] = GridCellProperties(transition_cost, False) 
+                    self.states[curr_grid_state] = GridCellProperties(self.transition_cost, False) 
         if self.check_grid():
             raise Exception("Grid is uninitialized")
+        self.index_states()
+
+    def index_states(self):
+        """
+        Assign every state a dense integer index and flatten the cell properties 
+        and the neighbour of every state and action into lists indexed by it
+        """
+        self.state_list = list(self.states)
+        self.state_index = {state: i for i, state in enumerate(self.state_list)}
+        self.rewards = [self.states[state].reward for state in self.state_list]
+        self.terminal = [self.states[state].is_terminal for state in self.state_list]
+        self.neighbours = [self.get_neighbours(i) for i in range(len(self.state_list))]
+        self.transition_model = None
+
+    def get_neighbours(self, index: int) -> Optional[Tuple[int, ...]]:
+        """
+        Get the state index reached by each action in ACTIONS order (N, S, W, E) from 
+        a state, an action into a wall or a boulder stays in the state
+
+        :param index: state index
+        :return tuple of state indices, None for a terminal state
+        """
+        if self.terminal[index]:
+            return None
+        state = self.state_list[index]
+        neighbours = []
+        for action in self.ACTIONS[:self.TERMINATE]:
+            delta = self.actions[action]
+            new_state = GridState(state.x + delta[0], state.y + delta[1])
+            neighbours.append(self.state_index.get(new_state, index))
+        return tuple(neighbours)
+
+    def get_adjacent_cells(self, state: GridState) -> List[GridState]:
+        """
+        Get the four cells next to a cell, whether they are states or not
+        """
+        return [GridState(state.x + dx, state.y + dy) for dx, dy in self.actions.values()]
+
+    def apply_edit(self, edit: GridEdit) -> Tuple['Grid', List[Optional[int]], List[int]]:
+        """
+        Get a copy of the grid with an edit applied, this grid is left unchanged. 
+        Instead of indexing every state again the indices are patched: a removed state's 
+        index is taken over by the last state and added states are appended, so every 
+        other state keeps its index. A compiled transition model is patched the same 
+        way, only the rows of the changed states are compiled again
+
+        :param edit: GridEdit
+        :return tuple of (edited grid, index in this grid of every state of the edited 
+                grid or None for an added state, sorted indices of the states of the 
+                edited grid whose transitions or reward changed)
+        :raises ValueError: if the edit does not fit the grid
+        """
+        grid = copy.copy(self)
+        grid.states = dict(self.states)
+        grid.state_list = list(self.state_list)
+        grid.state_index = dict(self.state_index)
+        grid.rewards = list(self.rewards)
+        grid.terminal = list(self.terminal)
+        grid.neighbours = list(self.neighbours)
+        base_indices = list(range(len(self.state_list)))
+        changed = set()  # cells whose neighbours, reward or terminal flag changed
+
+        def remove_state(state):
+            index = grid.state_index.pop(state)
+            del grid.states[state]
+            last = len(grid.state_list) - 1
+            if index != last:
+                moved = grid.state_list[last]
+                grid.state_list[index] = moved
+                grid.state_index[moved] = index
+                grid.rewards[index] = grid.rewards[last]
+                grid.terminal[index] = grid.terminal[last]
+                grid.neighbours[index] = grid.neighbours[last]
+                base_indices[index] = base_indices[last]
+                # the neighbours of the moved state and its own self loops refer to its old index
+                changed.add(moved)
+                changed.update(grid.get_adjacent_cells(moved))
+            for values in (grid.state_list, grid.rewards, grid.terminal, grid.neighbours, base_indices):
+                values.pop()
+            changed.update(grid.get_adjacent_cells(state))
+
+        def add_state(state):
+            if not (0 <= state.x < grid.rows and 0 <= state.y < grid.cols):
+                raise ValueError(f"Cell {state} is outside of the grid")
+            grid.states[state] = GridCellProperties(grid.transition_cost, False)
+            grid.state_index[state] = len(grid.state_list)
+            grid.state_list.append(state)
+            grid.rewards.append(grid.transition_cost)
+            grid.terminal.append(False)
+            grid.neighbours.append(None)
+            base_indices.append(None)
+            changed.add(state)
+            changed.update(grid.get_adjacent_cells(state))
+
+        def set_cell(state, reward, is_terminal):
+            index = grid.state_index[state]
+            grid.states[state] = GridCellProperties(reward, is_terminal)
+            grid.rewards[index] = reward
+            grid.terminal[index] = is_terminal
+            changed.add(state)
+
+        for x, y in edit.remove_terminals:
+            state = GridState(x, y)
+            if not grid.is_terminal_state(state):
+                raise ValueError(f"Cell {state} is not a terminal state")
+            set_cell(state, grid.transition_cost, False)
+        for x, y in edit.remove_boulders:
+            state = GridState(x, y)
+            if state in grid.states:
+                raise ValueError(f"Cell {state} is not a boulder")
+            add_state(state)
+        for x, y in edit.add_boulders:
+            state = GridState(x, y)
+            if state not in grid.states:
+                raise ValueError(f"Cell {state} is already a boulder or outside of the grid")
+            remove_state(state)
+        for x, y, reward in edit.set_terminals:
+            state = GridState(x, y)
+            if state not in grid.states:
+                raise ValueError(f"Cell {state} is a boulder or outside of the grid")
+            set_cell(state, reward, True)
+        if not grid.states:
+            raise ValueError("The edit removes every state of the grid")
+
+        if edit.noise is not None:
+            grid.noise = edit.noise
+        if edit.discount is not None:
+            grid.discount = edit.discount
+        if edit.transition_cost is not None:
+            grid.transition_cost = edit.transition_cost
+            for index, is_terminal in enumerate(grid.terminal):
+                if not is_terminal:
+                    grid.rewards[index] = edit.transition_cost
+                    grid.states[grid.state_list[index]] = GridCellProperties(edit.transition_cost, False)
+
+        changed_indices = sorted(grid.state_index[state] for state in changed if state in grid.state_index)
+        for index in changed_indices:
+            grid.neighbours[index] = grid.get_neighbours(index)
+        if self.transition_model is not None:
+            grid.transition_model = self.transition_model.patch(grid, base_indices, changed_indices, edit.changes_weights())
+        if edit.changes_weights() or edit.discount is not None:
+            changed_indices = list(range(len(grid.state_list)))
+        return grid, base_indices, changed_indices
+
+    def get_transition_model(self) -> TransitionModel:
+        """
+        Get the compiled transition model of the grid, it is compiled once on first 
+        use and shared by every solver that runs on this grid
+
+        :return TransitionModel
+        """
+        if self.transition_model is None:
+            self.transition_model = TransitionModel.from_grid(self)
+            logger.info("Compiled transition model for %dx%d grid: %d states, %d outcomes in %.3f ms",
+                        self.rows, self.cols, self.transition_model.num_states, len(self.transition_model),
+                        self.transition_model.build_time * 1000)
+        return self.transition_model
+
+    def with_parameters(self, k: int = None, episodes: int = None, alpha: float = None, discount: float = None) -> 'Grid':
+        """
+        Get a copy of the grid with other solver parameters. The parameters do not 
+        change the grid's structure, so the copy shares the states, the indices and 
+        the compiled transition model with this grid instead of rebuilding them
+
+        :return Grid
+        """
+        grid = copy.copy(self)
+        if k is not None:
+            grid.k = int(k)
+        if episodes is not None:
+            grid.q_value_episodes = int(episodes)
+        if alpha is not None:
+            grid.alpha = float(alpha)
+        if discount is not None:
+            grid.discount = float(discount)
+        return grid
+
+    def index_of(self, state: GridState) -> int:
+        """
+        Get the dense index of a state
+
+        :param state: GridState
+        :return state index
+        """
+        if state not in self.state_index:
+            raise Exception("State: " + str(state) + ", Does Not Exist in the Grid or is a Boulder")
+        return self.state_index[state]
+
+    def state_of(self, index: int) -> GridState:
+        """
+        Get the GridState of a state index
+
+        :param index: state index
+        :return GridState
+        """
+        return self.state_list[index]
         
     def check_grid(self):
         """
@@ -96,8 +320,9 @@ class Grid:
 
         :return bool
         """
-        if state in self.states:
-            return self.states[state].is_terminal
+        index = self.state_index.get(state)
+        if index is not None:
+            return self.terminal[index]
         return False
 
     def transistion(self, state: GridState, action: str) -> GridState:
@@ -108,9 +333,11 @@ class Grid:
         :param action: action to apply ("N", "S", "W", "E") 
         :return new_state: GridState after applying action
         """
-        if self.is_terminal_state(state):
-            return None
-        
+        index = self.state_index.get(state)
+        if index is not None:
+            new_index = self.transistion_index(index, self.ACTIONS.index(action))
+            return None if new_index is None else self.state_list[new_index]
+
         delta = self.actions[action]
         deltaX = delta[0]
         deltaY = delta[1]
@@ -127,6 +354,45 @@ class Grid:
         :return reward
         """
         return self.states[state].reward
+
+    def transistion_index(self, index: int, action: int) -> int:
+        """
+        Index based transistion
+
+        :param index: state index on which the action will be applied
+        :param action: action index into ACTIONS
+        :return state index after applying action, None for a terminal state
+        """
+        neighbours = self.neighbours[index]
+        if neighbours is None:
+            return None
+        return neighbours[action]
+
+    def get_transistions_and_rewards_index(self, index: int, action: int) -> Tuple[Tuple[float, float, int], ...]:
+        """
+        Index based get_transistions_and_rewards
+
+        :param index: state index on which the action will be applied
+        :param action: action index into ACTIONS
+        :return tuple of (probability, reward, new state index), read from the compiled transition model
+        """
+        transistions_and_rewards = self.get_transition_model().get_outcomes(index, action)
+        if not transistions_and_rewards:
+            if self.terminal[index]:
+                raise Exception('Invalid Action for a Terminal State')
+            raise Exception('Invalid Action for a Non Terminal State')
+        return transistions_and_rewards
+
+    def get_action_indices(self, index: int) -> List[int]:
+        """
+        Index based get_actions_from_state, returns a new list on every call
+
+        :param index: state index
+        :return List of action indices into ACTIONS
+        """
+        if self.terminal[index]:
+            return [self.TERMINATE]
+        return [0, 1, 2, 3]
  
     def get_transistions_and_rewards(self, state: GridState, action: str) -> List[Tuple[float, float, GridState]]:
         """
@@ -137,37 +403,11 @@ class Grid:
         :param action: action to apply ("N", "S", "W", "E", "Terminate") 
         :return List of (probability, reward, new GridState)
         """
-        transistions_and_rewards = [] # [probability, reward, new GridState]
-        reward = self.get_reward(state)
-
-        if self.is_terminal_state(state): 
-            if action != 'Terminate':
-                raise Exception('Invalid Action for a Terminal State')
-            
-            # Terminal state has only one possible transition: staying in the terminal state
-            # Probability is 1 because there are no other possible outcomes
-            # New state is None to indicate the end of the episode
-
-            transistions_and_rewards.append((1, reward, None))
-        else:
-            # for an action, its conflicting action can never happen
-            # so we remove the conflicting action from the possible actions
-            # conflicting action is the action that is opposite to the current action
-
-            possible_actions = self.actions.copy()
-            del possible_actions[self.conflicting_actions[action]]
-            
-            # traverse other actions
-            for possible_action in possible_actions:
-                new_state = self.transistion(state, possible_action)
-                if action == possible_action:
-                    # if noise is 0.2, the probability of selected action will be 0.8
-                    transistions_and_rewards.append((1 - self.noise, reward, new_state))
-                else:
-                    # noise will be equally divided in other possible actions
-                    transistions_and_rewards.append((self.noise/(len(possible_actions) - 1), reward, new_state))
-            assert len(transistions_and_rewards) == 3
-        return transistions_and_rewards
+        transistions_and_rewards = self.get_transistions_and_rewards_index(self.state_index[state], self.ACTIONS.index(action))
+        return [
+            (probability, reward, None if new_index is None else self.state_list[new_index])
+            for probability, reward, new_index in transistions_and_rewards
+        ]
     
     def get_actions_from_state(self, state: GridState) -> List[str]:
         """
@@ -7,6 +7,8 @@ class GridCellProperties:
             equal to the transistion cost
     is_terminal: specifies if the state is terminal
     """
+    __slots__ = ('reward', 'is_terminal')
+
     def __init__(self, reward, is_terminal):
         self.reward = reward
         self.is_terminal = is_terminal
@@ -0,0 +1,52 @@
+from typing import Any, Dict, Iterable, Optional
+
+
+class GridEdit:
+    """
+    GridEdit class
+    A small change to a grid, applied with Grid.apply_edit. Cells are (x, y) tuples,
+    the changes are applied in the order of the members below.
+
+    Members:
+        remove_terminals: cells of terminal states that become non terminal states
+        remove_boulders: boulder cells that become non terminal states
+        add_boulders: cells of states that become boulders
+        set_terminals: (x, y, reward) of states that become terminal states or get a new reward
+        noise, transition_cost, discount: new value, None keeps the grid's value
+    """
+    FIELDS = ('RemoveTerminal', 'RemoveBoulder', 'AddBoulder', 'SetTerminal', 'Noise', 'TransitionCost', 'Discount')
+
+    def __init__(self, remove_terminals: Iterable = (), remove_boulders: Iterable = (), add_boulders: Iterable = (),
+                 set_terminals: Iterable = (), noise: Optional[float] = None, transition_cost: Optional[float] = None,
+                 discount: Optional[float] = None):
+        self.remove_terminals = [(int(cell[0]), int(cell[1])) for cell in remove_terminals]
+        self.remove_boulders = [(int(cell[0]), int(cell[1])) for cell in remove_boulders]
+        self.add_boulders = [(int(cell[0]), int(cell[1])) for cell in add_boulders]
+        self.set_terminals = [(int(cell[0]), int(cell[1]), float(cell[2])) for cell in set_terminals]
+        self.noise = None if noise is None else float(noise)
+        self.transition_cost = None if transition_cost is None else float(transition_cost)
+        self.discount = None if discount is None else float(discount)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'GridEdit':
+        """
+        Create an edit from its request fields: RemoveTerminal, RemoveBoulder, AddBoulder
+        (lists of [x, y]), SetTerminal (list of [x, y, reward]), Noise, TransitionCost and Discount
+        :raises ValueError: if a field is invalid or unknown
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"Invalid edit: {data}, expected an object")
+        unknown = [name for name in data if name not in cls.FIELDS]
+        if unknown:
+            raise ValueError(f"Invalid edit: unknown fields {', '.join(unknown)}, expected any of {', '.join(cls.FIELDS)}")
+        try:
+            return cls(data.get('RemoveTerminal', ()), data.get('RemoveBoulder', ()), data.get('AddBoulder', ()),
+                       data.get('SetTerminal', ()), data.get('Noise'), data.get('TransitionCost'), data.get('Discount'))
+        except (IndexError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid edit: {e}")
+
+    def changes_weights(self) -> bool:
+        """
+        Check if the edit changes the probabilities or rewards of every non terminal state
+        """
+        return self.noise is not None or self.transition_cost is not None
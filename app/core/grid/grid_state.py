@@ -5,6 +5,8 @@ class GridState:
     Members:
         x & y: represent the position of GridState in the grid
     """
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -20,7 +22,7 @@ class GridState:
         Overriding hash function for faster state lookups when stored in a set or 
         dictionary
         """
-        return hash(str(self))
+        return hash((self.x, self.y))
 
     def __eq__(self, other):
         """
@@ -0,0 +1,213 @@
+import time
+from typing import List, Optional, Tuple
+import numpy as np
+
+
+class TransitionModel:
+    """
+    TransitionModel class
+    The full stochastic transition model of a grid, compiled once in a sparse 
+    CSR layout. Row s * num_actions + a holds the outcomes of applying action a 
+    on state s, actions that are invalid for a state have an empty row.
+
+    Members:
+        num_states: number of states, states are the grid's state indices
+        num_actions: number of actions, actions are indices into Grid.ACTIONS
+        indptr: row offsets into next_states, probabilities and rewards
+        next_states: state index of every outcome, -1 when the episode ends
+        probabilities: probability of every outcome
+        rewards: reward of every outcome
+        outcomes: the same rows as tuples of (probability, reward, new state index or None) 
+                  for python loops
+        build_time: seconds it took to compile the model
+    """
+    def __init__(self, num_states: int, num_actions: int, outcomes: List[Tuple[Tuple[float, float, int], ...]], build_time: float = 0.0):
+        self.num_states = num_states
+        self.num_actions = num_actions
+        self.outcomes = outcomes
+        lengths = [len(row) for row in outcomes]
+        self.indptr = np.zeros(len(outcomes) + 1, dtype=np.intp)
+        np.cumsum(lengths, out=self.indptr[1:])
+        flat = [outcome for row in outcomes for outcome in row]
+        self.probabilities = np.array([outcome[0] for outcome in flat], dtype=float)
+        self.rewards = np.array([outcome[1] for outcome in flat], dtype=float)
+        self.next_states = np.array([-1 if outcome[2] is None else outcome[2] for outcome in flat], dtype=np.intp)
+        self.build_time = build_time
+        self.dense_moves = None
+
+    @classmethod
+    def from_grid(cls, grid) -> 'TransitionModel':
+        """
+        Compile the transition model of a grid from its indexed states
+
+        For an action, its conflicting (opposite) action can never happen, the 
+        action itself happens with probability 1 - noise and the noise is 
+        equally divided between the two remaining actions. A terminal state only 
+        allows Terminate, which ends the episode with probability 1.
+
+        :param grid: Grid with indexed states
+        :return TransitionModel
+        """
+        start = time.perf_counter()
+        outcomes = []
+        for index in range(len(grid.state_list)):
+            outcomes.extend(cls.get_state_rows(grid, index))
+        model = cls(len(grid.state_list), len(grid.ACTIONS), outcomes)
+        model.build_time = time.perf_counter() - start
+        return model
+
+    @staticmethod
+    def get_state_rows(grid, index: int) -> List[Tuple[Tuple[float, float, int], ...]]:
+        """
+        Compile the outcome rows of every action of a state, see from_grid
+
+        :param grid: Grid with indexed states
+        :param index: state index
+        :return list of rows in action order
+        """
+        reward = grid.rewards[index]
+        neighbours = grid.neighbours[index]
+        rows = []
+        for action in range(len(grid.ACTIONS)):
+            if neighbours is None:
+                row = ((1, reward, None),) if action == grid.TERMINATE else ()
+            elif action == grid.TERMINATE:
+                row = ()
+            else:
+                # the conflicting action shares the pair of its action: N/S and W/E
+                conflicting_action = action ^ 1
+                row = tuple(
+                    (1 - grid.noise if possible_action == action else grid.noise / 2, reward, neighbours[possible_action])
+                    for possible_action in range(grid.TERMINATE) if possible_action != conflicting_action
+                )
+            rows.append(row)
+        return rows
+
+    def patch(self, grid, base_indices: List[Optional[int]], changed: List[int], reweight: bool = False) -> 'TransitionModel':
+        """
+        Get the model of an edited grid from this model, see Grid.apply_edit. Only the dense
+        arrays of the batched solvers are patched: the rows of the unchanged states are taken
+        from this model, the changed states are compiled again. With reweight the noise or the
+        transition cost changed and the probabilities and rewards of every non terminal state 
+        are recomputed. The result is the same as compiling the edited grid
+
+        :param grid: edited Grid
+        :param base_indices: index in this model of every state of the edited grid, None for an added state
+        :param changed: indices of the states of the edited grid whose transitions or reward changed
+        :param reweight: recompute the probabilities and rewards of every non terminal state
+        :return PatchedTransitionModel
+        """
+        start = time.perf_counter()
+        moves = grid.TERMINATE
+        next_states, probabilities, rewards = self.get_dense_moves(moves)
+        sources = np.array([0 if index is None else index for index in base_indices], dtype=np.intp)
+        next_states, probabilities, rewards = next_states[sources], probabilities[sources], rewards[sources]
+        if reweight:
+            non_terminal = ~np.array(grid.terminal, dtype=bool)
+            # the probabilities of from_grid, they are the same for every non terminal state
+            probabilities[non_terminal] = [[1 - grid.noise if possible_action == action else grid.noise / 2
+                                            for possible_action in range(moves) if possible_action != action ^ 1]
+                                           for action in range(moves)]
+            rewards[non_terminal] = np.array(grid.rewards, dtype=float)[non_terminal, None, None]
+        for index in changed:
+            next_states[index], probabilities[index], rewards[index] = 0, 0.0, 0.0
+            for action, row in enumerate(self.get_state_rows(grid, index)[:moves]):
+                for j, (probability, reward, new_index) in enumerate(row):
+                    next_states[index, action, j] = new_index
+                    probabilities[index, action, j] = probability
+                    rewards[index, action, j] = reward
+        return PatchedTransitionModel(grid, (next_states, probabilities, rewards), time.perf_counter() - start)
+
+    def __len__(self):
+        """
+        Number of stored outcomes
+        """
+        return len(self.next_states)
+
+    def get_outcomes(self, state: int, action: int) -> Tuple[Tuple[float, float, int], ...]:
+        """
+        Get the outcomes of applying an action on a state
+
+        :param state: state index
+        :param action: action index
+        :return tuple of (probability, reward, new state index or None), empty if the action is invalid
+        """
+        return self.outcomes[state * self.num_actions + action]
+
+    def row_slice(self, state: int, action: int) -> slice:
+        """
+        Get the slice of the flat outcome arrays that belongs to a state and action
+
+        :param state: state index
+        :param action: action index
+        """
+        row = state * self.num_actions + action
+        return slice(int(self.indptr[row]), int(self.indptr[row + 1]))
+
+    def get_dense_moves(self, moves: int, branching: int = 3) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get the outcomes of the first moves actions as dense arrays of shape 
+        (states, moves, branching), for batched solvers. Outcomes are kept in 
+        CSR order, missing outcomes (terminal states) have probability 0 and 
+        point to state 0. The arrays are built once and cached.
+
+        :param moves: number of leading actions to include
+        :param branching: maximum number of outcomes per state and action
+        :return tuple of (next_states, probabilities, rewards)
+        """
+        if self.dense_moves is not None and self.dense_moves[0].shape[1:] == (moves, branching):
+            return self.dense_moves
+        shape = (self.num_states, moves, branching)
+        next_states = np.zeros(shape, dtype=np.intp)
+        probabilities = np.zeros(shape)
+        rewards = np.zeros(shape)
+        rows = (np.arange(self.num_states)[:, None] * self.num_actions + np.arange(moves)[None, :]).ravel()
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        for j in range(branching):
+            has_outcome = lengths > j
+            positions = starts[has_outcome] + j
+            next_states.reshape(-1, branching)[has_outcome, j] = self.next_states[positions]
+            probabilities.reshape(-1, branching)[has_outcome, j] = self.probabilities[positions]
+            rewards.reshape(-1, branching)[has_outcome, j] = self.rewards[positions]
+        self.dense_moves = (next_states, probabilities, rewards)
+        return self.dense_moves
+
+
+class PatchedTransitionModel(TransitionModel):
+    """
+    PatchedTransitionModel class
+    Transition model of an edited grid, patched from the model of the grid it was 
+    edited from. It starts out with the dense arrays of the batched solvers only, 
+    the outcome rows are compiled from the grid the first time they are used.
+
+    Members:
+        grid: the edited grid
+        compiled: TransitionModel of the grid, None until the rows are used
+    """
+    def __init__(self, grid, dense_moves: Tuple[np.ndarray, np.ndarray, np.ndarray], build_time: float = 0.0):
+        self.grid = grid
+        self.num_states = len(grid.state_list)
+        self.num_actions = len(grid.ACTIONS)
+        self.dense_moves = dense_moves
+        self.build_time = build_time
+        self.compiled = None
+
+    def get_compiled(self) -> TransitionModel:
+        if self.compiled is None:
+            self.compiled = TransitionModel.from_grid(self.grid)
+        return self.compiled
+
+    def __len__(self):
+        return len(self.get_compiled())
+
+    def get_outcomes(self, state: int, action: int) -> Tuple[Tuple[float, float, int], ...]:
+        return self.get_compiled().get_outcomes(state, action)
+
+    def row_slice(self, state: int, action: int) -> slice:
+        return self.get_compiled().row_slice(state, action)
+
+    def get_dense_moves(self, moves: int, branching: int = 3) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self.dense_moves[0].shape[1:] == (moves, branching):
+            return self.dense_moves
+        return self.get_compiled().get_dense_moves(moves, branching)
@@ -1,9 +1,13 @@
 from app.routes.main_routes import api_bp
 from app.routes.q_learning_routes import q_learning_bp
 from app.routes.value_iteration_routes import value_iteration_bp
+from app.routes.policy_iteration_routes import policy_iteration_bp
+from app.routes.run_routes import runs_bp
+from app.routes.job_routes import jobs_bp
+from app.routes.sweep_routes import sweeps_bp
 
 
 def register_routes(app):
     app.register_blueprint(api_bp)
 
-__all__ = ['api_bp', 'q_learning_bp', 'value_iteration_bp', 'register_routes']
\ No newline at end of file
+__all__ = ['api_bp', 'q_learning_bp', 'value_iteration_bp', 'policy_iteration_bp', 'runs_bp', 'jobs_bp', 'sweeps_bp', 'register_routes']
\ No newline at end of file
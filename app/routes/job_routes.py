@@ -0,0 +1,48 @@
+from flask import Blueprint, request, jsonify, current_app
+from app.controllers.job_controller import JobController
+from app.services import job_manager
+
+jobs_bp = Blueprint('jobs', __name__)
+controller = JobController(job_manager)
+
+@jobs_bp.route('/<any("value-iteration", "q-learning"):kind>', methods=['POST'])
+def submit_job(kind):
+    data = request.json
+    if not data:
+        return jsonify({'error': 'No input data provided'}), 400
+    try:
+        return jsonify(controller.submit(kind, data)), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except OverflowError as e:
+        return jsonify({'error': str(e)}), 429
+
+@jobs_bp.route('/stats', methods=['GET'])
+def get_stats():
+    return jsonify(controller.get_stats())
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_status(job_id):
+    try:
+        return jsonify(controller.get_status(job_id, request.args.get('wait', 0)))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+def get_result(job_id):
+    try:
+        body, status = controller.get_result(job_id)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    if body is None:
+        return jsonify(status), 409
+    return current_app.response_class(body, mimetype='application/json')
+
+@jobs_bp.route('/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    try:
+        return jsonify(controller.cancel(job_id))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
@@ -1,12 +1,29 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app.routes.q_learning_routes import q_learning_bp
 from app.routes.value_iteration_routes import value_iteration_bp
+from app.routes.policy_iteration_routes import policy_iteration_bp
+from app.routes.run_routes import runs_bp
+from app.routes.job_routes import jobs_bp
+from app.routes.sweep_routes import sweeps_bp
+from app.services import result_cache, metrics
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 api_bp.register_blueprint(q_learning_bp, url_prefix='/q-learning')
 api_bp.register_blueprint(value_iteration_bp, url_prefix='/value-iteration')
+api_bp.register_blueprint(policy_iteration_bp, url_prefix='/policy-iteration')
+api_bp.register_blueprint(runs_bp, url_prefix='/runs')
+api_bp.register_blueprint(jobs_bp, url_prefix='/jobs')
+api_bp.register_blueprint(sweeps_bp, url_prefix='/sweeps')
 
 @api_bp.route('/test', methods=['GET'])
 def test():
-    return jsonify({'message': 'Hello, World!'})
\ No newline at end of file
+    return jsonify({'message': 'Hello, World!'})
+
+@api_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.get_stats())
+
+@api_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return current_app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
\ No newline at end of file
@@ -0,0 +1,71 @@
+from flask import Blueprint, request, jsonify, current_app
+from app.controllers.policy_iteration_controller import PolicyIterationController
+from app.services import result_cache, run_store, run_limits, history_storage, metrics, stream_records, accepts_columnar, serialize_result, get_mimetype
+
+policy_iteration_bp = Blueprint('policy_iteration', __name__)
+controller = PolicyIterationController(cache=result_cache, run_store=run_store, limits=run_limits, history_storage=history_storage)
+
+@policy_iteration_bp.route('/run-agent', methods=['POST'])
+def run_agent():
+    try:
+        with metrics.phase('parse'):
+            data = request.json
+        if not data:
+            raise ValueError("No input data provided")
+        columnar = accepts_columnar(request.headers.get('Accept', ''))
+        body = controller.run_agent_cached(data, serialize_result, columnar)
+        return current_app.response_class(body, mimetype=get_mimetype(body))
+    except ValueError as e:
+        raise ValueError(f"ValueError in run_agent: {str(e)}") from e
+    except Exception as e:
+        import traceback
+        tb = traceback.format_exc()
+        error_line = tb.splitlines()[-2].strip()
+        error_file = tb.splitlines()[-3].strip().split(",")[0].replace('File ', '').replace('"', '')
+        raise Exception(f"An unexpected error occurred in {error_file} at line {error_line}: {str(e)}") from e
+
+@policy_iteration_bp.route('/run-agent/stream', methods=['POST'])
+def stream_agent():
+    try:
+        with metrics.phase('parse'):
+            data = request.json
+        if not data:
+            raise ValueError("No input data provided")
+        records = controller.stream_agent(data)
+        return stream_records(records, request.headers.get('Accept', ''))
+    except ValueError as e:
+        raise ValueError(f"ValueError in stream_agent: {str(e)}") from e
+    except Exception as e:
+        import traceback
+        tb = traceback.format_exc()
+        error_line = tb.splitlines()[-2].strip()
+        error_file = tb.splitlines()[-3].strip().split(",")[0].replace('File ', '').replace('"', '')
+        raise Exception(f"An unexpected error occurred in {error_file} at line {error_line}: {str(e)}") from e
+
+@policy_iteration_bp.route('/query', methods=['POST'])
+def answer_queries():
+    try:
+        with metrics.phase('parse'):
+            data = request.json
+        if not data:
+            raise ValueError("No input data provided")
+        return jsonify(controller.answer_queries(data))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@policy_iteration_bp.route('/resolve', methods=['POST'])
+def resolve():
+    try:
+        with metrics.phase('parse'):
+            data = request.json
+        if not data:
+            raise ValueError("No input data provided")
+        columnar = accepts_columnar(request.headers.get('Accept', ''))
+        body = controller.resolve(data, serialize_result, columnar)
+        return current_app.response_class(body, mimetype=get_mimetype(body))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
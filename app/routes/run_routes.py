@@ -0,0 +1,31 @@
+from flask import Blueprint, request, jsonify, current_app
+from app.controllers.run_controller import RunController
+from app.services import run_store, accepts_columnar, serialize_result, get_mimetype
+
+runs_bp = Blueprint('runs', __name__)
+controller = RunController(run_store)
+
+@runs_bp.route('/<run_id>', methods=['GET'])
+def get_run(run_id):
+    try:
+        return jsonify(controller.get_run(run_id))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+
+@runs_bp.route('/<run_id>/iterations', methods=['GET'])
+def get_iterations(run_id):
+    try:
+        columnar = accepts_columnar(request.headers.get('Accept', ''))
+        body = serialize_result(controller.get_iterations(run_id, request.args, columnar))
+        return current_app.response_class(body, mimetype=get_mimetype(body))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@runs_bp.route('/<run_id>', methods=['DELETE'])
+def delete_run(run_id):
+    try:
+        return jsonify(controller.delete_run(run_id))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
@@ -0,0 +1,16 @@
+from flask import Blueprint, request, jsonify
+from app.controllers.sweep_controller import SweepController
+from app.services import sweep_pool, run_limits
+
+sweeps_bp = Blueprint('sweeps', __name__)
+controller = SweepController(sweep_pool, limits=run_limits)
+
+@sweeps_bp.route('/<any("value-iteration", "q-learning"):kind>', methods=['POST'])
+def run_sweep(kind):
+    data = request.json
+    if not data:
+        return jsonify({'error': 'No input data provided'}), 400
+    try:
+        return jsonify(controller.run_sweep(kind, data))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
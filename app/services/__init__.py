@@ -0,0 +1,23 @@
+from app.services.shared_store import SharedStore, shared_store
+from app.services.result_cache import ResultCache, result_cache, make_cache_key, normalize_grid_conf
+from app.services.job_manager import JobManager, Job, job_manager
+from app.services.run_store import RunStore, StoredRun, run_store
+from app.services.sweep_pool import SweepPool, sweep_pool
+from app.services.columnar import COLUMNAR_MIMETYPE, accepts_columnar, encode_columnar, decode_columnar, serialize_result, get_mimetype
+from app.services.compression import ResponseCompression, response_compression
+from app.services.streaming import stream_records, format_ndjson, format_sse
+from app.services.run_limits import RunLimits, run_limits
+from app.services.metrics import Metrics, RequestTiming, Counter, Gauge, Histogram, metrics
+from app.services.history_storage import HistoryStorage, history_storage
+
+__all__ = ['SharedStore', 'shared_store',
+           'ResultCache', 'result_cache', 'make_cache_key', 'normalize_grid_conf',
+           'JobManager', 'Job', 'job_manager',
+           'RunStore', 'StoredRun', 'run_store',
+           'SweepPool', 'sweep_pool',
+           'COLUMNAR_MIMETYPE', 'accepts_columnar', 'encode_columnar', 'decode_columnar', 'serialize_result', 'get_mimetype',
+           'ResponseCompression', 'response_compression',
+           'stream_records', 'format_ndjson', 'format_sse',
+           'RunLimits', 'run_limits',
+           'Metrics', 'RequestTiming', 'Counter', 'Gauge', 'Histogram', 'metrics',
+           'HistoryStorage', 'history_storage']
@@ -0,0 +1,92 @@
+import json
+import struct
+from typing import Any, Dict
+import numpy as np
+from flask import jsonify
+
+COLUMNAR_MIMETYPE = 'application/vnd.reinforceviz.columnar'
+COLUMNAR_MAGIC = b'RVZ1'
+ALIGNMENT = 8
+
+
+def accepts_columnar(accept: str) -> bool:
+    """
+    Check if an Accept header asks for the columnar format, JSON stays the default
+    :param accept: Accept header of the request
+    """
+    return COLUMNAR_MIMETYPE in (accept or '')
+
+
+def get_mimetype(body: bytes) -> str:
+    """
+    Get the mimetype of a serialized response, columnar bodies start with COLUMNAR_MAGIC
+    """
+    return COLUMNAR_MIMETYPE if body[:len(COLUMNAR_MAGIC)] == COLUMNAR_MAGIC else 'application/json'
+
+
+def encode_columnar(result: Dict[str, Any]) -> bytes:
+    """
+    Encode a result whose "columns" entry maps names to numpy arrays.
+
+    Layout, all numbers little endian:
+        magic        4 bytes, "RVZ1"
+        header_size  uint32
+        header       UTF-8 JSON with every field of the result except the columns, plus
+                     "columns": [{name, dtype, shape, offset}], offsets count from the
+                     start of the data section
+        padding      zero bytes up to a multiple of 8
+        data         the arrays in C order, each one starting at a multiple of 8
+
+    :param result: result dict with a "columns" entry
+    :return serialized result
+    """
+    header = {key: value for key, value in result.items() if key != 'columns'}
+    descriptors = []
+    arrays = []
+    offset = 0
+    for name, array in result['columns'].items():
+        array = np.ascontiguousarray(array, dtype=np.asarray(array).dtype.newbyteorder('<'))
+        descriptors.append({'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset})
+        arrays.append(array)
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header['columns'] = descriptors
+
+    header_bytes = json.dumps(header, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    prefix_size = len(COLUMNAR_MAGIC) + 4 + len(header_bytes)
+    chunks = [COLUMNAR_MAGIC, struct.pack('<I', len(header_bytes)), header_bytes, bytes(-prefix_size % ALIGNMENT)]
+    for array in arrays:
+        chunks.append(array.tobytes())
+        chunks.append(bytes(-array.nbytes % ALIGNMENT))
+    return b''.join(chunks)
+
+
+def decode_columnar(body: bytes) -> Dict[str, Any]:
+    """
+    Decode a columnar body back to its header fields and numpy arrays, the inverse of encode_columnar
+    :return result dict with the arrays in "columns"
+    """
+    if body[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar body")
+    (header_size,) = struct.unpack_from('<I', body, len(COLUMNAR_MAGIC))
+    start = len(COLUMNAR_MAGIC) + 4
+    header = json.loads(body[start:start + header_size])
+    data_start = start + header_size
+    data_start += -data_start % ALIGNMENT
+    columns = {}
+    for column in header.pop('columns'):
+        dtype = np.dtype(column['dtype'])
+        count = int(np.prod(column['shape'], dtype=np.int64))
+        array = np.frombuffer(body, dtype=dtype, count=count, offset=data_start + column['offset'])
+        columns[column['name']] = array.reshape(column['shape'])
+    header['columns'] = columns
+    return header
+
+
+def serialize_result(result: Dict[str, Any]) -> bytes:
+    """
+    Serialize a run-agent result, in the columnar format when it has columns
+    and as JSON, the same way jsonify does, otherwise
+    """
+    if 'columns' in result:
+        return encode_columnar(result)
+    return jsonify(result).get_data()
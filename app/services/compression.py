@@ -0,0 +1,109 @@
+import gzip
+import os
+from typing import Dict, List
+from app.services.metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, only gzip is offered without it
+    brotli = None
+
+
+def parse_accept_encoding(accept_encoding: str) -> Dict[str, float]:
+    """
+    Parse an Accept-Encoding header to coding -> quality
+    """
+    codings = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        codings[coding.strip().lower()] = quality
+    return codings
+
+
+class ResponseCompression:
+    """
+    ResponseCompression class
+    Compresses response bodies with the best content coding the client accepts,
+    br when the brotli package is installed, otherwise gzip. Streamed responses,
+    small bodies and bodies that already have a content coding are left alone.
+
+    Members:
+        min_bytes: bodies smaller than this are sent uncompressed
+        level: compression level, 1 (fastest) to 9 (smallest), mapped to brotli's 0 to 11 scale
+    """
+    def __init__(self, min_bytes: int = 1024, level: int = 6):
+        self.min_bytes = int(min_bytes)
+        self.level = int(level)
+
+    @classmethod
+    def from_env(cls) -> 'ResponseCompression':
+        """
+        Create a compressor configured by the RESPONSE_COMPRESSION_MIN_BYTES and
+        RESPONSE_COMPRESSION_LEVEL environment variables
+        """
+        return cls(
+            min_bytes=int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', 1024)),
+            level=int(os.environ.get('RESPONSE_COMPRESSION_LEVEL', 6))
+        )
+
+    def get_codings(self) -> List[str]:
+        """
+        Supported content codings, most preferred first
+        """
+        return (['br'] if brotli is not None else []) + ['gzip']
+
+    def choose_coding(self, accept_encoding: str):
+        """
+        Pick the content coding for an Accept-Encoding header
+        :return coding, None to send the body uncompressed
+        """
+        accepted = parse_accept_encoding(accept_encoding)
+        best = None
+        for coding in self.get_codings():
+            quality = accepted.get(coding, accepted.get('*', 0.0))
+            if quality > 0 and (best is None or quality > best[1]):
+                best = (coding, quality)
+        return None if best is None else best[0]
+
+    def compress(self, body: bytes, coding: str) -> bytes:
+        if coding == 'br':
+            return brotli.compress(body, quality=round(self.level * 11 / 9))
+        return gzip.compress(body, compresslevel=self.level, mtime=0)
+
+    def compress_response(self, request, response):
+        """
+        after_request hook, compresses the response in place if the client accepts it
+        """
+        response.vary.add('Accept-Encoding')
+        if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+                or 'Content-Encoding' in response.headers):
+            return response
+        body = response.get_data()
+        if len(body) < self.min_bytes:
+            return response
+        coding = self.choose_coding(request.headers.get('Accept-Encoding', ''))
+        if coding is None:
+            return response
+        with metrics.phase('compress'):
+            response.set_data(self.compress(body, coding))
+        response.headers['Content-Encoding'] = coding
+        return response
+
+    def init_app(self, app):
+        """
+        Compress every response of a Flask app
+        """
+        from flask import request
+        app.after_request(lambda response: self.compress_response(request, response))
+
+
+response_compression = ResponseCompression.from_env()
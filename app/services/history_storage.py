@@ -0,0 +1,119 @@
+import os
+import tempfile
+import threading
+import time
+import weakref
+from typing import Optional, Tuple
+import numpy as np
+
+FILE_PREFIX = 'history-'
+FILE_SUFFIX = '.bin'
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class HistoryStorage:
+    """
+    HistoryStorage class
+    Allocates the per step history arrays of the agents (value and action arrays of
+    value iteration, q values of Q-learning). Arrays of at least spill_bytes are
+    memory mapped files in a scratch directory: the solve writes its steps through
+    to the file and the pages can be dropped by the OS, instead of the whole history
+    staying in the worker's memory. Reading a window of steps is a slice of the
+    mapping, only the pages of the steps that are read are loaded.
+
+    A file is removed once its array and every view of it is garbage collected.
+    Files left behind by workers that died are removed by cleanup once they are
+    older than the ttl. On POSIX a file removed while it is still mapped stays
+    readable until it is unmapped, so the ttl only has to outlive the workers.
+
+    Members:
+        directory: scratch directory of the files, None keeps every history in memory
+        spill_bytes: size from which a history is spilled to a file
+        ttl: seconds after its last write a left behind file is removed
+    """
+    # cleanup runs at most once per interval, when arrays are allocated
+    CLEANUP_INTERVAL = 60
+
+    def __init__(self, directory: Optional[str] = None, spill_bytes: int = 64 * 1024 * 1024, ttl: float = 3600):
+        self.directory = directory
+        self.spill_bytes = int(spill_bytes)
+        self.ttl = float(ttl)
+        self.last_cleanup = 0.0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'HistoryStorage':
+        """
+        Create a storage configured by the HISTORY_SPILL_DIR, HISTORY_SPILL_BYTES and
+        HISTORY_SPILL_TTL environment variables. An empty HISTORY_SPILL_DIR keeps every
+        history in memory
+        """
+        directory = os.environ.get('HISTORY_SPILL_DIR', os.path.join(tempfile.gettempdir(), 'reinforceviz-history'))
+        return cls(
+            directory=directory or None,
+            spill_bytes=int(os.environ.get('HISTORY_SPILL_BYTES', 64 * 1024 * 1024)),
+            ttl=float(os.environ.get('HISTORY_SPILL_TTL', 3600))
+        )
+
+    def allocate(self, shape: Tuple[int, ...], dtype=float) -> np.ndarray:
+        """
+        Allocate a zero filled history array
+
+        :param shape: shape of the array, steps first
+        :param dtype: numpy dtype of the array
+        :return np.ndarray, an np.memmap if the array is spilled to a file
+        """
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if self.directory is None or nbytes < self.spill_bytes:
+            return np.zeros(shape, dtype=dtype)
+        self.cleanup()
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix=FILE_PREFIX, suffix=FILE_SUFFIX, dir=self.directory)
+        try:
+            # a file extended with truncate reads as zeros without writing them
+            os.ftruncate(fd, nbytes)
+            array = np.memmap(path, dtype=dtype, mode='r+', shape=tuple(shape))
+        except Exception:
+            os.close(fd)
+            remove_file(path)
+            raise
+        os.close(fd)
+        weakref.finalize(array, remove_file, path)
+        return array
+
+    def cleanup(self, force: bool = False) -> int:
+        """
+        Remove the files of the directory that were not written within the ttl
+
+        :param force: clean up even if the last cleanup was within CLEANUP_INTERVAL
+        :return number of removed files
+        """
+        now = time.time()
+        with self.lock:
+            if self.directory is None or (not force and now - self.last_cleanup < self.CLEANUP_INTERVAL):
+                return 0
+            self.last_cleanup = now
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0
+        removed = 0
+        for entry in entries:
+            if not (entry.name.startswith(FILE_PREFIX) and entry.name.endswith(FILE_SUFFIX)):
+                continue
+            try:
+                if now - entry.stat().st_mtime > self.ttl:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+history_storage = HistoryStorage.from_env()
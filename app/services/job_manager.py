@@ -0,0 +1,309 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMED_OUT = 'timed_out'
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED, TIMED_OUT)
+
+
+def run_job(kind: str, data: Dict[str, Any], progress, connection) -> None:
+    """
+    Entry point of a job's worker process. Runs the agent through its controller,
+    publishes the completed step in progress and sends the outcome over connection:
+    (COMPLETED, None) followed by the serialized result bytes, or (FAILED, message)
+
+    :param kind: "value-iteration" or "q-learning"
+    :param data: run-agent request body
+    :param progress: shared multiprocessing Value holding the last completed step
+    :param connection: sending end of a multiprocessing Pipe
+    """
+    # imported here so the parent does not need the controllers to start a worker
+    from app.controllers import QLearningController, ValueIterationController
+    from app.services.history_storage import history_storage
+
+    def report_progress(step):
+        progress.value = step
+
+    try:
+        controller_class = ValueIterationController if kind == 'value-iteration' else QLearningController
+        controller = controller_class(history_storage=history_storage)
+        result = controller.run_agent(data, progress_callback=report_progress)
+        if 'iterations' not in result:
+            connection.send((FAILED, result.get('error') or result.get('message')))
+            return
+        # same encoding as jsonify outside of debug mode
+        body = json.dumps(result, sort_keys=True, separators=(',', ':')) + '\n'
+        connection.send((COMPLETED, None))
+        connection.send_bytes(body.encode('utf-8'))
+    except Exception as e:
+        connection.send((FAILED, str(e)))
+    finally:
+        connection.close()
+
+
+class Job:
+    """
+    Job class
+    A run-agent request executed in a local worker process.
+
+    Members:
+        job_id: id of the job
+        kind: "value-iteration" or "q-learning"
+        data: run-agent request body
+        total_steps: number of steps (sweeps or episodes) the run will do at most
+        status: one of queued, running, completed, failed, cancelled, timed_out
+        error: error message of a failed job
+        result: serialized JSON result of a completed job
+        progress: shared value with the last completed step, set once the job runs
+        process, connection: worker process and the receiving end of its pipe
+        submitted_at, started_at, finished_at: time.time() timestamps
+    """
+    def __init__(self, kind: str, data: Dict[str, Any], total_steps: int):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.data = data
+        self.total_steps = total_steps
+        self.status = QUEUED
+        self.error = None
+        self.result = None
+        self.progress = None
+        self.process = None
+        self.connection = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Status report of the job, without the result
+        """
+        return {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': {
+                'step': 0 if self.progress is None else self.progress.value,
+                'total': self.total_steps
+            },
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobManager:
+    """
+    JobManager class
+    Runs jobs in a bounded set of local worker processes, one process per job so
+    a job can be cancelled or timed out by terminating it. A scheduler thread
+    starts queued jobs, collects results and enforces timeouts. No external
+    broker is involved, jobs are only visible to the process that submitted them.
+
+    Members:
+        max_workers: number of jobs that run at the same time
+        max_queue: number of jobs that may wait for a worker
+        timeout: seconds a job may run before it is terminated
+        result_ttl: seconds a finished job is kept for its client
+        start_method: multiprocessing start method of the worker processes
+    """
+    def __init__(self, max_workers: int = 2, max_queue: int = 16, timeout: float = 300, result_ttl: float = 600,
+                 start_method: str = 'spawn'):
+        self.max_workers = int(max_workers)
+        self.max_queue = int(max_queue)
+        self.timeout = float(timeout)
+        self.result_ttl = float(result_ttl)
+        self.context = multiprocessing.get_context(start_method)
+        self.jobs = OrderedDict()  # job_id -> Job
+        self.queue = deque()
+        self.running = {}  # job_id -> Job
+        self.condition = threading.Condition()
+        self.scheduler = None
+
+    @classmethod
+    def from_env(cls) -> 'JobManager':
+        """
+        Create a manager configured by the JOB_WORKERS, JOB_QUEUE_DEPTH, JOB_TIMEOUT,
+        JOB_RESULT_TTL and JOB_START_METHOD environment variables
+        """
+        return cls(
+            max_workers=int(os.environ.get('JOB_WORKERS', os.cpu_count() or 1)),
+            max_queue=int(os.environ.get('JOB_QUEUE_DEPTH', 16)),
+            timeout=float(os.environ.get('JOB_TIMEOUT', 300)),
+            result_ttl=float(os.environ.get('JOB_RESULT_TTL', 600)),
+            start_method=os.environ.get('JOB_START_METHOD', 'spawn')
+        )
+
+    def submit(self, kind: str, data: Dict[str, Any], total_steps: int) -> Job:
+        """
+        Queue a job
+
+        :param kind: "value-iteration" or "q-learning"
+        :param data: run-agent request body
+        :param total_steps: number of steps the run will do at most
+        :raises OverflowError: if the queue is full
+        :return queued Job
+        """
+        job = Job(kind, data, total_steps)
+        with self.condition:
+            if len(self.queue) >= self.max_queue:
+                raise OverflowError(f"Job queue is full ({self.max_queue} jobs waiting)")
+            self.jobs[job.job_id] = job
+            self.queue.append(job)
+            self.ensure_scheduler()
+            self.condition.notify_all()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Get a job by id, None if it does not exist or has expired
+        """
+        with self.condition:
+            return self.jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """
+        Long poll a job: wait until it finishes or timeout seconds have passed
+
+        :param job_id: id of the job
+        :param timeout: seconds to wait at most
+        :return Job, None if it does not exist
+        """
+        deadline = time.time() + timeout
+        with self.condition:
+            job = self.jobs.get(job_id)
+            while job is not None and not job.is_finished() and time.time() < deadline:
+                self.condition.wait(deadline - time.time())
+            return job
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a queued or running job, finished jobs are left unchanged
+
+        :param job_id: id of the job
+        :return Job, None if it does not exist
+        """
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None or job.is_finished():
+                return job
+            if job.status == QUEUED:
+                self.queue.remove(job)
+            self.finish(job, CANCELLED)
+            self.condition.notify_all()
+            return job
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get the queue depth and worker usage
+        """
+        with self.condition:
+            return {
+                'queued': len(self.queue),
+                'running': len(self.running),
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'timeout': self.timeout
+            }
+
+    def ensure_scheduler(self):
+        """
+        Start the scheduler thread on first use, callers hold the condition
+        """
+        if self.scheduler is None or not self.scheduler.is_alive():
+            self.scheduler = threading.Thread(target=self.schedule, name='job-scheduler', daemon=True)
+            self.scheduler.start()
+
+    def schedule(self):
+        """
+        Scheduler loop: collect finished workers, enforce timeouts, start queued
+        jobs on free workers and drop expired finished jobs
+        """
+        while True:
+            with self.condition:
+                self.collect()
+                while self.queue and len(self.running) < self.max_workers:
+                    self.start(self.queue.popleft())
+                self.expire()
+                self.condition.wait(0.05)
+
+    def start(self, job: Job):
+        """
+        Start a job in a new worker process, callers hold the condition
+        """
+        receiver, sender = self.context.Pipe(duplex=False)
+        job.progress = self.context.Value('q', 0)
+        job.connection = receiver
+        job.process = self.context.Process(target=run_job, args=(job.kind, job.data, job.progress, sender), daemon=True)
+        job.process.start()
+        sender.close()
+        job.status = RUNNING
+        job.started_at = time.time()
+        self.running[job.job_id] = job
+        self.condition.notify_all()
+
+    def collect(self):
+        """
+        Receive the outcome of workers that are done and time out workers that
+        ran too long, callers hold the condition
+        """
+        now = time.time()
+        for job in list(self.running.values()):
+            if job.connection.poll():
+                try:
+                    status, error = job.connection.recv()
+                    if status == COMPLETED:
+                        job.result = job.connection.recv_bytes()
+                    job.error = error
+                except EOFError:
+                    status = FAILED
+                    job.error = 'Worker process exited unexpectedly'
+                self.finish(job, status)
+            elif not job.process.is_alive():
+                job.error = f"Worker process exited with code {job.process.exitcode}"
+                self.finish(job, FAILED)
+            elif now - job.started_at > self.timeout:
+                job.error = f"Job exceeded the timeout of {self.timeout:g} seconds"
+                self.finish(job, TIMED_OUT)
+            else:
+                continue
+            self.condition.notify_all()
+
+    def finish(self, job: Job, status: str):
+        """
+        Mark a job as finished and release its worker, callers hold the condition
+        """
+        job.status = status
+        job.finished_at = time.time()
+        if job.process is not None:
+            if job.process.is_alive():
+                job.process.terminate()
+            job.process.join(1)
+            job.connection.close()
+            job.process = None
+            job.connection = None
+        self.running.pop(job.job_id, None)
+
+    def expire(self):
+        """
+        Drop finished jobs older than the result time to live, callers hold the condition
+        """
+        now = time.time()
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.is_finished() and now - job.finished_at > self.result_ttl]:
+            del self.jobs[job_id]
+
+
+job_manager = JobManager.from_env()
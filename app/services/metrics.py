@@ -0,0 +1,270 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0)
+STATE_BUCKETS = (12, 50, 100, 500, 1000, 2500, 5000, 10000, 25000)
+STEP_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000)
+BYTE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+class Metric:
+    """
+    Metric class
+    Base of the metric types, a value per combination of label values.
+
+    Members:
+        name: metric name
+        help: description for the HELP line
+        labels: label names, every update passes a value for each of them
+    """
+    TYPE = None
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get_key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"Metric {self.name} expects the labels {self.labels}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.TYPE}"]
+        with self.lock:
+            for key in sorted(self.values):
+                lines.extend(self.render_samples(key, self.values[key]))
+        return lines
+
+    def render_samples(self, key, value) -> List[str]:
+        return [f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"]
+
+
+class Counter(Metric):
+    TYPE = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.get_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    TYPE = 'gauge'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.get_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """
+    Histogram class
+    Cumulative buckets, sum and count per combination of label values
+    """
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self.get_key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def render_samples(self, key, value) -> List[str]:
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), key + (format_value(bound),))} {cumulative}")
+        labels = format_labels(self.labels, key)
+        lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class RequestTiming:
+    """
+    RequestTiming class
+    Phase durations of the current request, in order of their first occurrence.
+    A phase that runs more than once adds up, phases may nest (solve includes compile).
+
+    Members:
+        route: url rule of the request, the route label of its metrics
+        started: time.perf_counter() at the start of the request
+        phases: phase name -> seconds
+    """
+    def __init__(self, route: str):
+        self.route = route
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def get_header(self, total: float) -> str:
+        """
+        Server-Timing header value, durations in milliseconds
+        """
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.phases.items()]
+        entries.append(f"total;dur={total * 1000:.3f}")
+        return ', '.join(entries)
+
+
+_timing: ContextVar[Optional[RequestTiming]] = ContextVar('request_timing', default=None)
+
+
+class Metrics:
+    """
+    Metrics class
+    Process wide metrics of the app in the Prometheus text format, and the per request
+    phase timing that is sent back in a Server-Timing header. Controllers and agents
+    time their phases with phase(), outside of a request (jobs, sweeps) phases are not recorded.
+
+    Members:
+        registry: list of every metric, in the order they are rendered
+        server_timing: send the Server-Timing header
+    """
+    def __init__(self, server_timing: bool = True):
+        self.server_timing = server_timing
+        self.requests = Histogram('reinforceviz_request_duration_seconds', 'Request latency by route, method and status',
+                                  ('route', 'method', 'status'))
+        self.phases = Histogram('reinforceviz_phase_duration_seconds', 'Duration of the phases of a request by route and phase',
+                                ('route', 'phase'))
+        self.in_flight = Gauge('reinforceviz_requests_in_flight', 'Requests being handled')
+        self.response_bytes = Histogram('reinforceviz_response_bytes', 'Bytes of the response bodies by route, after compression',
+                                        ('route',), BYTE_BUCKETS)
+        self.payload_bytes = Histogram('reinforceviz_payload_bytes', 'Bytes of the serialized run results by kind, before compression',
+                                       ('kind',), BYTE_BUCKETS)
+        self.grid_states = Histogram('reinforceviz_grid_states', 'States of the grids that were solved by kind', ('kind',), STATE_BUCKETS)
+        self.steps = Histogram('reinforceviz_run_steps', 'Recorded steps (or episodes) of the runs by kind', ('kind',), STEP_BUCKETS)
+        self.truncated = Counter('reinforceviz_truncated_runs_total', 'Runs that ran out of their budget by kind', ('kind',))
+        self.registry = [self.requests, self.phases, self.in_flight, self.response_bytes, self.payload_bytes,
+                         self.grid_states, self.steps, self.truncated]
+        self.in_flight.values[()] = 0
+
+    @classmethod
+    def from_env(cls) -> 'Metrics':
+        """
+        Create the metrics configured by the SERVER_TIMING environment variable
+        """
+        return cls(server_timing=os.environ.get('SERVER_TIMING', 'True').lower() == 'true')
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time a phase of the current request
+        :param name: phase name, the Server-Timing entry and the phase label
+        """
+        timing = _timing.get()
+        if timing is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            timing.add(name, seconds)
+            self.phases.observe(seconds, route=timing.route, phase=name)
+
+    def time_serialize(self, kind: str, serialize: Callable[[dict], bytes]) -> Callable[[dict], bytes]:
+        """
+        Wrap a result serializer so every call is timed as the serialize phase and
+        the size of the serialized result is recorded
+        """
+        def wrapper(result):
+            with self.phase('serialize'):
+                body = serialize(result)
+            self.payload_bytes.observe(len(body), kind=kind)
+            return body
+        return wrapper
+
+    def observe_run(self, kind: str, agent):
+        """
+        Record the grid size, the step count and the truncation of a finished run
+        """
+        self.grid_states.observe(len(agent.grid.state_list), kind=kind)
+        self.steps.observe(agent.get_step_count(), kind=kind)
+        if agent.truncated():
+            self.truncated.inc(kind=kind)
+
+    def start_request(self, route: str):
+        self.in_flight.inc()
+        _timing.set(RequestTiming(route))
+
+    def finish_request(self, method: str, response):
+        """
+        Record the latency and body size of a response and add its Server-Timing header.
+        Streamed bodies are still being generated, their latency is the time to the first byte
+        """
+        timing = _timing.get()
+        if timing is None:
+            return response
+        total = time.perf_counter() - timing.started
+        self.requests.observe(total, route=timing.route, method=method, status=str(response.status_code))
+        if not response.is_streamed and not response.direct_passthrough:
+            self.response_bytes.observe(response.content_length or 0, route=timing.route)
+        if self.server_timing:
+            response.headers['Server-Timing'] = timing.get_header(total)
+        return response
+
+    def end_request(self):
+        if _timing.get() is not None:
+            _timing.set(None)
+            self.in_flight.dec()
+
+    def render(self) -> str:
+        """
+        Every metric in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in self.registry:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def init_app(self, app):
+        """
+        Time every request of a Flask app. Register it before the other after_request
+        hooks so its total includes them (Flask runs after_request hooks in reverse)
+        """
+        from flask import request
+
+        def before_request():
+            self.start_request(request.url_rule.rule if request.url_rule is not None else 'unmatched')
+
+        app.before_request(before_request)
+        app.after_request(lambda response: self.finish_request(request.method, response))
+        app.teardown_request(lambda exception: self.end_request())
+
+
+metrics = Metrics.from_env()
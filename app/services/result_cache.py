@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from app.services.shared_store import SharedStore, shared_store
+
+
+def normalize_grid_conf(grid_conf: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalize a grid configuration so equivalent grids compare equal
+
+    Numbers are cast the way Grid reads them, boulders are deduplicated and 
+    sorted and terminals are sorted, keeping the last terminal for a cell 
+    like Grid does.
+
+    :param grid_conf: grid configuration as passed to Grid
+    :return normalized grid configuration
+    """
+    terminals = {}
+    for state in grid_conf.get('terminal', []):
+        terminals[(int(state[0]), int(state[1]))] = float(state[2])
+    robot_coord = grid_conf.get('robotStartState')
+    return {
+        'x': int(grid_conf['x']),
+        'y': int(grid_conf['y']),
+        'terminal': sorted([x, y, reward] for (x, y), reward in terminals.items()),
+        'boulder': sorted({(int(state[0]), int(state[1])) for state in grid_conf.get('boulder', [])}),
+        'robotStartState': None if robot_coord is None else [int(robot_coord[0]), int(robot_coord[1])],
+        'k': int(grid_conf.get('k', 0)),
+        'discount': float(grid_conf['discount']),
+        'noise': float(grid_conf['noise']),
+        'transitionCost': float(grid_conf.get('transitionCost', 0.0)),
+        'alpha': float(grid_conf.get('alpha', 0.0)),
+        'episodes': int(grid_conf.get('episodes', 0))
+    }
+
+
+def make_cache_key(namespace: str, grid_conf: Dict[str, Any], options: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build a content addressed key from a canonical encoding of the normalized 
+    grid configuration and any options that change the result
+
+    :param namespace: separates results of different agents
+    :param grid_conf: grid configuration as passed to Grid
+    :param options: other request options that change the result
+    :return key string
+    """
+    canonical = json.dumps(
+        {'grid': normalize_grid_conf(grid_conf), 'options': options or {}},
+        sort_keys=True, separators=(',', ':')
+    )
+    return f"{namespace}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+class ResultCache:
+    """
+    ResultCache class
+    Bounded LRU cache of run-agent results keyed by content addressed keys.
+
+    Members:
+        max_bytes: total size of cached entries, least recently used entries
+                   are evicted to stay below it
+        store_serialized: keep the serialized JSON bytes instead of the result, 
+                          so a hit skips serialization completely
+        current_bytes: size of the cached entries, the serialized size is used 
+                       for both kinds of entries
+        shared: optional SharedStore of the host, get_or_compute looks up local misses
+                in it and writes computed results to it, so the workers share results
+        hits, misses, evictions: counters, shared_hits counts the local misses found in shared
+    """
+    # prefix of the result keys in the shared store
+    SHARED_PREFIX = 'result:'
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, store_serialized: bool = True,
+                 shared: Optional[SharedStore] = None):
+        self.max_bytes = int(max_bytes)
+        self.store_serialized = store_serialized
+        self.shared = shared
+        self.shared_hits = 0
+        self.entries = OrderedDict()  # key -> (value, size)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, shared: Optional[SharedStore] = None) -> 'ResultCache':
+        """
+        Create a cache configured by the RESULT_CACHE_MAX_BYTES and 
+        RESULT_CACHE_SERIALIZED environment variables
+        :param shared: optional SharedStore of the host
+        """
+        return cls(
+            max_bytes=int(os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+            store_serialized=os.environ.get('RESULT_CACHE_SERIALIZED', 'True').lower() == 'true',
+            shared=shared
+        )
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get a cached entry and mark it as recently used
+
+        :param key: cache key
+        :return cached result or serialized bytes, None on a miss
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any, size: int) -> bool:
+        """
+        Add an entry, evicting least recently used entries to make room
+
+        :param key: cache key
+        :param value: result or serialized bytes
+        :param size: size of the entry in bytes
+        :return False if the entry is larger than the whole cache and was not stored
+        """
+        if size > self.max_bytes:
+            return False
+        with self.lock:
+            if key in self.entries:
+                self.current_bytes -= self.entries.pop(key)[1]
+            while self.entries and self.current_bytes + size > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+            self.entries[key] = (value, size)
+            self.current_bytes += size
+        return True
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict[str, Any]], serialize: Callable[[Dict[str, Any]], bytes], cacheable: Callable[[Dict[str, Any]], bool] = None) -> bytes:
+        """
+        Get the serialized result for a key, computing and caching it on a miss.
+        A local miss is looked up in the shared store first, a computed result is 
+        written to both
+
+        :param key: cache key
+        :param compute: computes the result
+        :param serialize: serializes a result to bytes
+        :param cacheable: optional check whether a computed result may be cached, 
+                          e.g. to skip error results
+        :return serialized result
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached if self.store_serialized else serialize(cached)
+        if self.shared is not None:
+            body = self.shared.get(self.SHARED_PREFIX + key)
+            if body is not None:
+                with self.lock:
+                    self.shared_hits += 1
+                if self.store_serialized:
+                    self.put(key, body, len(body))
+                return body
+
+        result = compute()
+        body = serialize(result)
+        if cacheable is None or cacheable(result):
+            self.put(key, body if self.store_serialized else result, len(body))
+            if self.shared is not None:
+                self.shared.put(self.SHARED_PREFIX + key, body)
+        return body
+
+    def clear(self):
+        """
+        Remove every entry of the local cache, counters and the shared store are kept
+        """
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get the cache counters and size, and the stats of the shared store
+        """
+        with self.lock:
+            stats = {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'store_serialized': self.store_serialized,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'shared_hits': self.shared_hits
+            }
+        stats['shared'] = None if self.shared is None else self.shared.get_stats()
+        return stats
+
+
+result_cache = ResultCache.from_env(shared_store)
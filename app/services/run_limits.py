@@ -0,0 +1,81 @@
+import os
+import time
+from typing import Any, Dict, Optional
+from app.core import Budget
+
+BUDGET_FIELDS = ('MaxEpisodeSteps', 'MaxSteps', 'TimeLimit')
+
+
+class RunLimits:
+    """
+    RunLimits class
+    Server side caps on the budget of a run. A request's MaxEpisodeSteps, MaxSteps
+    and TimeLimit are lowered to the caps, and a cap applies on its own when the
+    request leaves its field out. The time limit keeps synchronous runs below the
+    worker timeout, they return their partial result instead of being killed.
+
+    Members:
+        max_episode_steps, max_steps, time_limit: caps, None for no cap
+    """
+    def __init__(self, max_episode_steps: Optional[int] = None, max_steps: Optional[int] = None,
+                 time_limit: Optional[float] = None):
+        self.max_episode_steps = max_episode_steps
+        self.max_steps = max_steps
+        self.time_limit = time_limit
+
+    @classmethod
+    def from_env(cls) -> 'RunLimits':
+        """
+        Create the limits configured by the RUN_MAX_EPISODE_STEPS, RUN_MAX_STEPS
+        and RUN_TIME_LIMIT environment variables, an empty value is no cap
+        """
+        def get(name, convert, default):
+            value = os.environ.get(name, default)
+            return convert(value) if value else None
+
+        return cls(
+            max_episode_steps=get('RUN_MAX_EPISODE_STEPS', int, ''),
+            max_steps=get('RUN_MAX_STEPS', int, ''),
+            time_limit=get('RUN_TIME_LIMIT', float, '25')
+        )
+
+    def until(self, deadline: Optional[float]) -> 'RunLimits':
+        """
+        Get the limits of a run that has to end by a deadline, e.g. one configuration of a sweep
+        :param deadline: time.time() the run has to end by, None for no deadline
+        :return: limits whose time cap is lowered to the time left, a zero cap once the deadline passed
+        """
+        if deadline is None:
+            return self
+        remaining = max(deadline - time.time(), 0.0)
+        time_limit = remaining if self.time_limit is None else min(self.time_limit, remaining)
+        return RunLimits(self.max_episode_steps, self.max_steps, time_limit)
+
+    def get_budget_fields(self, data: Dict[str, Any], fields=BUDGET_FIELDS) -> Dict[str, Any]:
+        """
+        Get the budget fields of a request, lowered to the caps
+        :param fields: the budget fields the agent supports
+        :return: dict of every field in fields, None where neither the request nor a cap sets it
+        """
+        caps = {'MaxEpisodeSteps': self.max_episode_steps, 'MaxSteps': self.max_steps, 'TimeLimit': self.time_limit}
+        budget = {}
+        for field in fields:
+            value, cap = data.get(field), caps[field]
+            if value is not None and not isinstance(value, (int, float)):
+                raise ValueError(f"Invalid {field}: {value}, expected a number")
+            budget[field] = cap if value is None else (value if cap is None else min(value, cap))
+        return budget
+
+    def get_budget(self, data: Dict[str, Any], fields=BUDGET_FIELDS) -> Optional[Budget]:
+        """
+        Get the Budget of a request, None if nothing limits the run
+        :raises ValueError: if a budget field is invalid
+        """
+        budget = self.get_budget_fields(data, fields)
+        if all(value is None for value in budget.values()):
+            return None
+        return Budget(max_episode_steps=budget.get('MaxEpisodeSteps'), max_steps=budget.get('MaxSteps'),
+                      time_limit=budget.get('TimeLimit'))
+
+
+run_limits = RunLimits.from_env()
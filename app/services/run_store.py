@@ -0,0 +1,219 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from app.services.shared_store import SharedStore, shared_store
+
+
+class StoredRun:
+    """
+    StoredRun class
+    A solved agent kept server side so its history can be retrieved in windows.
+
+    Members:
+        run_id: id of the run
+        kind: which agent produced the run ("value-iteration" or "q-learning")
+        agent: the solved agent, it answers the windowed get_iterations queries
+        summary: response fields of the run other than the iterations
+        key: content addressed key of the request that produced the run, None 
+             if the run can not be reused for another request
+        created_at, accessed_at: time.time() timestamps
+    """
+    def __init__(self, run_id: str, kind: str, agent: Any, summary: Dict[str, Any], key: Optional[str] = None):
+        self.run_id = run_id
+        self.kind = kind
+        self.agent = agent
+        self.summary = summary
+        self.key = key
+        self.created_at = time.time()
+        self.accessed_at = self.created_at
+
+    def get_metadata(self) -> Dict[str, Any]:
+        """
+        Get the run id, kind, state list, step count and history memory report of the run
+        """
+        return {
+            'run_id': self.run_id,
+            'kind': self.kind,
+            'states': self.agent.get_state_keys(),
+            'steps': self.agent.get_step_count(),
+            'history': self.agent.get_history_memory()
+        }
+
+
+class RunStore:
+    """
+    RunStore class
+    In process store of solved runs, bounded by a number of runs (least 
+    recently used runs are evicted) and a time to live since last access.
+    Runs stored with a key can be found again by it, the latest run of a key wins.
+
+    With a SharedStore, runs put with a recipe (the request that reproduces them) are
+    recorded in it, so the other workers of the host can serve their run ids. A worker
+    that does not have a run asks the restorer registered for its kind to run the 
+    recipe again and keeps the result under the same run id.
+
+    Members:
+        max_runs: maximum number of stored runs
+        ttl: seconds a run is kept after it was last accessed
+        shared: optional SharedStore of the host
+        restorers: kind -> callable mapping a recipe to a solved agent, or None if it can not
+    """
+    # prefixes of the run and key entries in the shared store
+    RUN_PREFIX = 'run:'
+    KEY_PREFIX = 'key:'
+
+    def __init__(self, max_runs: int = 32, ttl: float = 3600, shared: Optional[SharedStore] = None):
+        self.max_runs = int(max_runs)
+        self.ttl = float(ttl)
+        self.shared = shared
+        self.restorers = {}
+        self.runs = OrderedDict()  # run_id -> StoredRun
+        self.keys = {}  # key -> run_id
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, shared: Optional[SharedStore] = None) -> 'RunStore':
+        """
+        Create a store configured by the RUN_STORE_MAX_RUNS and RUN_STORE_TTL 
+        environment variables
+        :param shared: optional SharedStore of the host
+        """
+        return cls(
+            max_runs=int(os.environ.get('RUN_STORE_MAX_RUNS', 32)),
+            ttl=float(os.environ.get('RUN_STORE_TTL', 3600)),
+            shared=shared
+        )
+
+    def register(self, kind: str, restore: Callable[[Dict[str, Any]], Any]):
+        """
+        Register the restorer of a kind, it solves the recipe of a run stored by another worker
+        """
+        self.restorers[kind] = restore
+
+    def __len__(self):
+        return len(self.runs)
+
+    def expire(self):
+        """
+        Remove runs that were not accessed within the time to live
+        """
+        now = time.time()
+        with self.lock:
+            for run_id in [run_id for run_id, run in self.runs.items() if now - run.accessed_at > self.ttl]:
+                self.forget(self.runs.pop(run_id))
+
+    def forget(self, run: StoredRun):
+        """
+        Drop the key of a removed run, unless a later run of the same key replaced it.
+        Called with the lock held
+        """
+        if run.key is not None and self.keys.get(run.key) == run.run_id:
+            del self.keys[run.key]
+
+    def add(self, run: StoredRun):
+        """
+        Add a run to the local store, evicting the least recently used runs
+        """
+        with self.lock:
+            self.runs[run.run_id] = run
+            if run.key is not None:
+                self.keys[run.key] = run.run_id
+            while len(self.runs) > self.max_runs:
+                self.forget(self.runs.popitem(last=False)[1])
+
+    def put(self, kind: str, agent: Any, summary: Dict[str, Any], key: Optional[str] = None,
+            recipe: Optional[Dict[str, Any]] = None) -> StoredRun:
+        """
+        Store a solved agent under a new run id
+
+        :param kind: which agent produced the run
+        :param agent: solved agent
+        :param summary: response fields of the run other than the iterations
+        :param key: optional content addressed key of the request, see find
+        :param recipe: optional JSON serializable request that solves the same agent again,
+                       a run with a recipe is recorded in the shared store
+        :return StoredRun
+        """
+        self.expire()
+        run = StoredRun(uuid.uuid4().hex, kind, agent, summary, key)
+        self.add(run)
+        if self.shared is not None and recipe is not None:
+            entry = {'kind': kind, 'summary': summary, 'key': key, 'recipe': recipe}
+            self.shared.put(self.RUN_PREFIX + run.run_id, json.dumps(entry).encode('utf-8'))
+            if key is not None:
+                self.shared.put(self.KEY_PREFIX + key, run.run_id.encode('utf-8'))
+        return run
+
+    def find(self, key: str) -> Optional[StoredRun]:
+        """
+        Get the latest stored run of a key and refresh its time to live, the shared 
+        store is asked if the key has no local run
+
+        :param key: content addressed key the run was stored with
+        :return StoredRun, None if no run of the key is stored
+        """
+        with self.lock:
+            run_id = self.keys.get(key)
+        if run_id is None and self.shared is not None:
+            value = self.shared.get(self.KEY_PREFIX + key)
+            run_id = None if value is None else value.decode('utf-8')
+        return None if run_id is None else self.get(run_id)
+
+    def get(self, run_id: str) -> Optional[StoredRun]:
+        """
+        Get a stored run and refresh its time to live, a run of the shared store that
+        this worker does not have is restored
+
+        :param run_id: id of the run
+        :return StoredRun, None if it does not exist or has expired
+        """
+        self.expire()
+        with self.lock:
+            run = self.runs.get(run_id)
+            if run is not None:
+                self.runs.move_to_end(run_id)
+                run.accessed_at = time.time()
+                return run
+        return self.restore(run_id)
+
+    def restore(self, run_id: str) -> Optional[StoredRun]:
+        """
+        Solve the recipe of a run recorded in the shared store and keep it under its run id.
+        The lock is not held while solving, a recipe may restore its base run first
+
+        :param run_id: id of the run
+        :return StoredRun, None if the shared store has no such run or its kind has no restorer
+        """
+        value = None if self.shared is None else self.shared.get(self.RUN_PREFIX + run_id)
+        if value is None:
+            return None
+        entry = json.loads(value.decode('utf-8'))
+        restore = self.restorers.get(entry['kind'])
+        agent = None if restore is None else restore(entry['recipe'])
+        if agent is None:
+            return None
+        run = StoredRun(run_id, entry['kind'], agent, entry['summary'], entry['key'])
+        self.add(run)
+        return run
+
+    def delete(self, run_id: str) -> bool:
+        """
+        Delete a stored run, from the shared store as well
+
+        :param run_id: id of the run
+        :return False if the run did not exist
+        """
+        shared = self.shared is not None and self.shared.delete(self.RUN_PREFIX + run_id)
+        with self.lock:
+            run = self.runs.pop(run_id, None)
+            if run is None:
+                return shared
+            self.forget(run)
+            return True
+
+
+run_store = RunStore.from_env(shared_store)
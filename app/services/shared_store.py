@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+)
+"""
+ACCESSED_INDEX = "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)"
+
+
+class SharedStore:
+    """
+    SharedStore class
+    Store of serialized entries in a local SQLite file that every worker process
+    of a host reads and writes. gunicorn forks several workers and the in process
+    caches and run stores of one worker are invisible to the others, this store is
+    what they share. Bounded by the total size of the values, the least recently
+    used entries are evicted, and by a time to live since last access. The file
+    is in WAL mode so readers do not block the writer, no external service is needed.
+
+    Members:
+        path: path of the SQLite file
+        max_bytes: total size of the stored values
+        ttl: seconds an entry is kept after it was last accessed
+        hits, misses, evictions: counters of this process
+    """
+    # the access time of an entry is only written if it is older, to keep reads from writing
+    TOUCH_INTERVAL = 1.0
+    # seconds a worker waits for the write lock of another one
+    TIMEOUT = 10.0
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, ttl: float = 86400):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.ttl = float(ttl)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.local = threading.local()
+
+    @classmethod
+    def from_env(cls) -> Optional['SharedStore']:
+        """
+        Create a store configured by the SHARED_STORE_PATH, SHARED_STORE_MAX_BYTES and
+        SHARED_STORE_TTL environment variables
+        :return SharedStore, None if SHARED_STORE_PATH is empty
+        """
+        path = os.environ.get('SHARED_STORE_PATH', '')
+        if not path:
+            return None
+        return cls(
+            path,
+            max_bytes=int(os.environ.get('SHARED_STORE_MAX_BYTES', 256 * 1024 * 1024)),
+            ttl=float(os.environ.get('SHARED_STORE_TTL', 86400))
+        )
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Connection of the current thread, a forked worker opens its own
+        """
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.TIMEOUT, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(SCHEMA)
+            connection.execute(ACCESSED_INDEX)
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Get the value of an entry and refresh its time to live
+
+        :param key: entry key
+        :return bytes, None if there is no such entry or it has expired
+        """
+        now = time.time()
+        connection = self.connect()
+        row = connection.execute('SELECT value, accessed FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            self.misses += 1
+            return None
+        if now - row[1] > self.TOUCH_INTERVAL:
+            connection.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+        self.hits += 1
+        return bytes(row[0])
+
+    def put(self, key: str, value: bytes) -> bool:
+        """
+        Add or replace an entry, removing expired entries and evicting the least
+        recently used ones to make room
+
+        :param key: entry key
+        :param value: serialized value
+        :return False if the value is larger than the whole store and was not stored
+        """
+        size = len(value)
+        if size > self.max_bytes:
+            return False
+        now = time.time()
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('DELETE FROM entries WHERE accessed < ?', (now - self.ttl,))
+            connection.execute('INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)',
+                               (key, sqlite3.Binary(value), size, now))
+            excess = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0] - self.max_bytes
+            evicted = []
+            if excess > 0:
+                for evicted_key, evicted_size in connection.execute(
+                        'SELECT key, size FROM entries WHERE key != ? ORDER BY accessed', (key,)).fetchall():
+                    evicted.append((evicted_key,))
+                    excess -= evicted_size
+                    if excess <= 0:
+                        break
+                connection.executemany('DELETE FROM entries WHERE key = ?', evicted)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        self.evictions += len(evicted)
+        return True
+
+    def delete(self, key: str) -> bool:
+        """
+        Delete an entry
+
+        :param key: entry key
+        :return False if there was no such entry
+        """
+        return self.connect().execute('DELETE FROM entries WHERE key = ?', (key,)).rowcount > 0
+
+    def clear(self):
+        """
+        Remove every entry, counters are kept
+        """
+        self.connect().execute('DELETE FROM entries')
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get the size of the store, shared by every worker, and the counters of this process
+        """
+        entries, stored_bytes = self.connect().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {
+            'path': self.path,
+            'entries': entries,
+            'bytes': stored_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+shared_store = SharedStore.from_env()
@@ -0,0 +1,48 @@
+import json
+from typing import Any, Dict, Iterable, Iterator
+from flask import Response
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+SSE_MIMETYPE = 'text/event-stream'
+
+
+def format_ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Format records as newline delimited JSON, one record per line
+
+    :param records: iterable of JSON serializable dicts
+    """
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def format_sse(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Format records as Server-Sent Events. Records with an error key are sent as
+    an error event, records with a done key as a done event and all other 
+    records as step events.
+
+    :param records: iterable of JSON serializable dicts
+    """
+    for record in records:
+        event = 'error' if 'error' in record else 'done' if record.get('done') else 'step'
+        yield f"event: {event}\ndata: {json.dumps(record, separators=(',', ':'))}\n\n"
+
+
+def stream_records(records: Iterable[Dict[str, Any]], accept: str = '') -> Response:
+    """
+    Stream records as Server-Sent Events if the client accepts them, 
+    otherwise as newline delimited JSON
+
+    :param records: iterable of JSON serializable dicts, consumed lazily
+    :param accept: value of the request's Accept header
+    :return streaming Response
+    """
+    if SSE_MIMETYPE in (accept or ''):
+        response = Response(format_sse(records), mimetype=SSE_MIMETYPE)
+    else:
+        response = Response(format_ndjson(records), mimetype=NDJSON_MIMETYPE)
+    # keep proxies from buffering the stream
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
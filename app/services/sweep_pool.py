@@ -0,0 +1,67 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Sequence
+
+
+class SweepPool:
+    """
+    SweepPool class
+    Process pool that fans the tasks of one request out across the CPU cores.
+    The pool is started on first use and reused by later requests, so only the
+    first sweep pays for starting the worker processes.
+
+    Members:
+        max_workers: number of worker processes, tasks run inline when it is 1
+        start_method: multiprocessing start method of the worker processes
+    """
+    def __init__(self, max_workers: int = 2, start_method: str = 'spawn'):
+        self.max_workers = max(int(max_workers), 1)
+        self.start_method = start_method
+        self.executor = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'SweepPool':
+        """
+        Create a pool configured by the SWEEP_WORKERS and SWEEP_START_METHOD environment variables
+        """
+        return cls(
+            max_workers=int(os.environ.get('SWEEP_WORKERS', os.cpu_count() or 1)),
+            start_method=os.environ.get('SWEEP_START_METHOD', 'spawn')
+        )
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context(self.start_method))
+            return self.executor
+
+    def map(self, function: Callable, tasks: Sequence[Any]) -> List[Any]:
+        """
+        Run function on every task, in the worker processes when there is more than one task
+
+        :param function: module level function, it has to be importable by the workers
+        :param tasks: picklable arguments, one call per task
+        :return list of the results in task order
+        """
+        if self.max_workers == 1 or len(tasks) < 2:
+            return [function(task) for task in tasks]
+        executor = self.get_executor()
+        try:
+            return list(executor.map(function, tasks))
+        except BrokenProcessPool:
+            # a worker died, start a fresh pool for the next request
+            self.shutdown()
+            raise
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+                self.executor = None
+
+
+sweep_pool = SweepPool.from_env()
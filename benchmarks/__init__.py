@@ -0,0 +1,8 @@
+"""
+Micro-benchmarks of the grid and agent hot paths, run with
+
+    python -m benchmarks [--save] [--filter TEXT] [--threshold 0.25]
+
+from the repository root. Without --save the results are compared to
+benchmarks/baseline.json and the run fails if a case got slower than the threshold.
+"""
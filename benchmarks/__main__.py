@@ -0,0 +1,83 @@
+import argparse
+import os
+import sys
+from benchmarks.cases import get_cases
+from benchmarks.runner import REPEAT, MIN_TIME, THRESHOLD, CONFIRMATIONS, time_case, load_baseline, save_baseline, compare, format_seconds, get_machine
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Grid and agent micro-benchmarks')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline file, default benchmarks/baseline.json')
+    parser.add_argument('--save', action='store_true', help='save the results as the baseline instead of comparing')
+    parser.add_argument('--filter', action='append', default=[], help='only run cases whose name contains this text, repeatable')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='relative slowdown that fails the run, default 0.25')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='measurements per case, default 5')
+    parser.add_argument('--min-time', type=float, default=MIN_TIME, help='minimum seconds per measurement, default 0.05')
+    parser.add_argument('--confirmations', type=int, default=CONFIRMATIONS,
+                        help='times a regression is timed again before it counts, default 2')
+    parser.add_argument('--list', action='store_true', help='list the case names and exit')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cases = [case for case in get_cases() if not args.filter or any(text in case.name for text in args.filter)]
+    if args.list:
+        print('\n'.join(case.name for case in cases))
+        return 0
+    if not cases:
+        print('No case matches the filter')
+        return 2
+
+    baseline = load_baseline(args.baseline)
+    if not args.save and baseline is None:
+        print(f"No baseline at {args.baseline}, run with --save first")
+        return 2
+    if not args.save and baseline['machine'] != get_machine():
+        print(f"Warning: the baseline was recorded on another machine or interpreter ({baseline['machine']}), "
+              "timings may not be comparable")
+
+    results = {}
+    regressions = []
+    width = max(len(case.name) for case in cases)
+    for case in cases:
+        result = time_case(case, args.repeat, args.min_time)
+        results[case.name] = result
+        if args.save:
+            print(f"{case.name:<{width}}  {format_seconds(result['seconds']):>11}")
+            continue
+        row = compare({case.name: result}, baseline, args.threshold)[0]
+        for _ in range(args.confirmations):
+            if row['status'] != 'regression':
+                break
+            # a slowdown has to reproduce, the best of the timings counts
+            retry = time_case(case, args.repeat, args.min_time)
+            retry_row = compare({case.name: retry}, baseline, args.threshold)[0]
+            if retry_row['status'] != 'regression' or retry_row['ratio'] < row['ratio']:
+                results[case.name] = retry
+                row = retry_row
+        if row['status'] == 'regression':
+            regressions.append(row)
+        ratios = '-' if row['ratio'] is None else f"{row['raw_ratio']:.2f}x {row['ratio']:.2f}x"
+        print(f"{case.name:<{width}}  {format_seconds(row['seconds']):>11}  {format_seconds(row['baseline']):>11}  {ratios:>12}  {row['status']}")
+        sys.stdout.flush()
+
+    if args.save:
+        save_baseline(args.baseline, results, baseline)
+        print(f"Saved {len(results)} cases to {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}:")
+        for row in regressions:
+            print(f"  {row['name']}: {format_seconds(row['baseline'])} -> {format_seconds(row['seconds'])} "
+                  f"({row['raw_ratio']:.2f}x, {row['ratio']:.2f}x calibrated)")
+        return 1
+    print(f"No regressions above {args.threshold:.0%} in {len(results)} cases")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
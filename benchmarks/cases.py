@@ -0,0 +1,142 @@
+import json
+import random
+from typing import Any, Callable, Dict, List
+from app.core import Grid, ValueIterationAgent, QLearningAgent, Budget
+
+SIZES = ((4, 3), (10, 10), (25, 25), (50, 50), (100, 100))
+BOULDER_DENSITIES = (0.0, 0.1, 0.3)
+VALUE_ITERATION_K = (100, 1000)
+Q_LEARNING_EPISODES = (20, 200)
+# bounds the random walks of the first episodes on the large grids, the runs are seeded so
+# the same steps are taken on every call
+Q_LEARNING_MAX_STEPS = 100000
+OUTPUT_K = 20
+OUTPUT_EPISODES = 20
+
+
+class Case:
+    """
+    Case class
+    A benchmark case. setup runs once, outside of the timing, and returns the
+    function that is timed. The function must do the same work on every call.
+
+    Members:
+        name: unique name, "<group>/<size>/<parameters>"
+        setup: callable returning the function to time
+    """
+    def __init__(self, name: str, setup: Callable[[], Callable[[], Any]]):
+        self.name = name
+        self.setup = setup
+
+
+def make_grid_conf(x: int, y: int, density: float = 0.0, k: int = 0, episodes: int = 0, seed: int = 0) -> Dict[str, Any]:
+    """
+    Grid configuration with a +1 terminal in the far corner, a -1 terminal next to it and
+    a seeded random placement of boulders covering density of the remaining cells.
+    The 4x3 grid is the classic example grid
+    """
+    terminal = [[x - 1, y - 1, 1.0], [x - 1, y - 2, -1.0]]
+    start = [0, 0]
+    reserved = {(state[0], state[1]) for state in terminal} | {tuple(start)}
+    cells = [(i, j) for i in range(x) for j in range(y) if (i, j) not in reserved]
+    boulders = random.Random(seed).sample(cells, int(len(cells) * density))
+    return {
+        'x': x,
+        'y': y,
+        'terminal': terminal,
+        'boulder': [list(cell) for cell in boulders],
+        'robotStartState': start,
+        'k': k,
+        'discount': 0.9,
+        'noise': 0.2,
+        'transitionCost': -0.04,
+        'alpha': 0.5,
+        'episodes': episodes
+    }
+
+
+def get_size_name(x: int, y: int) -> str:
+    return f"{x}x{y}"
+
+
+def grid_construction(conf):
+    return lambda: Grid(conf)
+
+
+def grid_compile(conf):
+    grid = Grid(conf)
+
+    def compile_model():
+        grid.transition_model = None
+        grid.get_transition_model()
+    return compile_model
+
+
+def grid_transitions(conf):
+    grid = Grid(conf)
+    grid.get_transition_model()
+    pairs = [(state, action) for state in grid.state_list for action in grid.get_actions_from_state(state)]
+
+    def transitions():
+        for state, action in pairs:
+            grid.get_transistions_and_rewards(state, action)
+    return transitions
+
+
+def value_iteration_solve(conf):
+    grid = Grid(conf)
+    grid.get_transition_model()
+    return lambda: ValueIterationAgent(grid).run_agent()
+
+
+def q_learning_run(conf):
+    grid = Grid(conf)
+
+    def run():
+        agent = QLearningAgent(grid, seed=0)
+        agent.budget = Budget(max_steps=Q_LEARNING_MAX_STEPS)
+        agent.run_agent()
+    return run
+
+
+def value_iteration_output(conf):
+    agent = ValueIterationAgent(Grid(conf))
+    agent.run_agent()
+    return lambda: json.dumps(agent.get_iterations())
+
+
+def q_learning_output(conf):
+    agent = QLearningAgent(Grid(conf), seed=0)
+    agent.budget = Budget(max_steps=Q_LEARNING_MAX_STEPS)
+    agent.run_agent()
+    return lambda: json.dumps(agent.get_iterations())
+
+
+def bind(setup, conf):
+    return lambda: setup(conf)
+
+
+def get_cases() -> List[Case]:
+    """
+    Get every benchmark case, grouped by the hot path they time
+    """
+    cases = []
+    for x, y in SIZES:
+        size = get_size_name(x, y)
+        for density in BOULDER_DENSITIES:
+            conf = make_grid_conf(x, y, density)
+            cases.append(Case(f"grid.construct/{size}/boulders={density}", bind(grid_construction, conf)))
+            cases.append(Case(f"grid.compile/{size}/boulders={density}", bind(grid_compile, conf)))
+            cases.append(Case(f"grid.transitions/{size}/boulders={density}", bind(grid_transitions, conf)))
+    for x, y in SIZES:
+        size = get_size_name(x, y)
+        for k in VALUE_ITERATION_K:
+            cases.append(Case(f"value_iteration.solve/{size}/k={k}", bind(value_iteration_solve, make_grid_conf(x, y, 0.1, k=k))))
+        for episodes in Q_LEARNING_EPISODES:
+            cases.append(Case(f"q_learning.run/{size}/episodes={episodes}",
+                              bind(q_learning_run, make_grid_conf(x, y, 0.1, episodes=episodes))))
+        cases.append(Case(f"value_iteration.output/{size}/k={OUTPUT_K}",
+                          bind(value_iteration_output, make_grid_conf(x, y, 0.1, k=OUTPUT_K))))
+        cases.append(Case(f"q_learning.output/{size}/episodes={OUTPUT_EPISODES}",
+                          bind(q_learning_output, make_grid_conf(x, y, 0.1, episodes=OUTPUT_EPISODES))))
+    return cases
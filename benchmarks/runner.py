@@ -0,0 +1,156 @@
+import gc
+import json
+import platform
+import statistics
+import time
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from benchmarks.cases import Case
+
+MIN_TIME = 0.05
+REPEAT = 5
+THRESHOLD = 0.25
+CONFIRMATIONS = 2
+
+
+def calibration_workload():
+    """
+    Fixed mix of interpreter and numpy work, the same kind of work as the cases
+    """
+    cells = {(x, y): x * y for x in range(60) for y in range(60)}
+    total = 0.0
+    for (x, y), value in cells.items():
+        total += value if (x + y) % 2 else -value
+    values = np.arange(3600, dtype=float).reshape(60, 60)
+    for _ in range(20):
+        values = 0.9 * np.maximum(values, values[::-1])
+    return total, float(values.sum())
+
+
+def time_case(case: Case, repeat: int = REPEAT, min_time: float = MIN_TIME) -> Dict[str, Any]:
+    """
+    Time a case. After one warm up call the number of calls per measurement is doubled
+    until a measurement takes min_time, then repeat measurements are taken. Every
+    measurement is paired with one of the calibration workload, to tell a change of the
+    code from a machine that is slower or faster than when the baseline was recorded
+    :return: dict with the best and the median seconds per call, the best seconds per
+             calibration call, the calls per measurement and the repeats
+    """
+    function = case.setup()
+    function()
+    number = get_number(function, min_time)
+    calibration_number = get_number(calibration_workload, min_time)
+    times = []
+    calibrations = []
+    for _ in range(repeat):
+        calibrations.append(measure(calibration_workload, calibration_number) / calibration_number)
+        times.append(measure(function, number) / number)
+    return {
+        'seconds': min(times),
+        'median': statistics.median(times),
+        'calibration': min(calibrations),
+        'number': number,
+        'repeat': repeat
+    }
+
+
+def get_number(function: Callable[[], Any], min_time: float) -> int:
+    """
+    Number of calls that take at least min_time
+    """
+    number = 1
+    while measure(function, number) < min_time:
+        number *= 2
+    return number
+
+
+def measure(function: Callable[[], Any], number: int) -> float:
+    """
+    Seconds of number calls, with the garbage collector disabled like timeit does
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        return time.perf_counter() - start
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def get_machine() -> Dict[str, str]:
+    """
+    Description of the machine and interpreter, timings only compare on the same machine
+    """
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor()
+    }
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a baseline file, None if it does not exist
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path: str, results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Any]] = None):
+    """
+    Save results as the baseline. Cases of an existing baseline that were not run,
+    e.g. because of a filter, are kept
+    """
+    merged = dict(baseline['results']) if baseline else {}
+    merged.update(results)
+    with open(path, 'w') as f:
+        json.dump({'machine': get_machine(), 'results': dict(sorted(merged.items()))}, f, indent=2)
+        f.write('\n')
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], threshold: float = THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    Compare results to a baseline by their best time per call. A case only counts as a
+    regression (or improvement) if both its raw ratio and its ratio relative to the
+    calibration are beyond the threshold: a machine that is uniformly slower only moves
+    the raw ratio, noise in the calibration only moves the calibrated one
+    :param threshold: relative slowdown above which a case is a regression
+    :return: per case dict with the name, both times, the raw and the calibrated ratio and a status
+             of "regression", "improvement", "ok" or "new" for cases missing from the baseline
+    """
+    comparison = []
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            comparison.append({'name': name, 'seconds': result['seconds'], 'baseline': None, 'raw_ratio': None,
+                               'ratio': None, 'status': 'new'})
+            continue
+        raw_ratio = result['seconds'] / base['seconds']
+        ratio = raw_ratio / (result['calibration'] / base['calibration'])
+        if min(raw_ratio, ratio) > 1 + threshold:
+            status = 'regression'
+        elif max(raw_ratio, ratio) < 1 / (1 + threshold):
+            status = 'improvement'
+        else:
+            status = 'ok'
+        comparison.append({'name': name, 'seconds': result['seconds'], 'baseline': base['seconds'], 'raw_ratio': raw_ratio,
+                           'ratio': ratio, 'status': status})
+    return comparison
+
+
+def format_seconds(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '-'
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
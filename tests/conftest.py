@@ -0,0 +1,22 @@
+import pytest
+from app import create_app
+from app.services import result_cache
+
+# the 4x3 example grid of the README
+GRID = {
+    'x': 4, 'y': 3, 'Terminal': [[3, 2, 1.0], [3, 1, -1.0]], 'Boulder': [[1, 1]], 'RobotStartState': [0, 0],
+    'K': 20, 'Discount': 0.9, 'Noise': 0.2, 'TransitionCost': 0.0
+}
+# a larger grid with a wall of boulders
+BOULDER_GRID = {
+    'x': 8, 'y': 6, 'Terminal': [[7, 5, 1.0], [7, 4, -1.0]], 'Boulder': [[3, 1], [3, 2], [3, 3], [3, 4], [5, 2]],
+    'RobotStartState': [0, 0], 'K': 100, 'Discount': 0.9, 'Noise': 0.2, 'TransitionCost': -0.01
+}
+
+
+@pytest.fixture
+def client():
+    result_cache.clear()
+    with create_app().test_client() as client:
+        yield client
+    result_cache.clear()
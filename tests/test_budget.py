@@ -0,0 +1,67 @@
+import time
+import pytest
+from app.core import Budget, ValueIterationAgent, QLearningAgent
+from app.controllers.sweep_controller import SweepController, run_sweep_task
+from app.services import RunLimits
+from app.services.sweep_pool import SweepPool
+from tests.conftest import GRID
+from tests.test_policy_iteration import make_grid
+
+
+class CheckedBudget(Budget):
+    """
+    Budget whose time runs out at its checks-th check, instead of on the clock
+    """
+    def __init__(self, checks):
+        super().__init__(time_limit=60)
+        self.checks = checks
+
+    def exhausted(self):
+        self.checks -= 1
+        if self.checks <= 0 and self.reason is None:
+            self.reason = self.TIME_LIMIT
+        return super().exhausted()
+
+
+@pytest.mark.parametrize('engine, schedule', [
+    ('python', 'synchronous'),
+    ('numpy', 'gauss-seidel'),
+    ('numpy', 'prioritized'),
+])
+def test_per_state_sweeps_check_the_budget_during_a_sweep(engine, schedule):
+    # the first check follows step 0, the second one is inside the first sweep
+    agent = ValueIterationAgent(make_grid(20, 20, k=10), engine=engine, schedule=schedule)
+    assert len(agent.grid.state_list) > ValueIterationAgent.BUDGET_CHECK_INTERVAL
+    agent.budget = CheckedBudget(checks=2)
+    agent.run_agent()
+    assert agent.truncated()
+    assert agent.get_step_count() == 1
+    assert all(value.value == 0.0 for value in agent.state_values.values())
+
+
+def test_dyna_planning_checks_the_budget():
+    grid = make_grid(4, 3).with_parameters(k=5, episodes=5, alpha=0.5, discount=0.9)
+    agent = QLearningAgent(grid, seed=1, planning_steps=1000)
+    # the first check starts the first episode, the second one charges its first step,
+    # the third one is in the planning of that step
+    agent.budget = CheckedBudget(checks=3)
+    agent.run_agent()
+    assert agent.truncated()
+    assert agent.planning_updates == QLearningAgent.BUDGET_CHECK_INTERVAL - 1
+
+
+def test_sweep_configurations_are_capped():
+    controller = SweepController(SweepPool(max_workers=1), limits=RunLimits(max_steps=5))
+    response = controller.run_sweep('q-learning', dict(GRID, Alpha=0.5, Episodes=20, Parameters={'Seed': [1, 2]}))
+    assert [result['truncated'] for result in response['results']] == [True, True]
+
+
+def test_sweep_skips_configurations_after_its_deadline():
+    controller = SweepController(SweepPool(max_workers=1), limits=RunLimits(time_limit=60))
+    tasks = controller.create_tasks('value-iteration', dict(GRID, Parameters={'Discount': [0.8, 0.9]}),
+                                    deadline=time.time() - 1)
+    results = [result for position, result in run_sweep_task(tasks[0])]
+    assert results == [
+        {'truncated': True, 'skipped': True, 'parameters': {'Discount': 0.8}},
+        {'truncated': True, 'skipped': True, 'parameters': {'Discount': 0.9}},
+    ]
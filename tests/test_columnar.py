@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from app.services.columnar import decode_columnar, COLUMNAR_MIMETYPE
+from tests.conftest import GRID, BOULDER_GRID
+
+
+def post_both(client, route, data):
+    """
+    Run a request once as JSON and once in the columnar format
+    :return tuple of the JSON iterations and the decoded columnar result
+    """
+    iterations = client.post(route, json=data).get_json()['iterations']
+    response = client.post(route, json=data, headers={'Accept': COLUMNAR_MIMETYPE})
+    assert response.mimetype == COLUMNAR_MIMETYPE
+    return iterations, decode_columnar(response.data)
+
+
+@pytest.mark.parametrize('data', [GRID, BOULDER_GRID], ids=['grid', 'boulder_grid'])
+def test_value_iteration_columnar_matches_json(client, data):
+    iterations, result = post_both(client, '/api/value-iteration/run-agent', data)
+    columns, states, actions = result['columns'], result['states'], result['actions']
+    assert columns['steps'].tolist() == sorted(int(step) for step in iterations)
+    for row, step in enumerate(columns['steps'].tolist()):
+        expected = iterations[str(step)]
+        assert sorted(states) == sorted(expected)
+        assert np.allclose(columns['values'][row], [expected[state]['value'] for state in states], rtol=1e-6, atol=1e-6)
+        assert [actions[action] for action in columns['actions'][row]] == [expected[state]['best_action'] for state in states]
+
+
+@pytest.mark.parametrize('data', [GRID, BOULDER_GRID], ids=['grid', 'boulder_grid'])
+def test_q_learning_columnar_matches_json(client, data):
+    iterations, result = post_both(client, '/api/q-learning/run-agent', dict(data, Alpha=0.5, Episodes=20, Seed=2))
+    columns, states, actions = result['columns'], result['states'], result['actions']
+    terminals = {f'{x},{y}' for x, y, _ in data['Terminal']}
+    assert columns['steps'].tolist() == sorted(int(episode) for episode in iterations)
+    offsets = columns['sequence_offsets'].tolist()
+    assert columns['sequence_steps'].tolist() == columns['steps'].tolist()
+    for row, episode in enumerate(columns['steps'].tolist()):
+        expected = iterations[str(episode)]
+        for i, state in enumerate(states):
+            q_values = expected['q_values'][state]
+            # a terminal state lists Terminate from its first update on
+            assert ('Terminate' in q_values) == (state in terminals and episode >= columns['first_update'][i])
+            assert np.allclose([columns['q_values'][row, i, actions.index(action)] for action in q_values],
+                               list(q_values.values()), rtol=1e-6, atol=1e-6)
+        sequence = columns['sequences'][offsets[row]:offsets[row + 1]]
+        assert [states[state] for state in sequence] == expected['sequences']
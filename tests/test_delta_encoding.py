@@ -0,0 +1,53 @@
+import pytest
+from app.controllers import ValueIterationController, QLearningController
+from tests.conftest import GRID, BOULDER_GRID
+
+DELTA = {'Encoding': 'delta', 'KeyframeInterval': 5, 'DeltaTolerance': 0.01}
+
+
+def decode(iterations, keyframe_interval, cells=lambda entry: entry):
+    """
+    Rebuild every step of a delta encoded history the way a client does, by applying
+    the steps since the last keyframe on top of each other
+    """
+    decoded = {}
+    current = {}
+    for step in sorted(iterations, key=int):
+        if int(step) % keyframe_interval == 0:
+            current = {}
+        current.update(cells(iterations[step]))
+        decoded[step] = dict(current)
+    return decoded
+
+
+@pytest.mark.parametrize('data', [GRID, BOULDER_GRID], ids=['grid', 'boulder_grid'])
+def test_value_iteration_delta_round_trip(data):
+    full = ValueIterationController().run_agent(dict(data))['iterations']
+    encoded = ValueIterationController().run_agent(dict(data, **DELTA))
+    assert encoded['encoding'] == {'type': 'delta', 'keyframe_interval': 5, 'tolerance': 0.01}
+
+    assert any(len(states) < len(full[0]) for states in encoded['iterations'].values())
+    decoded = decode(encoded['iterations'], DELTA['KeyframeInterval'])
+    assert list(decoded) == list(full)
+    for step, states in full.items():
+        assert decoded[step].keys() == states.keys()
+        for state, expected in states.items():
+            assert decoded[step][state]['best_action'] == expected['best_action']
+            assert abs(decoded[step][state]['value'] - expected['value']) <= DELTA['DeltaTolerance']
+
+
+@pytest.mark.parametrize('data', [GRID, BOULDER_GRID], ids=['grid', 'boulder_grid'])
+def test_q_learning_delta_round_trip(data):
+    data = dict(data, Alpha=0.5, Episodes=30, Seed=3)
+    full = QLearningController().run_agent(dict(data))['iterations']
+    encoded = QLearningController().run_agent(dict(data, **DELTA))['iterations']
+
+    decoded = decode(encoded, DELTA['KeyframeInterval'], cells=lambda entry: entry['q_values'])
+    assert list(decoded) == list(full)
+    for episode, expected in full.items():
+        assert encoded[episode]['sequences'] == expected['sequences']
+        assert decoded[episode].keys() == expected['q_values'].keys()
+        for state, q_values in expected['q_values'].items():
+            assert decoded[episode][state].keys() == q_values.keys()
+            for action, q_value in q_values.items():
+                assert abs(decoded[episode][state][action] - q_value) <= DELTA['DeltaTolerance']
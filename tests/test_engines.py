@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from app.controllers import ValueIterationController
+from tests.conftest import GRID, BOULDER_GRID
+
+
+def run_engine(data, engine):
+    # without a result cache, its key leaves the engine out
+    response = ValueIterationController().run_agent(dict(data, Engine=engine))
+    iterations = response['iterations']
+    steps = sorted(iterations, key=int)
+    states = sorted(iterations[steps[0]])
+    values = np.array([[iterations[step][state]['value'] for state in states] for step in steps])
+    policies = [[iterations[step][state]['best_action'] for state in states] for step in steps]
+    return response, values, policies
+
+
+@pytest.mark.parametrize('data', [GRID, BOULDER_GRID], ids=['grid', 'boulder_grid'])
+@pytest.mark.parametrize('options', [{}, {'Tolerance': 1e-4}], ids=['k_sweeps', 'tolerance'])
+def test_numpy_engine_matches_python_engine(data, options):
+    data = dict(data, **options)
+    numpy_response, numpy_values, numpy_policies = run_engine(data, 'numpy')
+    python_response, python_values, python_policies = run_engine(data, 'python')
+
+    assert numpy_values.shape == python_values.shape
+    assert np.allclose(numpy_values, python_values)
+    assert numpy_policies == python_policies
+    if options:
+        numpy_convergence, python_convergence = numpy_response['convergence'], python_response['convergence']
+        assert numpy_convergence['converged'] and python_convergence['converged']
+        assert numpy_convergence['step'] == python_convergence['step'] == numpy_values.shape[0] - 1
+        assert np.allclose(numpy_convergence['residuals'], python_convergence['residuals'])
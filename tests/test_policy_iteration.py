@@ -0,0 +1,38 @@
+import pytest
+from app.core import Grid, PolicyIterationAgent
+
+
+def make_grid(x, y, k=5):
+    return Grid({
+        'x': x, 'y': y, 'terminal': [[x - 1, y - 1, 1.0], [x - 1, y - 2, -1.0]], 'boulder': [],
+        'robotStartState': [0, 0], 'k': k, 'discount': 0.99, 'noise': 0.2, 'transitionCost': 0.0,
+        'episodes': 0, 'alpha': 0.0
+    })
+
+
+def test_auto_evaluation_is_exact_on_small_grids():
+    agent = PolicyIterationAgent(make_grid(4, 3, k=50))
+    agent.run_agent()
+    assert agent.evaluation == 'exact'
+    assert agent.get_convergence()['converged']
+
+
+def test_auto_evaluation_is_modified_above_the_exact_limit():
+    agent = PolicyIterationAgent(make_grid(40, 30))
+    assert len(agent.grid.state_list) > PolicyIterationAgent.EXACT_MAX_STATES
+    assert agent.evaluation == 'modified'
+    agent.run_agent()
+    assert agent.get_convergence()['evaluation'] == 'modified'
+
+
+def test_exact_evaluation_is_rejected_above_the_limit():
+    with pytest.raises(ValueError, match='Exact evaluation is limited'):
+        PolicyIterationAgent(make_grid(40, 30), evaluation='exact')
+
+
+def test_backups_are_counted_per_run():
+    agent = PolicyIterationAgent(make_grid(4, 3, k=50))
+    agent.run_agent()
+    backups = agent.get_convergence()['backups']
+    agent.run_agent()
+    assert agent.get_convergence()['backups'] == backups
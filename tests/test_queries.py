@@ -0,0 +1,40 @@
+from tests.conftest import GRID
+
+QL_GRID = dict(GRID, Alpha=0.5, Episodes=3, Seed=1)
+DIRECTIONS = {'N': 'Go North', 'E': 'Go East', 'S': 'Go South', 'W': 'Go West', 'Terminate': 'Terminate State Collect Reward'}
+
+
+def post_queries(client, route, data, queries):
+    response = client.post(route, json=dict(data, Queries=queries))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_tied_q_learning_queries_are_deterministic(client):
+    # after one episode most q values of (0,2) are still tied at 0
+    queries = [{'x': 0, 'y': 2, 'Step': 1, 'Type': 'bestPolicy'}] * 6 + [{'x': 0, 'y': 2, 'Step': 1, 'Type': 'bestQValue'}] * 2
+    first = post_queries(client, '/api/q-learning/query', QL_GRID, queries)
+    second = post_queries(client, '/api/q-learning/query', QL_GRID, queries)
+    assert second['reused']
+    assert first['answers'] == second['answers']
+
+    policies = [answer for answer in first['answers'] if answer['type'] == 'bestPolicy']
+    assert len({(answer['value'], answer['answer']) for answer in policies}) == 1
+    for answer in policies:
+        assert answer['answer'] == DIRECTIONS[answer['value']]
+    for answer in first['answers']:
+        if answer['type'] == 'bestQValue':
+            assert answer['answer'] == f"{answer['value']:.2f}"
+
+
+def test_value_iteration_queries_match_their_values(client):
+    queries = [{'x': x, 'y': y, 'Step': step, 'Type': query_type}
+               for x, y in ((0, 0), (2, 2)) for step in (0, 5, 100) for query_type in ('stateValue', 'bestPolicy')]
+    result = post_queries(client, '/api/value-iteration/query', GRID, queries + queries)
+    answers = result['answers']
+    assert answers[:len(queries)] == answers[len(queries):]
+    for answer in answers:
+        if answer['type'] == 'bestPolicy':
+            assert answer['answer'] == DIRECTIONS[answer['value']]
+        else:
+            assert answer['answer'] == f"{answer['value']:.2f}"
@@ -0,0 +1,43 @@
+import json
+import os
+import random
+import numpy as np
+import pytest
+from app.controllers import ValueIterationController, QLearningController
+from tests.conftest import GRID, BOULDER_GRID
+
+# final steps of runs recorded before the grid states were indexed and the transition
+# model was compiled, Q-learning with random.seed(7) and no Seed
+with open(os.path.join(os.path.dirname(__file__), 'data', 'reference_runs.json')) as f:
+    REFERENCE_RUNS = json.load(f)
+GRIDS = {'grid': GRID, 'boulder_grid': BOULDER_GRID}
+
+
+@pytest.mark.parametrize('engine', ['numpy', 'python'])
+@pytest.mark.parametrize('name', list(GRIDS))
+def test_value_iteration_matches_reference(name, engine):
+    reference = REFERENCE_RUNS[name]['value_iteration']
+    iterations = ValueIterationController().run_agent(dict(GRIDS[name], Engine=engine))['iterations']
+    assert len(iterations) == reference['steps']
+
+    final = iterations[max(iterations)]
+    states = sorted(reference['final'])
+    assert sorted(final) == states
+    assert np.allclose([final[state]['value'] for state in states],
+                       [reference['final'][state]['value'] for state in states])
+    assert [final[state]['best_action'] for state in states] == \
+           [reference['final'][state]['best_action'] for state in states]
+
+
+@pytest.mark.parametrize('name', list(GRIDS))
+def test_q_learning_matches_reference(name):
+    reference = REFERENCE_RUNS[name]['q_learning']
+    random.seed(7)
+    iterations = QLearningController().run_agent(dict(GRIDS[name], Alpha=0.5, Episodes=50))['iterations']
+    assert len(iterations) == reference['episodes']
+
+    final = iterations[max(iterations)]['q_values']
+    assert final.keys() == reference['final'].keys()
+    for state, q_values in reference['final'].items():
+        assert final[state].keys() == q_values.keys()
+        assert np.allclose([final[state][action] for action in q_values], list(q_values.values()))
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from app.controllers import ValueIterationController, PolicyIterationController
+from app.core import GridEdit
+from app.services import RunStore
+from tests.conftest import BOULDER_GRID
+
+BASE = dict(BOULDER_GRID, K=500, Tolerance=1e-10)
+EDITS = [
+    ({'AddBoulder': [[5, 4]]}, {'Boulder': BOULDER_GRID['Boulder'] + [[5, 4]]}),
+    ({'RemoveBoulder': [[3, 2]]}, {'Boulder': [cell for cell in BOULDER_GRID['Boulder'] if cell != [3, 2]]}),
+    ({'SetTerminal': [[6, 0, 0.5]]}, {'Terminal': BOULDER_GRID['Terminal'] + [[6, 0, 0.5]]}),
+    ({'Noise': 0.1}, {'Noise': 0.1}),
+    ({}, {}),
+]
+
+
+def get_solution(agent):
+    """
+    Values and actions by state key, an edited grid keeps the state order of its base
+    """
+    values, actions = agent.get_final_arrays()
+    return dict(zip(agent.get_state_keys(), zip(np.asarray(values).tolist(), np.asarray(actions).tolist())))
+
+
+def cold_solve(controller, data):
+    return get_solution(controller.solve(data, controller.build_grid_conf(data)))
+
+
+def assert_same_solution(agent, expected):
+    """
+    Same values, and every action of the agent is optimal under the expected values,
+    the policies may only differ where actions tie
+    """
+    solution = get_solution(agent)
+    assert solution.keys() == expected.keys()
+    values = np.array([expected[key][0] for key in agent.get_state_keys()])
+    next_states, probabilities, rewards, terminal = agent.compile_grid()
+    q_values = (probabilities * (rewards + agent.grid.discount * values[next_states])).sum(axis=2)
+    for index, key in enumerate(agent.get_state_keys()):
+        value, action = solution[key]
+        assert value == pytest.approx(expected[key][0], abs=1e-8), key
+        if terminal[index]:
+            assert action == expected[key][1], key
+        else:
+            best = max(q_values[index, a] for a in agent.grid.get_action_indices(index))
+            assert q_values[index, action] == pytest.approx(best, abs=1e-8), key
+
+
+@pytest.mark.parametrize('edit, fields', EDITS)
+def test_resolve_from_a_converged_base_matches_a_cold_solve(edit, fields):
+    controller = ValueIterationController(run_store=RunStore())
+    base = controller.run_agent(dict(BASE, Store=True))
+    agent = controller.solve_edit(dict(BASE, RunId=base['run_id'], Edit=edit))[2]
+    assert agent.get_convergence()['converged']
+    assert_same_solution(agent, cold_solve(controller, dict(BASE, **fields)))
+
+
+@pytest.mark.parametrize('edit, fields', EDITS)
+def test_resolve_from_an_unconverged_base_matches_a_cold_solve(edit, fields):
+    controller = ValueIterationController(run_store=RunStore())
+    base = controller.run_agent(dict(BASE, K=5, Store=True))
+    assert not base['convergence']['converged']
+    agent = controller.solve_edit(dict(BASE, RunId=base['run_id'], Edit=edit))[2]
+    assert agent.get_convergence()['step'] > 1
+    assert_same_solution(agent, cold_solve(controller, dict(BASE, **fields)))
+
+
+def test_policy_iteration_resolve_keeps_checkpoints():
+    controller = PolicyIterationController(run_store=RunStore())
+    base = controller.run_agent(dict(BASE, Store=True))
+    agent = controller.solve_edit(dict(BASE, RunId=base['run_id'], Edit=EDITS[0][0], CheckpointInterval=2))[2]
+    assert agent.get_history_memory()['mode'] == 'checkpoint'
+    assert_same_solution(agent, cold_solve(controller, dict(BASE, **EDITS[0][1])))
+
+
+def test_unknown_edit_fields_are_rejected():
+    with pytest.raises(ValueError, match='unknown fields Boulder'):
+        GridEdit.from_dict({'Boulder': [[0, 5]]})
@@ -0,0 +1,16 @@
+import pytest
+from tests.conftest import GRID
+
+
+@pytest.mark.parametrize('route, data', [
+    ('/api/value-iteration/run-agent', GRID),
+    ('/api/policy-iteration/run-agent', GRID),
+    ('/api/q-learning/run-agent', dict(GRID, Alpha=0.5, Episodes=20, Seed=1)),
+])
+def test_checkpoint_interval_is_part_of_the_cache_key(client, route, data):
+    plain = client.post(route, json=data).get_json()
+    assert 'history' not in plain
+
+    checkpointed = client.post(route, json=dict(data, CheckpointInterval=5)).get_json()
+    assert checkpointed['history']['mode'] == 'checkpoint'
+    assert checkpointed['history']['checkpoint_interval'] == 5
@@ -0,0 +1,51 @@
+import json
+from app.controllers import ValueIterationController, QLearningController
+from app.services import SharedStore, RunStore
+from tests.conftest import GRID
+
+
+def make_worker(path):
+    """
+    Run store and controllers of one worker process, sharing the SQLite file at path
+    """
+    run_store = RunStore(shared=SharedStore(path))
+    return (run_store, ValueIterationController(run_store=run_store),
+            QLearningController(run_store=run_store))
+
+
+def test_runs_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'shared.sqlite')
+    store_a, value_iteration_a, q_learning_a = make_worker(path)
+    store_b, value_iteration_b, _ = make_worker(path)
+
+    value_run = value_iteration_a.run_agent(dict(GRID, Store=True))['run_id']
+    q_run = q_learning_a.run_agent(dict(GRID, Alpha=0.5, Episodes=20, Seed=1, Store=True))['run_id']
+    assert len(store_b) == 0
+
+    for run_id in (value_run, q_run):
+        expected = json.loads(json.dumps(store_a.get(run_id).agent.get_iterations()))
+        restored = store_b.get(run_id)
+        assert restored is not None and restored.run_id == run_id
+        assert json.loads(json.dumps(restored.agent.get_iterations())) == expected
+    assert value_iteration_b.find_run(GRID).run_id == value_run
+
+    assert store_b.delete(value_run)
+    assert make_worker(path)[0].get(value_run) is None
+
+
+def test_shared_store_evicts_by_size(tmp_path):
+    path = str(tmp_path / 'shared.sqlite')
+    writer = SharedStore(path, max_bytes=1000)
+    reader = SharedStore(path, max_bytes=1000)
+
+    for i in range(5):
+        assert writer.put(f'entry:{i}', bytes([i]) * 300)
+    stats = reader.get_stats()
+    assert stats['bytes'] <= 1000 and stats['entries'] == 3
+    assert writer.evictions == 2
+    # the least recently used entries were evicted
+    assert [reader.get(f'entry:{i}') is not None for i in range(5)] == [False, False, True, True, True]
+    assert reader.get('entry:4') == bytes([4]) * 300
+
+    assert writer.put('large', b'x' * 1001) is False
+    assert reader.get('large') is None
@@ -0,0 +1,43 @@
+import numpy as np
+from app.core import QLearningAgent
+from app.core.agent.trajectory_store import TrajectoryStore
+from tests.test_policy_iteration import make_grid
+
+
+def test_run_length_encoding_round_trip():
+    # self-loops against a wall at the start, in the middle and at the end of an episode,
+    # and an episode that starts in the state the previous one ended in
+    episodes = [[0, 0, 0, 1, 2, 2, 3], [3, 3, 1, 1, 1, 0, 0], [5], [5, 5, 5, 5]]
+    store = TrajectoryStore()
+    for i, sequence in enumerate(episodes):
+        store.append(sequence, episode_return=float(i))
+
+    assert len(store) == len(episodes)
+    for i, sequence in enumerate(episodes):
+        assert store.get(i).tolist() == sequence
+    assert store.get_runs(0)[0].tolist() == [0, 1, 2, 3]
+    assert store.get_runs(0)[1].tolist() == [3, 1, 2, 1]
+    assert store.get_runs(3)[1].tolist() == [4]
+    assert store.lengths.tolist() == [len(sequence) for sequence in episodes]
+    assert store.returns.tolist() == [0.0, 1.0, 2.0, 3.0]
+    assert store.get_visits(6).tolist() == np.bincount(np.concatenate(episodes), minlength=6).tolist()
+
+
+def test_q_learning_trajectories_round_trip():
+    grid = make_grid(6, 4).with_parameters(k=5, episodes=30, alpha=0.5, discount=0.9)
+    agent = QLearningAgent(grid, seed=4)
+    sequences = []
+    run_episode = agent.run_episode
+
+    def record_episode():
+        sequence, episode_return = run_episode()
+        sequences.append(list(sequence))
+        return sequence, episode_return
+    agent.run_episode = record_episode
+    agent.run_agent()
+
+    store = agent.trajectories
+    # episode 0 is the start, before any step
+    recorded = [store.get(episode + 1).tolist() for episode in range(len(sequences))]
+    assert recorded == sequences
+    assert any(len(store.get_runs(episode)[0]) < store.lengths[episode] for episode in range(len(store)))